@@ -1,20 +1,234 @@
-from google import genai
-from openai import OpenAI
+# openai / httpx 体积较大，第一次真正调用时才导入；导入本模块不产生任何网络请求
+import asyncio
+import os
+import threading
+
+from agent.llm_cache import get_llm_cache, LLM_CACHE_ENABLED
+from agent.usage import usage_stats
+from agent.resilience import (
+    LLMError, LLMTimeoutError, LatencyTracker,
+    call_sync, call_async, is_retryable, backoff_delay, as_llm_error
+)
+
+# AI_LOG_LLM_BASE_URL 可以把请求指到本地假服务（tools/fake_llm_server.py）做压测
+BASE_URL = os.environ.get("AI_LOG_LLM_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+API_KEY = 'YOUR_API_KEY_HERE'
+DEFAULT_MODEL = 'deepseek-v3-2-251201'
+
+# 异步客户端连接池上限（一个事件循环上同时在飞的 LLM 请求数）
+ASYNC_MAX_CONNECTIONS = 500
+ASYNC_MAX_KEEPALIVE = 100
+
+# 同步客户端连接池上限（线程池里同时在飞的请求数）
+SYNC_MAX_CONNECTIONS = 64
+SYNC_MAX_KEEPALIVE = 32
+
+# 调用点没指定时的默认值：整次调用（含重试）的截止时间 / 重试次数
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_RETRIES = 2
+
 class LLMClient:
-    def __init__(self,model_name='deepseek-v3-2-251201'):
-        self.client = OpenAI(base_url="https://ark.cn-beijing.volces.com/api/v3",
-                             api_key='YOUR_API_KEY_HERE')
+    """
+    同步客户端：底层 OpenAI SDK + httpx 连接池在第一次调用时才创建
+    进程内请用 get_llm() 共享同一个实例
+    """
+    def __init__(self,model_name=DEFAULT_MODEL):
         self.model_name = model_name
-    def generate(self,prompt:str) -> str:
-        completion = self.client.chat.completions.create(
-            model = self.model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
+        self.latency = LatencyTracker()
+        self._client = None
+        self._client_lock = threading.Lock()
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from openai import OpenAI
+                    # 重试由 agent/resilience.py 统一负责，关掉 SDK 自带的重试
+                    self._client = OpenAI(
+                        base_url=BASE_URL,
+                        api_key=API_KEY,
+                        max_retries=0,
+                        http_client=httpx.Client(
+                            limits=httpx.Limits(
+                                max_connections=SYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=SYNC_MAX_KEEPALIVE,
+                            ),
+                        ),
+                    )
+        return self._client
+    def close(self):
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+    def generate(self,prompt:str,cache:bool=False,ttl:float|None=None,
+                 timeout:float|None=None,retries:int|None=None,hedge:bool=False,
+                 site:str|None=None,session:str|None=None) -> str:
+        """
+        - cache=True：先查本地响应缓存（同模型 + 同 prompt），命中直接返回；ttl 覆盖默认有效期
+        - timeout：整次调用（含重试）的截止时间；retries：可重试错误的最多重试次数
+        - hedge=True：超过观测 p95 还没返回就再发一份，先成功的为准
+        - site / session：用量统计的调用点与会话标签
+        失败抛 LLMError（超时为 LLMTimeoutError）
+        """
+        if cache and LLM_CACHE_ENABLED:
+            cached = get_llm_cache().get(self.model_name, prompt, ttl)
+            if cached is not None:
+                return cached
+
+        def attempt(t):
+            completion = self.client.chat.completions.create(
+                model = self.model_name,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=t,
+            )
+            usage_stats.record(completion.usage, site, session)
+            return completion.choices[0].message.content
+
+        content = call_sync(
+            attempt,
+            timeout=DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout,
+            retries=DEFAULT_RETRIES if retries is None else retries,
+            hedge=hedge,
+            tracker=self.latency,
         )
-        return completion.choices[0].message.content
+        if cache and LLM_CACHE_ENABLED:
+            get_llm_cache().put(self.model_name, prompt, content)
+        return content
+
+class AsyncLLMClient:
+    """
+    LLMClient 的异步版本：
+    - 基于 AsyncOpenAI，底层一个 httpx.AsyncClient 连接池
+    - await 期间不占线程，一个事件循环可同时挂起几百个慢请求
+    - 与 LLMClient 一样，SDK 在第一次调用时才导入
+    """
+    def __init__(self,model_name=DEFAULT_MODEL):
+        self.model_name = model_name
+        self.latency = LatencyTracker()
+        self._client = None
+    @property
+    def client(self):
+        # 只在事件循环线程里访问，不需要加锁
+        if self._client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                base_url=BASE_URL,
+                api_key=API_KEY,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=ASYNC_MAX_CONNECTIONS,
+                        max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+                    ),
+                ),
+            )
+        return self._client
+    async def generate(self,prompt:str,cache:bool=False,ttl:float|None=None,
+                       timeout:float|None=None,retries:int|None=None,hedge:bool=False,
+                       site:str|None=None,session:str|None=None) -> str:
+        """
+        参数语义同 LLMClient.generate；SQLite 查询是本地毫秒级操作，直接在事件循环里做
+        对冲时落后的那份请求会被取消
+        """
+        if cache and LLM_CACHE_ENABLED:
+            cached = get_llm_cache().get(self.model_name, prompt, ttl)
+            if cached is not None:
+                return cached
+
+        async def attempt(t):
+            completion = await self.client.chat.completions.create(
+                model = self.model_name,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=t,
+            )
+            usage_stats.record(completion.usage, site, session)
+            return completion.choices[0].message.content
+
+        content = await call_async(
+            attempt,
+            timeout=DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout,
+            retries=DEFAULT_RETRIES if retries is None else retries,
+            hedge=hedge,
+            tracker=self.latency,
+        )
+        if cache and LLM_CACHE_ENABLED:
+            get_llm_cache().put(self.model_name, prompt, content)
+        return content
+    async def stream(self,prompt:str,timeout:float|None=None,retries:int|None=None,
+                     site:str|None=None,session:str|None=None):
+        """
+        流式生成（stream=True）：逐块 yield 文本增量
+        - timeout：等待首块 / 相邻两块之间的最长时间
+        - 只在还没吐出任何内容时重试（吐出去的内容收不回）
+        """
+        timeout = DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout
+        retries = DEFAULT_RETRIES if retries is None else retries
+
+        for n in range(retries + 1):
+            started = False
+            try:
+                stream = await self.client.chat.completions.create(
+                    model = self.model_name,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeout,
+                )
+                async for chunk in stream:
+                    # include_usage：最后一块没有 choices，只带整次调用的 usage
+                    if getattr(chunk, "usage", None) is not None:
+                        usage_stats.record(chunk.usage, site, session)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        started = True
+                        yield delta
+                return
+            except Exception as e:
+                if started or n == retries or not is_retryable(e):
+                    raise as_llm_error(e)
+                await asyncio.sleep(backoff_delay(n))
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm() -> LLMClient:
+    """
+    进程内共享的同步客户端（路由 / 画像 / 各会话的 Orchestrator 共用一个连接池）
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = LLMClient()
+        return _llm
+
+_async_llm = None
+
+def get_async_llm() -> AsyncLLMClient:
+    """
+    进程内共享的异步客户端（连接池只建一次）
+    """
+    global _async_llm
+    if _async_llm is None:
+        _async_llm = AsyncLLMClient()
+    return _async_llm
 # class LLMClient:
 #     def __init__(self,model_name:str = 'gemini-3-flash-preview'):
+#         from google import genai
 #         self.client = genai.Client(api_key='YOUR_API_KEY_HERE')
 #         self.model_name = model_name
 #     def generate(self,prompt:str) -> str:
@@ -22,6 +236,4 @@ class LLMClient:
 #             model=self.model_name,
 #             contents = prompt
 #         )
-#         return reponse.text
-a = LLMClient()
-print(a.generate("写一首关于春天的诗歌"))
\ No newline at end of file
+#         return reponse.text
\ No newline at end of file
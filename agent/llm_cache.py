@@ -0,0 +1,152 @@
+# agent/llm_cache.py
+"""
+LLM 响应缓存 LLMCache（SQLite，按内容寻址）
+
+职责：
+- 以 (模型名, prompt) 的哈希为键，缓存 LLM 的完整回复
+- 同一 prompt 再次调用（索引没变时的重复路由、语料没变时的画像重建、
+  重启之后的重试……）直接返回，不发网络请求
+- TTL 过期 + 按最近使用时间的 LRU 淘汰，文件大小有上限
+- 记录命中 / 未命中次数
+
+注意：
+- 只缓存调用方显式声明可缓存的调用（generate(..., cache=True)），
+  主对话这种每轮都不同、带日期的调用不走缓存
+- 进程内单例 get_llm_cache()，一个连接 + 一把锁，多线程共用
+"""
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import time
+
+from app_paths import STATE_DIR
+
+
+# 总开关：False 时 cache=True 的调用也直接走网络
+LLM_CACHE_ENABLED = True
+
+CACHE_FILE = STATE_DIR / "llm_cache.sqlite3"
+
+# 最多保留多少条回复（超出按最近使用时间淘汰）
+CACHE_MAX_ENTRIES = 5000
+# 默认有效期（秒）；调用方可以按调用点覆盖
+CACHE_DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def cache_key(model: str, prompt: str) -> str:
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    表结构：key -> (model, response, created_at, last_used)
+    """
+
+    def __init__(self,
+                 path: Path = CACHE_FILE,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 default_ttl: float = CACHE_DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, model: str, prompt: str, ttl: float | None = None) -> str | None:
+        """
+        命中返回缓存的回复；没有或已过期返回 None
+        """
+        key = cache_key(model, prompt)
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > ttl:
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, model: str, prompt: str, response: str):
+        if not response:
+            return
+        key = cache_key(model, prompt)
+        now = time.time()
+
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            count = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM llm_cache")
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
@@ -0,0 +1,39 @@
+# agent/prompt_builder.py
+"""
+Prompt 拼装层 PromptBuilder
+
+服务商的 prompt 缓存按“最长公共前缀”命中，所以拼装顺序固定为：
+1. static：agent/prompt.py 里的系统提示词（所有请求都一样）
+2. stable：变化很慢的部分（用户画像、当前日期、文件列表、滚动上下文）
+3. turn：每轮都不同的部分（历史日志、日志草稿、用户输入）
+
+同一段里按调用顺序拼接；空字符串直接跳过。
+"""
+
+
+class PromptBuilder:
+    def __init__(self):
+        self._static = []
+        self._stable = []
+        self._turn = []
+
+    def static(self, *parts: str) -> "PromptBuilder":
+        self._static.extend(p for p in parts if p)
+        return self
+
+    def stable(self, *parts: str) -> "PromptBuilder":
+        self._stable.extend(p for p in parts if p)
+        return self
+
+    def turn(self, *parts: str) -> "PromptBuilder":
+        self._turn.extend(p for p in parts if p)
+        return self
+
+    def prefix(self) -> str:
+        """
+        可被服务商缓存的前缀（static + stable）
+        """
+        return "".join(self._static) + "".join(self._stable)
+
+    def build(self) -> str:
+        return self.prefix() + "".join(self._turn)
@@ -0,0 +1,218 @@
+# agent/resilience.py
+"""
+LLM 调用的截止时间 / 重试 / 对冲请求（只给 agent/llm.py 用）
+
+- 截止时间：整次调用（含重试）的总预算；每次尝试的超时 = 剩余预算
+- 重试：只对可重试的错误（超时、连接失败、429、5xx）做指数退避 + 抖动
+- 对冲：第一次请求超过观测到的 p95 还没返回，就再发一份，谁先成功用谁
+  （样本不足 HEDGE_MIN_SAMPLES 时不对冲）
+
+对外只抛 LLMError / LLMTimeoutError，调用方不需要认识 SDK 的异常类型。
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import random
+import sys
+import threading
+import time
+
+
+# 退避：base * 2^n，加 0~50% 抖动，封顶
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 8.0
+
+# 对冲：滑动窗口大小 / 开始对冲前至少要有多少个样本 / 对冲延迟下限
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.5
+
+# 同步对冲用的线程池（落后的那份请求停不下来，会在自己的超时内结束）
+_hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+class LLMError(Exception):
+    """
+    LLM 调用失败（不可重试，或重试次数用完）
+    """
+
+
+class LLMTimeoutError(LLMError):
+    """
+    超过调用点给定的截止时间
+    """
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+
+    # SDK 是懒加载的；走到这里说明它已经被导入，不会额外触发导入
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return False
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+    return delay * (1 + random.random() * 0.5)
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(exc, openai.APITimeoutError)
+
+
+def as_llm_error(exc: BaseException) -> LLMError:
+    if isinstance(exc, LLMError):
+        return exc
+    cls = LLMTimeoutError if _is_timeout(exc) else LLMError
+    err = cls(f"{type(exc).__name__}: {exc}")
+    err.__cause__ = exc
+    return err
+
+
+class LatencyTracker:
+    """
+    最近 LATENCY_WINDOW 次成功调用的耗时，用来估计 p95
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self) -> float | None:
+        p95 = self.percentile(0.95)
+        if p95 is None:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, p95)
+
+
+# =========================
+# 同步
+# =========================
+
+def call_sync(attempt, *, timeout: float, retries: int, hedge: bool, tracker: LatencyTracker):
+    """
+    attempt(timeout) 发一次请求并返回结果；这里负责截止时间 / 重试 / 对冲
+    """
+    deadline = time.monotonic() + timeout
+
+    def timed(t):
+        start = time.monotonic()
+        result = attempt(t)
+        tracker.record(time.monotonic() - start)
+        return result
+
+    for n in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"deadline of {timeout:.1f}s exceeded")
+        try:
+            if hedge:
+                return _hedged_sync(timed, remaining, tracker.hedge_delay())
+            return timed(remaining)
+        except Exception as e:
+            if n == retries or not is_retryable(e):
+                raise as_llm_error(e)
+            delay = backoff_delay(n)
+            if time.monotonic() + delay >= deadline:
+                raise as_llm_error(e)
+            time.sleep(delay)
+
+
+def _hedged_sync(timed, remaining: float, delay: float | None):
+    if delay is None or delay >= remaining:
+        return timed(remaining)
+
+    first = _hedge_pool.submit(timed, remaining)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    futures = [first, _hedge_pool.submit(timed, remaining - delay)]
+    error = None
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for f in done:
+            futures.remove(f)
+            if f.exception() is None:
+                return f.result()
+            error = f.exception()
+    raise error
+
+
+# =========================
+# 异步
+# =========================
+
+async def call_async(attempt, *, timeout: float, retries: int, hedge: bool, tracker: LatencyTracker):
+    """
+    call_sync 的异步版本；attempt(timeout) 是协程函数，对冲时落后的那份会被取消
+    """
+    deadline = time.monotonic() + timeout
+
+    async def timed(t):
+        start = time.monotonic()
+        result = await asyncio.wait_for(attempt(t), t)
+        tracker.record(time.monotonic() - start)
+        return result
+
+    for n in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"deadline of {timeout:.1f}s exceeded")
+        try:
+            if hedge:
+                return await _hedged_async(timed, remaining, tracker.hedge_delay())
+            return await timed(remaining)
+        except Exception as e:
+            if n == retries or not is_retryable(e):
+                raise as_llm_error(e)
+            delay = backoff_delay(n)
+            if time.monotonic() + delay >= deadline:
+                raise as_llm_error(e)
+            await asyncio.sleep(delay)
+
+
+async def _hedged_async(timed, remaining: float, delay: float | None):
+    if delay is None or delay >= remaining:
+        return await timed(remaining)
+
+    tasks = [asyncio.create_task(timed(remaining))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.append(asyncio.create_task(timed(remaining - delay)))
+
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = t.exception()
+        raise error
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
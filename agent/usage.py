@@ -0,0 +1,237 @@
+# agent/usage.py
+"""
+LLM 用量统计（来自 API 返回的 usage 字段）
+
+- 每次调用按“调用点”（S1 / S2 / router / profile / summary）和会话归类累计
+- 输入 token 拆成“命中服务商 prompt 缓存”与“未命中”两部分
+- 兼容两种字段：OpenAI 风格 prompt_tokens_details.cached_tokens，
+  以及 DeepSeek 风格 prompt_cache_hit_tokens
+- 内存里累计，定期（USAGE_FLUSH_SECONDS）写到 state/llm_usage.json，重启后接着累计
+- 会话可以设软预算：累计输入 token 超过预算后，编排层在发 prompt 前收紧上下文
+- 进程内单例 usage_stats，多线程 / 协程共用
+"""
+import json
+import os
+import threading
+import time
+
+from app_paths import STATE_DIR
+
+
+USAGE_FILE = STATE_DIR / "llm_usage.json"
+
+# 多久落盘一次（秒）
+USAGE_FLUSH_SECONDS = 60
+
+# 最多记住多少个会话的用量（按最近使用淘汰）
+MAX_TRACKED_SESSIONS = 1000
+
+# 每个会话默认的软预算（累计输入 token）；None 表示不限制
+DEFAULT_SESSION_SOFT_BUDGET = None
+
+
+def cached_prompt_tokens(usage) -> int:
+    """
+    从 usage 对象里取出命中缓存的输入 token 数；取不到按 0 算
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return int(cached or 0)
+
+
+def _empty() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _add(totals: dict, prompt: int, cached: int, completion: int):
+    totals["calls"] += 1
+    totals["prompt_tokens"] += prompt
+    totals["cached_prompt_tokens"] += cached
+    totals["completion_tokens"] += completion
+
+
+def _view(totals: dict) -> dict:
+    prompt = totals["prompt_tokens"]
+    return {
+        **totals,
+        "uncached_prompt_tokens": prompt - totals["cached_prompt_tokens"],
+        "prompt_cache_hit_rate": totals["cached_prompt_tokens"] / prompt if prompt else 0.0,
+        "avg_prompt_tokens": prompt / totals["calls"] if totals["calls"] else 0.0,
+    }
+
+
+class UsageStats:
+    """
+    三层累计：总量 / 按调用点 / 按会话（会话内再按调用点）
+    """
+
+    def __init__(self, usage_file=USAGE_FILE, flush_interval: float = USAGE_FLUSH_SECONDS):
+        self.usage_file = usage_file
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._totals = _empty()
+        self._sites = {}            # site -> totals
+        self._sessions = {}         # session_id -> {"sites": {...}, "totals": {...}, "budget", "last_used"}
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self._load()
+
+    # =========================
+    # 记录
+    # =========================
+
+    def record(self, usage, site: str | None = None, session: str | None = None):
+        """
+        记录一次调用的 usage；usage 为 None（服务商没返回）时忽略
+        """
+        if usage is None:
+            return
+        prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        cached = cached_prompt_tokens(usage)
+        completion = int(getattr(usage, "completion_tokens", 0) or 0)
+        site = site or "other"
+
+        with self._lock:
+            _add(self._totals, prompt, cached, completion)
+            _add(self._sites.setdefault(site, _empty()), prompt, cached, completion)
+            if session:
+                entry = self._session_locked(session)
+                _add(entry["totals"], prompt, cached, completion)
+                _add(entry["sites"].setdefault(site, _empty()), prompt, cached, completion)
+            self._dirty = True
+
+        self._maybe_flush()
+
+    def _session_locked(self, session: str) -> dict:
+        entry = self._sessions.pop(session, None)
+        if entry is None:
+            entry = {"totals": _empty(), "sites": {}, "budget": DEFAULT_SESSION_SOFT_BUDGET}
+        entry["last_used"] = time.time()
+        self._sessions[session] = entry     # 重新插入到末尾：dict 顺序即 LRU 顺序
+        while len(self._sessions) > MAX_TRACKED_SESSIONS:
+            del self._sessions[next(iter(self._sessions))]
+        return entry
+
+    # =========================
+    # 软预算
+    # =========================
+
+    def set_budget(self, session: str, tokens: int | None):
+        with self._lock:
+            self._session_locked(session)["budget"] = tokens
+            self._dirty = True
+
+    def over_budget(self, session: str | None) -> bool:
+        """
+        会话累计输入 token 是否已超过软预算（没设预算时永远 False）
+        """
+        if not session:
+            return False
+        with self._lock:
+            entry = self._sessions.get(session)
+            if entry is None or not entry.get("budget"):
+                return False
+            return entry["totals"]["prompt_tokens"] >= entry["budget"]
+
+    # =========================
+    # 查询
+    # =========================
+
+    def snapshot(self) -> dict:
+        """
+        全部调用的总量
+        """
+        with self._lock:
+            return _view(dict(self._totals))
+
+    def report(self, session: str | None = None) -> dict:
+        """
+        session 为空：总量 + 各调用点 + 各会话的总量；否则只看这一个会话
+        """
+        with self._lock:
+            if session:
+                entry = self._sessions.get(session)
+                if entry is None:
+                    return {"session_id": session, "totals": _view(_empty()), "sites": {}, "budget": None}
+                return {
+                    "session_id": session,
+                    "totals": _view(dict(entry["totals"])),
+                    "sites": {s: _view(dict(t)) for s, t in entry["sites"].items()},
+                    "budget": entry.get("budget"),
+                    "over_budget": bool(entry.get("budget"))
+                                   and entry["totals"]["prompt_tokens"] >= entry["budget"],
+                }
+            return {
+                "totals": _view(dict(self._totals)),
+                "sites": {s: _view(dict(t)) for s, t in self._sites.items()},
+                "sessions": {
+                    sid: {"totals": _view(dict(e["totals"])), "budget": e.get("budget")}
+                    for sid, e in self._sessions.items()
+                },
+            }
+
+    # =========================
+    # 持久化
+    # =========================
+
+    def _load(self):
+        try:
+            data = json.loads(self.usage_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._totals.update(data.get("totals", {}))
+        for site, totals in data.get("sites", {}).items():
+            self._sites[site] = {**_empty(), **totals}
+        for sid, entry in data.get("sessions", {}).items():
+            self._sessions[sid] = {
+                "totals": {**_empty(), **entry.get("totals", {})},
+                "sites": {s: {**_empty(), **t} for s, t in entry.get("sites", {}).items()},
+                "budget": entry.get("budget", DEFAULT_SESSION_SOFT_BUDGET),
+                "last_used": entry.get("last_used", 0),
+            }
+
+    def _maybe_flush(self):
+        with self._lock:
+            due = self._dirty and not self._flushing and \
+                time.monotonic() - self._last_flush >= self.flush_interval
+            if not due:
+                return
+            self._flushing = True
+        # 落盘放到后台线程，不占请求路径
+        threading.Thread(target=self.flush, daemon=True).start()
+
+    def flush(self):
+        with self._lock:
+            data = {
+                "totals": dict(self._totals),
+                "sites": {s: dict(t) for s, t in self._sites.items()},
+                "sessions": {
+                    sid: {
+                        "totals": dict(e["totals"]),
+                        "sites": {s: dict(t) for s, t in e["sites"].items()},
+                        "budget": e.get("budget"),
+                        "last_used": e.get("last_used", 0),
+                    }
+                    for sid, e in self._sessions.items()
+                },
+            }
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+        try:
+            self.usage_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.usage_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.usage_file)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+        finally:
+            with self._lock:
+                self._flushing = False
+
+
+usage_stats = UsageStats()
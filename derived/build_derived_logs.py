@@ -1,7 +1,15 @@
 from pathlib import Path
 from datetime import datetime
+import bisect
+import gzip
+import json
+import os
 import re
+import tempfile
+import threading
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
+from metrics import timed
+from log_store import use_log_store, get_log_store
 
 # ========= 路径定义 =========
 
@@ -10,6 +18,10 @@ LOG_TYPES = ["tasks", "feedback", "events", "goals"]
 
 DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
 
+# 派生文件里每条日志的分隔头：===== 2026-01-20 | 2026-01-20.txt =====
+HEADER_PATTERN = re.compile(r"^===== (.+?) \| (.+?) =====$", re.MULTILINE)
+HEADER_PATTERN_BYTES = re.compile(rb"^===== (.+?) \| (.+?) =====\r?$", re.MULTILINE)
+
 
 # ========= 工具函数 =========
 
@@ -33,6 +45,13 @@ def read_and_sort_logs(log_type: str) -> list[dict]:
     """
     读取某一类日志，并按日期倒序排序
     """
+    if use_log_store():
+        return [
+            {"filename": x["filename"], "date": x["date"], "content": x["content"].strip()}
+            for x in get_log_store().list_logs(log_type)
+            if x["content"].strip()
+        ]
+
     folder = STORAGE_DIR / log_type
     if not folder.exists():
         return []
@@ -55,15 +74,16 @@ def read_and_sort_logs(log_type: str) -> list[dict]:
             "content": content
         })
 
-    # 日期近的在前，没日期的放最后
-    items.sort(
-        key=lambda x: x["date"] if x["date"] else datetime.min,
-        reverse=True
-    )
+    # 日期近的在前，没日期的放最后（同一天按文件名，保证增量插入位置确定）
+    items.sort(key=sort_key, reverse=True)
 
     return items
 
 
+def sort_key(item: dict) -> tuple:
+    return (item["date"] or datetime.min, item["filename"])
+
+
 def format_logs_for_display(items: list[dict]) -> str:
     """
     将日志整理成“直接可展示”的文本
@@ -86,22 +106,146 @@ def format_logs_for_display(items: list[dict]) -> str:
     return "\n".join(blocks)
 
 
+def _write_atomic(path: Path, data: str | bytes):
+    """
+    先写同目录下唯一命名的临时文件再替换：读方不会读到写了一半的文件，
+    请求线程和维护线程同时写同一个文件也不会共用 / 抢走对方的临时文件
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        if isinstance(data, bytes):
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
 def write_derived_file(log_type: str, content: str):
     """
     写入 derived/{log_type}.txt
     """
-    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    _write_atomic(DERIVED_DIR / f"{log_type}.txt", content)
+    write_offset_index(log_type)
+
+
+# 预压缩副本的压缩级别：视图重写后第一次 /raw 请求时才压缩，取速度优先的级别
+GZIP_COPY_LEVEL = 5
+
+_gzip_lock = threading.Lock()
+
+
+def ensure_gzip_copy(log_type: str) -> Path | None:
+    """
+    按需生成 derived/{log_type}.txt.gz：视图比压缩副本新时才重新压缩（惰性，
+    增量写视图时不压缩），之后原文视图可以直接整文件发送（sendfile）
+    视图不存在时返回 None
+    """
+    output_file = DERIVED_DIR / f"{log_type}.txt"
+    gz_file = DERIVED_DIR / f"{log_type}.txt.gz"
+    with _gzip_lock:
+        try:
+            st = output_file.stat()
+        except OSError:
+            return None
+        if gz_file.exists() and gz_file.stat().st_mtime_ns >= st.st_mtime_ns:
+            return gz_file
+        _write_atomic(gz_file, gzip.compress(output_file.read_bytes(), GZIP_COPY_LEVEL, mtime=0))
+        return gz_file
+
+
+# ========= 条目偏移索引（分页读取用） =========
+
+def offset_index_path(log_type: str) -> Path:
+    return DERIVED_DIR / f"{log_type}.index.json"
+
+
+def build_offset_index(log_type: str, f=None) -> dict | None:
+    """
+    扫描 derived/{log_type}.txt 的字节内容，记录每个条目的字节偏移：
+    {
+      "size": 文件字节数, "mtime_ns": ...,
+      "entries": [{"date": "2026-01-20", "filename": "...", "offset": 0, "length": 123}, ...]
+    }
+    按字节扫描（而不是按写入时的字符串计算），换行符被平台改写也不影响
+    - f：已打开的视图（rb）；size / mtime 取自同一个文件描述符的 fstat，
+      视图在中途被替换也不会把新文件的 stat 配上旧文件的偏移
+    """
+    if f is None:
+        try:
+            with open(DERIVED_DIR / f"{log_type}.txt", "rb") as f:
+                return build_offset_index(log_type, f)
+        except FileNotFoundError:
+            return None
+
+    st = os.fstat(f.fileno())
+    f.seek(0)
+    data = f.read()
+
+    headers = list(HEADER_PATTERN_BYTES.finditer(data))
+    entries = []
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+        entries.append({
+            "date": m.group(1).decode("utf-8"),
+            "filename": m.group(2).decode("utf-8"),
+            "offset": m.start(),
+            "length": end - m.start()
+        })
+
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "entries": entries}
+
+
+def write_offset_index(log_type: str, index: dict | None = None) -> dict | None:
+    """
+    写 derived/{log_type}.index.json；index 为空时重新扫描视图生成
+    """
+    if index is None:
+        index = build_offset_index(log_type)
+    if index is None:
+        return None
+    _write_atomic(offset_index_path(log_type), json.dumps(index, ensure_ascii=False))
+    return index
+
+
+def parse_derived_file(log_type: str) -> list[dict] | None:
+    """
+    把 derived/{log_type}.txt 拆回条目列表（format_logs_for_display 的逆操作）
+    文件不存在时返回 None
+    """
     output_file = DERIVED_DIR / f"{log_type}.txt"
+    try:
+        text = output_file.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(content)
+    headers = list(HEADER_PATTERN.finditer(text))
+    items = []
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        date_str, filename = m.group(1), m.group(2)
+        items.append({
+            "filename": filename,
+            "date": None if date_str == "NO_DATE" else extract_date_from_filename(date_str),
+            "content": text[m.end() + 1:end].rstrip("\n")
+        })
+    return items
 
 
 # ========= 主入口 =========
 
+@timed("build_derived_logs")
 def build_derived_logs():
     """
-    构建四类日志的派生汇总文件
+    构建四类日志的派生汇总文件（全量；日常保存走 update_derived_logs）
     """
     for log_type in LOG_TYPES:
         items = read_and_sort_logs(log_type)
@@ -109,7 +253,61 @@ def build_derived_logs():
         write_derived_file(log_type, formatted)
 
 
-# ========= 允许独立运行 =========
+@timed("update_derived_logs")
+def update_derived_logs(rel_paths) -> list[str]:
+    """
+    增量维护：只把变化的日志拼接进对应视图
+    - rel_paths：相对 storage 的路径，如 "tasks/2026-01-20.txt"
+    - 新增 / 修改：删掉旧条目，按日期插到排序位置
+    - 删除 / 变空：只删掉旧条目
+    - 没涉及的视图完全不碰；视图文件缺失时该类型退回全量重建
+    返回实际重写过的视图类型
+    """
+    by_type: dict[str, set[str]] = {}
+    for rel_path in rel_paths:
+        parts = Path(rel_path).parts
+        if len(parts) != 2 or parts[0] not in LOG_TYPES:
+            continue
+        by_type.setdefault(parts[0], set()).add(parts[1])
+
+    touched = []
+    for log_type, filenames in by_type.items():
+        items = parse_derived_file(log_type)
+        if items is None:
+            write_derived_file(log_type, format_logs_for_display(read_and_sort_logs(log_type)))
+            touched.append(log_type)
+            continue
+
+        items = [x for x in items if x["filename"] not in filenames]
+        # items 为倒序；bisect 需要正序的 key 列表
+        keys = [sort_key(x) for x in reversed(items)]
+
+        for filename in sorted(filenames):
+            f = STORAGE_DIR / log_type / filename
+            try:
+                content = f.read_text(encoding="utf-8").strip()
+            except OSError:
+                continue
+            if not content:
+                continue
+
+            item = {
+                "filename": filename,
+                "date": extract_date_from_filename(filename),
+                "content": content
+            }
+            key = sort_key(item)
+            i = bisect.bisect_left(keys, key)
+            keys.insert(i, key)
+            items.insert(len(items) - i, item)
+
+        write_derived_file(log_type, format_logs_for_display(items))
+        touched.append(log_type)
+
+    return touched
+
+
+# ========= 允许独立运行（修复模式：全量重建） =========
 
 if __name__ == "__main__":
     build_derived_logs()
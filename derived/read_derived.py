@@ -0,0 +1,115 @@
+from pathlib import Path
+import bisect
+import json
+import os
+
+from app_paths import DERIVED_DIR
+
+from derived.build_derived_logs import (
+    LOG_TYPES,
+    build_offset_index,
+    offset_index_path,
+    write_offset_index,
+)
+
+# ========= 分页默认值 =========
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+
+
+# ========= 偏移索引 =========
+
+def load_offset_index(log_type: str, f=None) -> dict | None:
+    """
+    读取 derived/{log_type}.index.json；
+    索引缺失或与视图文件对不上（size / mtime 变了）时重新扫描生成
+    - f：已打开的视图（rb）；以它的 fstat 为准并从它重建，
+      保证返回的偏移对应的正是调用方手里这个文件（视图随时可能被替换）
+    """
+    if f is None:
+        try:
+            with open(DERIVED_DIR / f"{log_type}.txt", "rb") as f:
+                return load_offset_index(log_type, f)
+        except FileNotFoundError:
+            return None
+
+    st = os.fstat(f.fileno())
+    try:
+        index = json.loads(offset_index_path(log_type).read_text(encoding="utf-8"))
+        if index.get("size") == st.st_size and index.get("mtime_ns") == st.st_mtime_ns:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    return write_offset_index(log_type, build_offset_index(log_type, f))
+
+
+def _select_range(entries: list[dict], date_from: str | None, date_to: str | None) -> tuple[int, int]:
+    """
+    entries 按日期倒序（NO_DATE 在最后）；返回日期落在 [date_from, date_to] 内的下标区间
+    """
+    if not date_from and not date_to:
+        return 0, len(entries)
+
+    # 有日期的条目是前缀；bisect 需要正序
+    n_dated = 0
+    while n_dated < len(entries) and entries[n_dated]["date"] != "NO_DATE":
+        n_dated += 1
+    dates_asc = [entries[i]["date"] for i in range(n_dated - 1, -1, -1)]
+
+    lo = bisect.bisect_left(dates_asc, date_from) if date_from else 0
+    hi = bisect.bisect_right(dates_asc, date_to) if date_to else n_dated
+    if lo >= hi:
+        return 0, 0
+    return n_dated - hi, n_dated - lo
+
+
+# ========= 分页读取 =========
+
+def read_derived_page(log_type: str,
+                      offset: int = 0,
+                      limit: int = DEFAULT_PAGE_LIMIT,
+                      date_from: str | None = None,
+                      date_to: str | None = None) -> dict:
+    """
+    按条目分页读取派生视图：只 seek 到第一条的位置，读一段有界的字节
+    - offset / limit：在（日期过滤后的）条目序列上分页
+    - date_from / date_to：YYYY-MM-DD，闭区间
+    """
+    empty = {"content": "", "entries": [], "total": 0,
+             "offset": offset, "limit": limit, "has_more": False}
+    if log_type not in LOG_TYPES:
+        return empty
+
+    offset = max(0, offset)
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+
+    # 先打开视图，索引按这个文件描述符校验 / 重建，再从同一个描述符读：
+    # 维护线程中途替换视图也不会把索引偏移用到另一个文件上
+    try:
+        f = open(DERIVED_DIR / f"{log_type}.txt", "rb")
+    except FileNotFoundError:
+        return empty
+    with f:
+        index = load_offset_index(log_type, f)
+        entries = index["entries"]
+        start, end = _select_range(entries, date_from, date_to)
+        total = end - start
+        page = entries[start + offset: min(end, start + offset + limit)]
+
+        content = ""
+        if page:
+            first, last = page[0], page[-1]
+            f.seek(first["offset"])
+            data = f.read(last["offset"] + last["length"] - first["offset"])
+            content = data.decode("utf-8").rstrip("\r\n") + "\n"
+
+    return {
+        "content": content,
+        "entries": [{"date": e["date"], "filename": e["filename"]} for e in page],
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "has_more": offset + len(page) < total
+    }
@@ -0,0 +1,575 @@
+# log_store.py
+"""
+日志存储引擎 LogStore（可选后端：SQLite WAL + FTS5）
+
+- 一条日志一行：rel_path / type / date / title / content / mtime
+- log_dates：每条日志涉及的全部日期（文件名里的 + “日期：”行里的），按日期建索引
+- logs_fts：标题 + 正文的全文索引（trigram 分词，中文子串也能查）
+- 仍然导出熟悉的 storage/{tasks,feedback,events,goals}/*.txt：
+  put 先写 txt（fsync）再入库；put_many 先写临时文件，事务提交后再改名；
+  外部改动的 txt 由 sync 按 stat 比对导回库里
+- 启用后，全量扫描（派生视图 / 画像）、时间查询、全文检索都变成索引查询
+
+开关：环境变量 AI_LOG_STORAGE_BACKEND=sqlite（默认 files，行为与原来完全一样）
+进程内单例 get_log_store()，一个连接 + 一把锁，多线程共用；第一次取用时从 txt 树同步一次
+
+放在项目根目录（和 metrics.py 一样），数据库文件放在 storage/ 下：
+它就是日志存储本身，orchestrator / state / derived 都可以直接引用。
+
+用法（项目根目录）：
+    python -m log_store sync              # txt 树 → 数据库
+    python -m log_store export [--dest D] # 数据库 → txt 树
+    python -m log_store stats
+"""
+from pathlib import Path
+from datetime import date, datetime
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app_paths import STORAGE_DIR
+
+from state.local_retriever import LOG_FOLDERS, scan_storage, make_snippet
+
+
+# files：原来的一文件一日志；sqlite：本模块
+STORAGE_BACKEND = os.environ.get("AI_LOG_STORAGE_BACKEND", "files").strip().lower()
+
+LOG_DB_FILE = STORAGE_DIR / "logs.sqlite3"
+
+# 全文检索默认返回条数
+SEARCH_DEFAULT_LIMIT = 20
+
+# put_many 提交前写下的临时文件后缀（不是 .txt，scan_storage 不会把它当日志）
+STAGED_SUFFIX = ".pending"
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATE_LINE = re.compile(r"日期[：:]\s*(\d{4}-\d{2}-\d{2})")
+
+
+def use_log_store() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+
+def _parse_date(s: str) -> date | None:
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _filename_date(rel_path: str) -> date | None:
+    m = _DATE.search(rel_path.rsplit("/", 1)[-1])
+    return _parse_date(m.group()) if m else None
+
+
+def _title(rel_path: str) -> str:
+    """
+    事件 / 目标：文件名里的名称部分；任务 / 反馈（文件名就是日期）：日期
+    """
+    stem = rel_path.rsplit("/", 1)[-1][:-len(".txt")]
+    name = _DATE.sub("", stem).strip()
+    return name or stem
+
+
+def _all_dates(rel_path: str, text: str) -> set[date]:
+    """
+    与 state/date_index.py 相同的取日期规则：文件名日期 + 所有“日期：”行
+    """
+    found = {d for d in (_parse_date(m) for m in _DATE_LINE.findall(text)) if d}
+    d = _filename_date(rel_path)
+    if d:
+        found.add(d)
+    return found
+
+
+def write_text_durable(path: Path, text: str):
+    """
+    落盘写文件（S2 保存 / 批量导入 / 导出 txt 共用）：
+    同目录临时文件写完 fsync，再原子替换，崩溃时不会留下写了一半的日志
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # 目录项也落盘（Windows 不能以只读方式打开目录，跳过）
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _valid_rel_path(rel_path: str) -> bool:
+    if not isinstance(rel_path, str):
+        return False
+    parts = rel_path.split("/")
+    return len(parts) == 2 and parts[0] in LOG_FOLDERS and parts[1].endswith(".txt") \
+        and ".." not in parts[1] and "\\" not in parts[1]
+
+
+def check_log_path(rel_path: str, storage_dir: Path = STORAGE_DIR) -> Path:
+    """
+    写日志前校验相对路径（路径可能来自 LLM 输出），返回要写的绝对路径：
+    必须是 <四类目录>/<文件名>.txt，且解析后仍在 storage_dir 下；
+    ../x.txt、foo/bar.txt 这类抛 ValueError，不写任何文件
+    """
+    if not _valid_rel_path(rel_path):
+        raise ValueError(f"invalid log path: {rel_path!r}")
+    root = Path(storage_dir).resolve()
+    path = (root / rel_path).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"log path escapes storage: {rel_path!r}")
+    return path
+
+
+class LogStore:
+    """
+    表结构：
+    - logs(id, rel_path, type, date, title, content, mtime, file_mtime_ns, file_size)
+    - log_dates(log_id, date)
+    - logs_fts(title, content)：外部内容表，触发器与 logs 保持同步
+    """
+
+    def __init__(self, path: Path = LOG_DB_FILE, storage_dir: Path = STORAGE_DIR):
+        self.path = path
+        self.storage_dir = storage_dir
+        self._lock = threading.RLock()
+        self._conn = None
+        self.fts_tokenizer = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS logs ("
+                " id INTEGER PRIMARY KEY,"
+                " rel_path TEXT NOT NULL UNIQUE,"
+                " type TEXT NOT NULL,"
+                " date TEXT,"
+                " title TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " mtime REAL NOT NULL,"
+                " file_mtime_ns INTEGER,"
+                " file_size INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS logs_type_date ON logs(type, date)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS log_dates ("
+                " log_id INTEGER NOT NULL REFERENCES logs(id) ON DELETE CASCADE,"
+                " date TEXT NOT NULL,"
+                " PRIMARY KEY (log_id, date))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS log_dates_date ON log_dates(date)")
+            self.fts_tokenizer = self._create_fts(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _create_fts(conn: sqlite3.Connection) -> str:
+        """
+        优先 trigram 分词（SQLite ≥ 3.34，中文子串可查）；不支持时退回 unicode61
+        """
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'logs_fts'").fetchone()
+        if row is not None:
+            return "trigram" if "trigram" in row[0] else "unicode61"
+
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE logs_fts USING fts5("
+                    f" title, content, content='logs', content_rowid='id', tokenize='{tokenizer}')"
+                )
+                break
+            except sqlite3.OperationalError:
+                continue
+        else:
+            raise RuntimeError(
+                "this SQLite build has no usable FTS5 tokenizer; "
+                "use AI_LOG_STORAGE_BACKEND=files instead"
+            )
+        conn.executescript(
+            "CREATE TRIGGER IF NOT EXISTS logs_ai AFTER INSERT ON logs BEGIN"
+            "  INSERT INTO logs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);"
+            " END;"
+            "CREATE TRIGGER IF NOT EXISTS logs_ad AFTER DELETE ON logs BEGIN"
+            "  INSERT INTO logs_fts(logs_fts, rowid, title, content)"
+            "  VALUES ('delete', old.id, old.title, old.content);"
+            " END;"
+            "CREATE TRIGGER IF NOT EXISTS logs_au AFTER UPDATE ON logs BEGIN"
+            "  INSERT INTO logs_fts(logs_fts, rowid, title, content)"
+            "  VALUES ('delete', old.id, old.title, old.content);"
+            "  INSERT INTO logs_fts(rowid, title, content) VALUES (new.id, new.title, new.content);"
+            " END;"
+        )
+        return tokenizer
+
+    # =========================
+    # 写入
+    # =========================
+
+    def _upsert_locked(self, rel_path: str, text: str, sig: tuple[int, int] | None):
+        db = self._db()
+        d = _filename_date(rel_path)
+        db.execute(
+            "INSERT INTO logs (rel_path, type, date, title, content, mtime, file_mtime_ns, file_size)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(rel_path) DO UPDATE SET"
+            "  type = excluded.type, date = excluded.date, title = excluded.title,"
+            "  content = excluded.content, mtime = excluded.mtime,"
+            "  file_mtime_ns = excluded.file_mtime_ns, file_size = excluded.file_size",
+            (rel_path, rel_path.split("/", 1)[0], d.isoformat() if d else None, _title(rel_path),
+             text, time.time(), sig[0] if sig else None, sig[1] if sig else None)
+        )
+        log_id = db.execute("SELECT id FROM logs WHERE rel_path = ?", (rel_path,)).fetchone()[0]
+        db.execute("DELETE FROM log_dates WHERE log_id = ?", (log_id,))
+        db.executemany(
+            "INSERT INTO log_dates (log_id, date) VALUES (?, ?)",
+            [(log_id, d.isoformat()) for d in sorted(_all_dates(rel_path, text))]
+        )
+
+    def _export_file(self, rel_path: str, text: str, dest_dir: Path) -> tuple[int, int]:
+        path = dest_dir / rel_path
+        write_text_durable(path, text)
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def put(self, rel_path: str, text: str):
+        """
+        保存一条日志：先导出 txt（落盘），再入库
+        两步之间崩溃时 txt 已经在，下次 sync 会把它补进库里
+        路径不合法时抛 ValueError（见 check_log_path），什么都不写
+        """
+        check_log_path(rel_path, self.storage_dir)
+        with self._lock:
+            sig = self._export_file(rel_path, text, self.storage_dir)
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert_locked(rel_path, text, sig)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def put_many(self, items, export: bool = True) -> int:
+        """
+        批量写入 [(rel_path, text), ...]：一个事务提交；export=True 时同时导出 txt
+        - 事务开始前把每个文件写成 <rel_path>.pending（fsync），事务里不做文件 I/O
+        - 提交后再逐个改名成 .txt；提交失败就删掉临时文件，txt 树保持原样
+        - 改名前崩溃留下的 .pending 由下次全量 sync 补完（见 _finish_staged_locked）
+        """
+        items = [(rel_path, text) for rel_path, text in items if _valid_rel_path(rel_path)]
+        with self._lock:
+            staged = []
+            try:
+                if export:
+                    for rel_path, text in items:
+                        tmp = self.storage_dir / (rel_path + STAGED_SUFFIX)
+                        write_text_durable(tmp, text)
+                        staged.append((rel_path, tmp))
+
+                db = self._db()
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    for rel_path, text in items:
+                        self._upsert_locked(rel_path, text, None)
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            except BaseException:
+                for _, tmp in staged:
+                    tmp.unlink(missing_ok=True)
+                raise
+
+            sigs = []
+            for rel_path, tmp in staged:
+                path = self.storage_dir / rel_path
+                os.replace(tmp, path)
+                st = path.stat()
+                sigs.append((st.st_mtime_ns, st.st_size, rel_path))
+            if sigs:
+                # 记下导出后的 stat，下次 sync 不用重读这些文件
+                db.executemany("UPDATE logs SET file_mtime_ns = ?, file_size = ? WHERE rel_path = ?", sigs)
+        return len(items)
+
+    # =========================
+    # txt 树 ↔ 数据库
+    # =========================
+
+    def sync(self, paths=None) -> dict:
+        """
+        txt 树 → 数据库（stat 比对，只读变化的文件）
+        paths 为相对路径集合时只看这些文件；None 时全量比对（含删除）
+        """
+        seen = {}
+        if paths is not None:
+            for rel_path in paths:
+                if not _valid_rel_path(rel_path):
+                    continue
+                full = self.storage_dir / rel_path
+                try:
+                    st = full.stat()
+                except OSError:
+                    continue
+                seen[rel_path] = (st.st_mtime_ns, st.st_size, str(full))
+
+        updated = removed = 0
+        with self._lock:
+            db = self._db()
+            if paths is None:
+                # 先补完上次没改完名的批量写入，再做全量 stat 比对
+                self._finish_staged_locked()
+                seen = scan_storage(self.storage_dir)
+            known = {
+                r[0]: (r[1], r[2])
+                for r in db.execute("SELECT rel_path, file_mtime_ns, file_size FROM logs")
+            }
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for rel_path, (mtime_ns, size, full) in seen.items():
+                    if known.get(rel_path) == (mtime_ns, size):
+                        continue
+                    try:
+                        text = Path(full).read_text(encoding="utf-8")
+                    except (OSError, UnicodeDecodeError):
+                        continue
+                    self._upsert_locked(rel_path, text, (mtime_ns, size))
+                    updated += 1
+
+                gone = [p for p in known if p not in seen] if paths is None else \
+                       [p for p in paths if p in known and p not in seen]
+                for rel_path in gone:
+                    db.execute("DELETE FROM logs WHERE rel_path = ?", (rel_path,))
+                    removed += 1
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return {"updated": updated, "removed": removed}
+
+    def _finish_staged_locked(self):
+        """
+        put_many 提交后、改名前崩溃留下的 .pending：内容与库里一致就改名补上，否则丢弃
+        （否则 txt 缺失会被全量 sync 当成删除）
+        """
+        db = self._db()
+        for folder in LOG_FOLDERS:
+            folder_path = self.storage_dir / folder
+            if not folder_path.is_dir():
+                continue
+            for tmp in folder_path.glob("*.txt" + STAGED_SUFFIX):
+                rel_path = f"{folder}/{tmp.name[:-len(STAGED_SUFFIX)]}"
+                row = db.execute("SELECT content FROM logs WHERE rel_path = ?", (rel_path,)).fetchone()
+                try:
+                    if row is not None and tmp.read_text(encoding="utf-8") == row[0]:
+                        os.replace(tmp, self.storage_dir / rel_path)
+                    else:
+                        tmp.unlink()
+                except (OSError, UnicodeDecodeError):
+                    continue
+
+    def export(self, dest_dir: Path | None = None) -> int:
+        """
+        数据库 → txt 树；导出到 storage 本身时顺带记下新的 stat，避免下次 sync 重读
+        """
+        dest_dir = dest_dir or self.storage_dir
+        same = Path(dest_dir).resolve() == Path(self.storage_dir).resolve()
+        with self._lock:
+            db = self._db()
+            rows = db.execute("SELECT rel_path, content FROM logs").fetchall()
+            for rel_path, text in rows:
+                sig = self._export_file(rel_path, text, Path(dest_dir))
+                if same:
+                    db.execute(
+                        "UPDATE logs SET file_mtime_ns = ?, file_size = ? WHERE rel_path = ?",
+                        (sig[0], sig[1], rel_path)
+                    )
+        return len(rows)
+
+    # =========================
+    # 查询
+    # =========================
+
+    def list_logs(self, log_type: str) -> list[dict]:
+        """
+        某一类日志，按（文件名日期, 文件名）倒序；没日期的在最后
+        返回 [{"rel_path", "filename", "date", "content"}]，date 为 datetime 或 None
+        """
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT rel_path, date, content FROM logs WHERE type = ?"
+                " ORDER BY date IS NULL, date DESC, rel_path DESC",
+                (log_type,)
+            ).fetchall()
+        return [
+            {
+                "rel_path": rel_path,
+                "filename": rel_path.split("/", 1)[1],
+                "date": datetime.strptime(d, "%Y-%m-%d") if d else None,
+                "content": content,
+            }
+            for rel_path, d, content in rows
+        ]
+
+    def all_logs(self) -> list[tuple[str, str]]:
+        """
+        全部日志 [(rel_path, content)]，按 LOG_FOLDERS 顺序、同类按文件名升序
+        （与逐目录 sorted(glob) 的顺序一致）
+        """
+        order = {t: i for i, t in enumerate(LOG_FOLDERS)}
+        with self._lock:
+            rows = self._db().execute("SELECT rel_path, type, content FROM logs").fetchall()
+        rows.sort(key=lambda r: (order.get(r[1], len(order)), r[0]))
+        return [(rel_path, content) for rel_path, _, content in rows]
+
+    def get_many(self, paths) -> dict[str, str]:
+        paths = [p for p in paths if isinstance(p, str)]
+        if not paths:
+            return {}
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT rel_path, content FROM logs WHERE rel_path IN ({','.join('?' * len(paths))})",
+                paths
+            ).fetchall()
+        return dict(rows)
+
+    def by_date(self, log_types, start: date, end: date, limit: int) -> list[str]:
+        """
+        日期区间 [start, end]（闭区间）内的日志，新的在前，去重
+        语义同 DateIndex.query
+        """
+        log_types = list(log_types)
+        if not log_types:
+            return []
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT l.rel_path, MAX(d.date) AS latest FROM log_dates d"
+                " JOIN logs l ON l.id = d.log_id"
+                f" WHERE d.date BETWEEN ? AND ? AND l.type IN ({','.join('?' * len(log_types))})"
+                " GROUP BY l.id ORDER BY latest DESC, l.rel_path DESC LIMIT ?",
+                [start.isoformat(), end.isoformat(), *log_types, limit]
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def search(self, query: str, log_type: str | None = None,
+               limit: int = SEARCH_DEFAULT_LIMIT) -> list[dict]:
+        """
+        全文检索：空格分开的词全部命中（AND）
+        - trigram 分词下 ≥3 字的词走 FTS5 MATCH，更短的词退回 LIKE 子串匹配
+        - 有 MATCH 时按 bm25 排序，否则按日期倒序
+        返回 [{"path", "date", "title", "snippet"}]
+        """
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return []
+
+        long_terms = [t for t in terms if len(t) >= 3 or self.fts_tokenizer == "unicode61"]
+        short_terms = [t for t in terms if t not in long_terms]
+
+        where, params = [], []
+        for t in short_terms:
+            where.append("(l.content LIKE ? ESCAPE '\\' OR l.title LIKE ? ESCAPE '\\')")
+            pattern = "%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern, pattern])
+        if log_type:
+            where.append("l.type = ?")
+            params.append(log_type)
+        condition = f" WHERE {' AND '.join(where)}" if where else ""
+
+        if long_terms:
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            sql = (
+                "SELECT l.rel_path, l.date, l.title, l.content FROM logs l"
+                " JOIN (SELECT rowid, bm25(logs_fts) AS rank FROM logs_fts WHERE logs_fts MATCH ?) f"
+                f" ON f.rowid = l.id{condition} ORDER BY f.rank LIMIT ?"
+            )
+            params = [match, *params, limit]
+        else:
+            sql = (
+                "SELECT l.rel_path, l.date, l.title, l.content FROM logs l"
+                f"{condition} ORDER BY l.date DESC, l.rel_path DESC LIMIT ?"
+            )
+            params.append(limit)
+
+        with self._lock:
+            try:
+                rows = self._db().execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [
+            {"path": rel_path, "date": d, "title": title, "snippet": make_snippet(content)}
+            for rel_path, d, title, content in rows
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._db()
+            by_type = dict(db.execute("SELECT type, COUNT(*) FROM logs GROUP BY type").fetchall())
+            return {
+                "backend": STORAGE_BACKEND,
+                "path": str(self.path),
+                "fts_tokenizer": self.fts_tokenizer,
+                "logs": sum(by_type.values()),
+                "by_type": by_type,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_log_store() -> LogStore:
+    """
+    进程内共享一个存储引擎；第一次取用时把 txt 树同步进库
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            store = LogStore()
+            store.sync()
+            _store = store
+        return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite log store: sync / export / stats")
+    parser.add_argument("command", choices=["sync", "export", "stats"])
+    parser.add_argument("--dest", type=Path, default=None, help="export target (default: storage/)")
+    args = parser.parse_args(argv)
+
+    store = LogStore()
+    if args.command == "sync":
+        result = store.sync()
+    elif args.command == "export":
+        # 不先 sync：库是导出的来源，txt 树缺的文件正是要补出来的
+        result = {"exported": store.export(args.dest)}
+    else:
+        store.sync()
+        result = store.stats()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
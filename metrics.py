@@ -0,0 +1,138 @@
+# metrics.py
+"""
+进程内耗时统计（Prometheus 文本格式导出，不依赖 prometheus_client）
+
+- span("router", state="S1")：计时一个阶段，结束时记进直方图
+- 所有阶段共用一个直方图 ailog_stage_seconds，标签 stage / state / type
+  （type 是本轮结果类型 1-1 / 1-2 / 2-1 …，不适用时为空）
+- server/api.py 的 /api/metrics 调 render() 输出
+
+放在项目根目录（和 app_paths.py 一样），orchestrator / state / derived 都可以直接引用。
+"""
+import functools
+import threading
+import time
+
+
+# 秒；覆盖从本地索引的毫秒级到 LLM 调用的几十秒
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}       # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(k, list(v)) for k, v in items]
+        for key, series in items:
+            pairs = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', repr(float(bound)))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "ailog_stage_seconds",
+    "Time spent in each stage of turn handling and background maintenance.",
+    ("stage", "state", "type"),
+)
+
+HTTP_SECONDS = Histogram(
+    "ailog_http_request_seconds",
+    "HTTP request handling time by route template and status code.",
+    ("method", "route", "status"),
+)
+
+
+class span:
+    """
+    阶段计时；既可以 with span(...) as s，也可以 s = span(...).start() … s.stop()
+    - s.set(type="1-2")：结束前补标签（结果类型往往要等解析完才知道）
+    - with 块里抛异常且没设置 type 时，type 记为 "error"
+    """
+
+    def __init__(self, stage: str, **labels):
+        self.labels = {"stage": stage, **labels}
+        self._start = None
+
+    def set(self, **labels) -> "span":
+        self.labels.update(labels)
+        return self
+
+    def start(self) -> "span":
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self, **labels):
+        if self._start is None:
+            return
+        self.labels.update(labels)
+        STAGE_SECONDS.observe(time.perf_counter() - self._start, **self.labels)
+        self._start = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self.labels.get("type"):
+            self.labels["type"] = "error"
+        self.stop()
+        return False
+
+
+def timed(stage: str):
+    """
+    装饰器版本：整个函数算一个阶段
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def gauge_lines(name: str, help_text: str, value, metric_type: str = "gauge") -> list[str]:
+    """
+    单值指标（缓存命中数、token 累计等）的导出行
+    """
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+
+
+def render(extra_lines=()) -> str:
+    lines = STAGE_SECONDS.render() + HTTP_SECONDS.render() + list(extra_lines)
+    return "\n".join(lines) + "\n"
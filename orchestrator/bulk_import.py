@@ -0,0 +1,467 @@
+# orchestrator/bulk_import.py
+"""
+批量导入历史笔记
+
+职责：
+- 读入：文件夹（.txt / .md，一个文件一条）、markdown（按带日期的标题拆成多条）、JSONL 导出
+- 分类：笔记按条数 / 字数打包成批，有界线程池并发调用 LLM（prompt_bulk_import），
+  一批一次往返，整理成 任务 / 反馈 / 事件 / 目标 四类
+- 写入：路径与正文格式沿用 S2 的规则（orchestrator/confirm.py），攒够一批写一次；
+  同一路径的多条合并，已存在的文件只追加新内容（重复导入不会重复写）
+- 重建：全部写完后，索引 / 派生视图 / 相似度向量 / 用户画像各全量重建一次，
+  不按文件逐个触发
+
+注意：
+- 不经过 S1 → S2 对话流程，也不计入任何会话
+- 分类结果走 LLM 响应缓存：同一份导出中断后重跑，已分类过的批次不再发请求
+
+用法（项目根目录）：
+    python -m orchestrator.bulk_import ~/notes/
+    python -m orchestrator.bulk_import journal.md
+    python -m orchestrator.bulk_import export.jsonl --dry-run
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from pathlib import Path
+import argparse
+import json
+import re
+import time
+
+from app_paths import STORAGE_DIR
+from agent.llm import get_llm, LLMError
+from agent.prompt import prompt_bulk_import
+from agent.prompt_builder import PromptBuilder
+from schema.response import parse_llm_json, import_entries_xml
+
+from orchestrator.confirm import TYPE_FOLDERS, DATED_FOLDERS, NAME_MAX_CHARS, log_path, format_log, safe_name
+from state.build_user_profile import build_user_profile, chunk_texts
+from state.build_file_index import build_file_index
+from state.similarity import get_vector_store
+from derived.build_derived_logs import build_derived_logs
+from log_store import use_log_store, get_log_store, write_text_durable
+
+from metrics import span
+
+
+# 并发分类的线程数（同时在途的 LLM 请求上限）
+IMPORT_WORKERS = 4
+
+# 每批最多几条笔记 / 多少字符（超长的单条笔记按段落拆开）
+IMPORT_BATCH_ENTRIES = 8
+IMPORT_BATCH_CHARS = 6000
+
+# 攒够多少条日志写一次
+IMPORT_WRITE_BATCH = 50
+
+# 离线任务：截止时间放宽，多重试几次
+IMPORT_TIMEOUT_SECONDS = 120.0
+IMPORT_RETRIES = 3
+
+# 文件夹导入时收哪些文件
+IMPORT_SUFFIXES = (".txt", ".md", ".markdown")
+
+# JSONL 每行里依次尝试的正文 / 标题 / 日期字段
+JSONL_TEXT_KEYS = ("text", "content", "body", "entry", "note", "内容")
+JSONL_TITLE_KEYS = ("title", "subject", "标题")
+JSONL_DATE_KEYS = ("date", "created_at", "created", "timestamp", "time", "日期")
+
+_DATE_ANY = re.compile(r"(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?")
+_HEADING = re.compile(r"^#{1,6}\s+(.+)$", re.MULTILINE)
+
+
+# =========================
+# 读入：统一成 {"source", "date", "text"}
+# =========================
+
+def find_date(text: str) -> date | None:
+    """
+    文本里第一个能解析的日期（2025-03-01 / 2025/3/1 / 2025.03.01 / 2025年3月1日）
+    """
+    for m in _DATE_ANY.finditer(text):
+        try:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            continue
+    return None
+
+
+def _entry(source: str, day: date | None, text: str) -> dict | None:
+    text = text.strip()
+    if not text:
+        return None
+    return {"source": source, "date": day, "text": text}
+
+
+def split_markdown(text: str, source: str, default_date: date | None) -> list[dict]:
+    """
+    按“带日期的标题”拆分（# 2025-03-01 / ## 3月1日周六 2025/3/1 …）；
+    没有带日期的标题时整篇算一条。其余标题留在所属段落里。
+    """
+    cuts = [(m.start(), find_date(m.group(1))) for m in _HEADING.finditer(text)]
+    cuts = [(pos, d) for pos, d in cuts if d is not None]
+    if not cuts:
+        return [e for e in [_entry(source, default_date, text)] if e]
+
+    entries = [_entry(source, default_date, text[:cuts[0][0]])]
+    for i, (pos, d) in enumerate(cuts):
+        end = cuts[i + 1][0] if i + 1 < len(cuts) else len(text)
+        entries.append(_entry(f"{source}#{d}", d, text[pos:end]))
+    return [e for e in entries if e]
+
+
+def read_text_file(path: Path) -> list[dict]:
+    try:
+        text = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return []
+    day = find_date(path.name) or date.fromtimestamp(path.stat().st_mtime)
+    if path.suffix.lower() in (".md", ".markdown"):
+        return split_markdown(text, str(path), day)
+    return [e for e in [_entry(str(path), day, text)] if e]
+
+
+def _jsonl_date(value) -> date | None:
+    if isinstance(value, (int, float)) and value > 0:
+        seconds = value / 1000 if value > 1e12 else value     # 毫秒时间戳
+        try:
+            return datetime.fromtimestamp(seconds).date()
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        return find_date(value)
+    return None
+
+
+def read_jsonl(path: Path) -> list[dict]:
+    entries = []
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except (OSError, UnicodeDecodeError):
+        return []
+    for n, line in enumerate(lines, 1):
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(obj, str):
+            obj = {"text": obj}
+        if not isinstance(obj, dict):
+            continue
+        text = next((obj[k] for k in JSONL_TEXT_KEYS if isinstance(obj.get(k), str)), "")
+        title = next((obj[k] for k in JSONL_TITLE_KEYS if isinstance(obj.get(k), str)), "")
+        day = next((d for d in (_jsonl_date(obj.get(k)) for k in JSONL_DATE_KEYS) if d), None)
+        entry = _entry(f"{path}:{n}", day or find_date(title), f"{title}\n{text}" if title else text)
+        if entry:
+            entries.append(entry)
+    return entries
+
+
+def read_source(path: Path) -> list[dict]:
+    """
+    文件夹 / .jsonl / .md / .txt → 笔记列表（文件夹按路径排序、递归）
+    """
+    path = Path(path).expanduser()
+    if path.is_dir():
+        entries = []
+        for p in sorted(path.rglob("*")):
+            if p.is_file() and p.suffix.lower() in IMPORT_SUFFIXES:
+                entries.extend(read_text_file(p))
+            elif p.is_file() and p.suffix.lower() == ".jsonl":
+                entries.extend(read_jsonl(p))
+        return entries
+    if path.suffix.lower() == ".jsonl":
+        return read_jsonl(path)
+    return read_text_file(path)
+
+
+def split_long_entries(entries: list[dict], limit: int = IMPORT_BATCH_CHARS) -> list[dict]:
+    """
+    超过一批字数上限的笔记按段落拆成几条（日期、来源不变）
+    """
+    out = []
+    for e in entries:
+        if len(e["text"]) <= limit:
+            out.append(e)
+            continue
+        paragraphs = [p for p in re.split(r"\n\s*\n", e["text"]) if p.strip()]
+        out.extend({**e, "text": chunk} for chunk in chunk_texts(paragraphs, limit))
+    return out
+
+
+def make_batches(entries: list[dict],
+                 max_entries: int = IMPORT_BATCH_ENTRIES,
+                 max_chars: int = IMPORT_BATCH_CHARS) -> list[list[tuple[int, dict]]]:
+    """
+    按顺序打包：[(编号, 笔记), ...]；编号在整次导入内唯一，用来对回 LLM 的输出
+    """
+    batches, cur, size = [], [], 0
+    for i, e in enumerate(entries):
+        if cur and (len(cur) >= max_entries or size + len(e["text"]) > max_chars):
+            batches.append(cur)
+            cur, size = [], 0
+        cur.append((i, e))
+        size += len(e["text"])
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+# =========================
+# 分类
+# =========================
+
+def _normalize(item: dict, entry: dict) -> dict | None:
+    """
+    LLM 输出的一条 → {"path", "folder", "day", "content"}；字段不合法返回 None
+    """
+    folder = TYPE_FOLDERS.get(str(item.get("类型", "")).strip().lower())
+    content = str(item.get("内容", "")).strip()
+    if folder is None or not content:
+        return None
+
+    day = find_date(str(item.get("日期", ""))) or entry["date"]
+    if day is None:
+        return None
+    written = entry["date"] or day
+
+    name = None
+    if folder not in DATED_FOLDERS:
+        name = safe_name(str(item.get("名称", "")))[:NAME_MAX_CHARS] or \
+            safe_name(re.split(r"[，,。.；;！!？?\n]", content, maxsplit=1)[0])[:NAME_MAX_CHARS]
+
+    path = log_path(folder, day, written, name)
+    if path is None:
+        return None
+    return {"path": path, "folder": folder, "day": day, "content": content}
+
+
+def classify_batch(batch: list[tuple[int, dict]]) -> tuple[list[dict], int]:
+    """
+    一批笔记一次 LLM 调用，返回 (整理好的日志, 丢弃的条数)
+    """
+    prompt = (
+        PromptBuilder()
+        .static(prompt_bulk_import)
+        .turn(import_entries_xml([(i, e["date"], e["text"]) for i, e in batch]))
+        .build()
+    )
+    raw = get_llm().generate(
+        prompt, cache=True, timeout=IMPORT_TIMEOUT_SECONDS, retries=IMPORT_RETRIES, site="import"
+    )
+    result = parse_llm_json(raw)
+    items = result.get("content") if isinstance(result, dict) and result.get("type") == "4-1" else None
+    if not isinstance(items, list):
+        raise ValueError("unexpected bulk import output")
+
+    by_id = dict(batch)
+    logs, dropped = [], 0
+    for item in items:
+        try:
+            entry_id = int(item.get("id"))
+        except (AttributeError, TypeError, ValueError):
+            dropped += 1
+            continue
+        entry = by_id.get(entry_id)
+        log = _normalize(item, entry) if entry is not None else None
+        if log is None:
+            dropped += 1
+            continue
+        logs.append({**log, "order": entry_id})
+    return logs, dropped
+
+
+# =========================
+# 写入
+# =========================
+
+def _existing_contents(text: str) -> set[str]:
+    """
+    已有文件里每条“内容：”的完整文本（含其后的续行，直到下一个字段行）
+    """
+    blocks, cur = [], None
+    for line in text.splitlines():
+        if line.startswith("内容："):
+            cur = [line[len("内容："):]]
+            blocks.append(cur)
+        elif line.startswith(("类型：", "日期：")):
+            cur = None
+        elif cur is not None:
+            cur.append(line)
+    return {"\n".join(block).strip() for block in blocks}
+
+
+def _merge(existing: str | None, folder: str, day: date, contents: list[str]) -> str | None:
+    """
+    同一路径的多条内容合并成一个文件；已存在的文件只追加它还没有的内容
+    （按整条“内容：”比较，不按子串：“跑步”不会因为已有“跑步五公里”被跳过）
+    没有新内容时返回 None
+    """
+    seen = _existing_contents(existing) if existing is not None else set()
+    new = []
+    for c in contents:
+        c = c.strip()
+        if c and c not in seen:
+            new.append(c)
+            seen.add(c)
+    if not new:
+        return None
+    if existing is None:
+        head, rest = format_log(folder, day, new[0]), new[1:]
+    else:
+        head, rest = existing.rstrip(), new
+    return "\n".join([head] + [f"内容：{c}" for c in rest])
+
+
+class BatchWriter:
+    """
+    攒批写入：add 只进内存，够 IMPORT_WRITE_BATCH 条或 close 时一次性落盘
+    - SQLite 存储引擎启用时整批一个事务（并导出 txt）
+    - 否则逐个文件落盘写入（与 S2 保存相同的 write_text_durable）
+    """
+
+    def __init__(self, write_batch: int = IMPORT_WRITE_BATCH, dry_run: bool = False):
+        self.write_batch = write_batch
+        self.dry_run = dry_run
+        self._pending = {}          # path -> {"folder", "day", "items": [(order, content)]}
+        self._count = 0
+        self.written = []           # 写过的相对路径
+        self.skipped = 0            # 已存在、无需重复写的条数
+
+    def add(self, log: dict):
+        slot = self._pending.setdefault(
+            log["path"], {"folder": log["folder"], "day": log["day"], "items": []}
+        )
+        slot["items"].append((log["order"], log["content"]))
+        self._count += 1
+        if self._count >= self.write_batch:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending, self._count = self._pending, {}, 0
+
+        items = []
+        for rel_path in sorted(pending):
+            slot = pending[rel_path]
+            contents = [c for _, c in sorted(slot["items"], key=lambda x: x[0])]
+            full = STORAGE_DIR / rel_path
+            try:
+                existing = full.read_text(encoding="utf-8") if full.exists() else None
+            except (OSError, UnicodeDecodeError):
+                existing = None
+            text = _merge(existing, slot["folder"], slot["day"], contents)
+            if text is None:
+                self.skipped += len(contents)
+                continue
+            items.append((rel_path, text))
+
+        if not self.dry_run and items:
+            with span("import_write"):
+                if use_log_store():
+                    get_log_store().put_many(items)
+                else:
+                    for rel_path, text in items:
+                        write_text_durable(STORAGE_DIR / rel_path, text)
+        self.written.extend(p for p, _ in items)
+
+    def close(self):
+        self.flush()
+
+
+# =========================
+# 入口
+# =========================
+
+def rebuild_all(profile: bool = True):
+    """
+    导入结束后的全量重建（各一次）
+    """
+    build_file_index()
+    build_derived_logs()
+    get_vector_store().sync()
+    if profile:
+        build_user_profile(force=True)
+
+
+def bulk_import(sources,
+                workers: int = IMPORT_WORKERS,
+                batch_entries: int = IMPORT_BATCH_ENTRIES,
+                batch_chars: int = IMPORT_BATCH_CHARS,
+                write_batch: int = IMPORT_WRITE_BATCH,
+                dry_run: bool = False,
+                profile: bool = True) -> dict:
+    """
+    读入 → 并发分类 → 攒批写入 → 一次性重建；返回导入报告
+    """
+    start = time.perf_counter()
+
+    entries = []
+    for source in sources:
+        entries.extend(read_source(Path(source)))
+    entries = split_long_entries(entries, batch_chars)
+    batches = make_batches(entries, batch_entries, batch_chars)
+
+    writer = BatchWriter(write_batch, dry_run=dry_run)
+    dropped, failed = 0, []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="import") as pool:
+        futures = {pool.submit(classify_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                logs, n = future.result()
+            except (LLMError, ValueError) as e:
+                failed.append({
+                    "sources": sorted({entry["source"] for _, entry in futures[future]}),
+                    "error": str(e),
+                })
+                continue
+            dropped += n
+            for log in logs:
+                writer.add(log)
+    writer.close()
+
+    if writer.written and not dry_run:
+        with span("import_rebuild"):
+            rebuild_all(profile=profile)
+
+    return {
+        "entries": len(entries),
+        "batches": len(batches),
+        "failed_batches": failed,
+        "dropped_items": dropped,
+        "written_files": len(writer.written),
+        "skipped_duplicates": writer.skipped,
+        "files": writer.written,
+        "dry_run": dry_run,
+        "elapsed_s": round(time.perf_counter() - start, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="bulk import notes (folder / markdown / JSONL) into storage/")
+    parser.add_argument("sources", nargs="+", type=Path)
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="concurrent LLM calls")
+    parser.add_argument("--batch-entries", type=int, default=IMPORT_BATCH_ENTRIES, help="notes per LLM call")
+    parser.add_argument("--batch-chars", type=int, default=IMPORT_BATCH_CHARS, help="characters per LLM call")
+    parser.add_argument("--write-batch", type=int, default=IMPORT_WRITE_BATCH, help="logs per storage write")
+    parser.add_argument("--dry-run", action="store_true", help="classify only, write nothing")
+    parser.add_argument("--no-profile", action="store_true", help="skip the user profile rebuild")
+    args = parser.parse_args(argv)
+
+    report = bulk_import(
+        args.sources,
+        workers=args.workers,
+        batch_entries=args.batch_entries,
+        batch_chars=args.batch_chars,
+        write_batch=args.write_batch,
+        dry_run=args.dry_run,
+        profile=not args.no_profile,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    get_llm().close()
+
+
+if __name__ == "__main__":
+    main()
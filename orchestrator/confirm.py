@@ -0,0 +1,191 @@
+# orchestrator/confirm.py
+"""
+S2 确认快速通道：不调用 LLM，直接保存现有草稿
+
+职责：
+- is_confirmation：判断用户输入是不是单纯的“确认 / 好的 / 可以”
+- finalize_draft：从草稿里取出“类型 / 日期”，按 prompt2 的路径规则生成
+  相对路径，并去掉草稿前后的说明和确认询问，得到最终日志正文
+- log_path / format_log：prompt2 的路径规则与日志正文格式（批量导入也用）
+
+只处理有把握的情况；任何一步拿不准都返回 None，交回 LLM 走正常的 S2 流程
+（修改意见 2-2、跳出聊天 2-3 本来就需要 LLM）。
+"""
+
+from datetime import date, datetime
+import re
+
+
+# 草稿里的类型 → 日志文件夹（与 prompt2 的固定文件夹规则一致）
+TYPE_FOLDERS = {
+    "任务": "tasks", "task": "tasks",
+    "反馈": "feedback", "feedback": "feedback",
+    "事件": "events", "event": "events",
+    "目标": "goals", "goal": "goals",
+}
+
+# 日志文件夹 → 正文里“类型：”后的中文名
+FOLDER_LABELS = {"tasks": "任务", "feedback": "反馈", "events": "事件", "goals": "目标"}
+
+# 文件名 = 日期 的类型；其余类型文件名 = 简短名称 + 当前日期
+DATED_FOLDERS = ("tasks", "feedback")
+
+# 事件 / 目标名称的长度上限；本地取不出这么短的名称就交给 LLM
+NAME_MAX_CHARS = 12
+
+# 单独出现即表示确认的词（可以连用，如“好的，确认保存”）
+CONFIRM_WORDS = (
+    "确认", "确定", "确认无误", "没问题", "没有问题", "可以", "好的", "好", "行", "对",
+    "是的", "是", "嗯", "保存", "就这样", "同意", "ok", "okay", "yes",
+)
+
+# 可以夹在确认词之间 / 末尾的语气词和标点
+_FILLER = re.compile(r"[\s,，.。!！~～、;；…]+|[吧呀啊哦呢嘛啦了的]")
+
+# 草稿末尾“是否确认 / 请提出修改”这类询问的特征词：
+# 只用来识别“最后一行像询问但没以问号结尾”的含糊草稿，不用来截断正文
+_ASK_WORDS = ("确认", "修改")
+
+_FIELD = re.compile(r"^(类型|日期|内容)\s*[：:]\s*(.*)$")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# 名称里不允许出现的字符（路径分隔符、Windows 保留字符、空白）
+_UNSAFE_NAME = re.compile(r"[\\/:*?\"<>|\s]")
+
+# 从内容开头剥掉的时间 / 主语修饰，剩下的才是名称
+_NAME_PREFIX = re.compile(
+    r"^(?:我|我们|今天|明天|后天|昨天|本周|下周[一二三四五六日天]?|这周|这个月|下个月|这个学期|本学期"
+    r"|\d{4}-\d{2}-\d{2}|\d{1,2}月\d{1,2}[日号]|[上下]午|晚上|要|将|会|计划|打算|需要|的目标是|目标是)+"
+)
+
+
+def _normalize(text: str) -> str:
+    return _FILLER.sub("", text).lower()
+
+
+def is_confirmation(user_input: str) -> bool:
+    """
+    输入是否只由确认词（和语气词、标点）组成
+    “可以，但是把时间改到三点”“不可以”这类都不算
+    """
+    rest = _normalize(user_input)
+    if not rest:
+        return False
+    words = sorted(CONFIRM_WORDS, key=len, reverse=True)
+    while rest:
+        for word in words:
+            if rest.startswith(word):
+                rest = rest[len(word):]
+                break
+        else:
+            return False
+    return True
+
+
+def _draft_fields(draft: str) -> tuple[dict, str] | None:
+    """
+    取出草稿里的字段和日志正文：从“类型”行开始到末尾，
+    只去掉最后一个非空行上的确认询问（以 ？/? 结尾）
+    拿不准时返回 None，交给 LLM：
+    - 最后一行不是问句，却带“确认 / 修改”（如“请确认或提出修改。”）
+    - 正文中间有空行（分不清是日志内容还是附加说明）
+    """
+    lines = [line.strip() for line in draft.splitlines()]
+    start = next((i for i, line in enumerate(lines) if line.startswith("类型")), None)
+    if start is None:
+        return None
+
+    body = lines[start:]
+    while body and not body[-1]:
+        body.pop()
+    if not body:
+        return None
+
+    last = body[-1]
+    if not _FIELD.match(last):
+        if last.endswith(("？", "?")):
+            body.pop()
+        elif any(w in last for w in _ASK_WORDS):
+            return None
+    while body and not body[-1]:
+        body.pop()
+    if not body or "" in body:
+        return None
+
+    fields = {}
+    for line in body:
+        m = _FIELD.match(line)
+        if m:
+            fields.setdefault(m.group(1), m.group(2).strip())
+    return fields, "\n".join(body)
+
+
+def safe_name(name: str) -> str:
+    """
+    去掉文件名里不允许的字符（路径分隔符、Windows 保留字符、空白）
+    """
+    return _UNSAFE_NAME.sub("", name or "")
+
+
+def _event_name(content: str) -> str | None:
+    """
+    从内容的第一句里取一个简短名称；取不出（太长 / 为空）返回 None
+    """
+    first = re.split(r"[，,。.；;！!？?\n]", content, maxsplit=1)[0]
+    name = safe_name(_NAME_PREFIX.sub("", first.strip()))
+    if not name or len(name) > NAME_MAX_CHARS:
+        return None
+    return name
+
+
+def log_path(folder: str, day: date, written: date, name: str | None = None) -> str | None:
+    """
+    prompt2 的路径规则：
+    - 任务 / 反馈：<folder>/<日志日期>.txt
+    - 事件 / 目标：<folder>/<简短名称><写下这条日志的日期>.txt（名称不合法时返回 None）
+    """
+    if folder in DATED_FOLDERS:
+        return f"{folder}/{day}.txt"
+    name = safe_name(name)
+    if not name or len(name) > NAME_MAX_CHARS:
+        return None
+    return f"{folder}/{name}{written}.txt"
+
+
+def format_log(folder: str, day: date, content: str) -> str:
+    """
+    日志正文的标准格式（与 S1 草稿 / 现有 storage 里的文件一致）
+    """
+    return f"类型：{FOLDER_LABELS[folder]}\n日期：{day}\n内容：{content.strip()}"
+
+
+def finalize_draft(draft: str, today: date) -> tuple[str, str] | None:
+    """
+    草稿 → (相对路径, 日志正文)；规则同 prompt2：
+    - 任务 / 反馈：tasks|feedback/<日期>.txt
+    - 事件 / 目标：events|goals/<简短名称><当前日期>.txt
+    """
+    if not draft:
+        return None
+    parsed = _draft_fields(str(draft))
+    if parsed is None:
+        return None
+    fields, text = parsed
+
+    folder = TYPE_FOLDERS.get(fields.get("类型", "").strip("【】[] ").lower())
+    if folder is None or not fields.get("内容"):
+        return None
+
+    m = _DATE.search(fields.get("日期", ""))
+    if m is None:
+        return None
+    try:
+        day = datetime.strptime(m.group(), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+    name = None if folder in DATED_FOLDERS else _event_name(fields["内容"])
+    path = log_path(folder, day, today, name)
+    if path is None:
+        return None
+    return path, text
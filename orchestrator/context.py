@@ -0,0 +1,233 @@
+# orchestrator/context.py
+"""
+滚动对话上下文 ConversationContext
+
+职责：
+- 替代 Orchestrator.context 这个无限增长的 list
+- 最近 N 轮原样保留；更早的轮次折叠进一份滚动摘要
+- 摘要由后台线程调用 LLM 生成，不占用当前请求的时间
+- 序列化结果分段缓存：摘要 + 待折叠轮次只在它们变化时重算，
+  新增一轮只需重新拼最近轮次
+
+对外行为尽量和 list 一致：append / pop / len / 下标访问
+"""
+import re
+import threading
+
+from agent.prompt import prompt_context_summary
+from schema.response import context_to_text, summary_xml
+
+
+# 默认配置：上下文 token 预算 / 原样保留的最近轮数
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_KEEP_TURNS = 8
+
+# 摘要调用在后台线程里跑，失败下一轮再试
+SUMMARY_TIMEOUT_SECONDS = 60.0
+SUMMARY_RETRIES = 1
+
+# 待折叠轮次的上限：摘要一直失败时丢掉最旧的（退化成截断），避免无限增长
+PENDING_MAX_TURNS = 4 * CONTEXT_KEEP_TURNS
+
+_CJK = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数（不依赖 tokenizer）：
+    - 中日文字符 / 全角标点：约 1 字 1 token
+    - 其余字符：约 4 字符 1 token
+    """
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _turn_text(turn: dict) -> str:
+    return f"{turn['role']}: {turn['content']}"
+
+
+class ConversationContext:
+    """
+    三段结构：
+      summary   —— 已折叠的早期对话摘要
+      pending   —— 已移出“最近 N 轮”、正在等待并入摘要的轮次
+      recent    —— 最近 N 轮，原样保留
+    """
+
+    def __init__(self,
+                 llm=None,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 keep_turns: int = CONTEXT_KEEP_TURNS,
+                 session: str | None = None):
+        self.llm = llm
+        self.session = session
+        self.token_budget = token_budget
+        self.keep_turns = max(1, keep_turns)
+
+        self.summary = ''
+        self._pending: list[dict] = []
+        self._recent: list[dict] = []
+
+        self._lock = threading.Lock()
+        self._summarizing = False
+        self._cached_text = None
+        self._cached_recent = None      # (最近轮次文本, token 数)，_recent 变化时清空
+        self._cached_prefix = None      # (摘要片段, token 数, [(待折叠行, token 数)]，新的在前)
+
+    # =========================
+    # list 兼容接口
+    # =========================
+
+    def append(self, turn: dict):
+        with self._lock:
+            self._recent.append(turn)
+            self._recent_changed()
+            self._fold_locked()
+
+    def pop(self) -> dict:
+        with self._lock:
+            self._recent_changed()
+            return self._recent.pop()
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def __getitem__(self, i):
+        return self._recent[i]
+
+    def __iter__(self):
+        return iter(list(self._recent))
+
+    # =========================
+    # 序列化（带缓存）
+    # =========================
+
+    def to_text(self) -> str:
+        """
+        拼成放进 prompt 的上下文文本：摘要 + 待折叠轮次 + 最近轮次
+        待折叠轮次在超出预算时从最旧的开始丢（它们很快会并进摘要）
+        """
+        with self._lock:
+            if self._cached_text is not None:
+                return self._cached_text
+
+            recent_text, used = self._recent_locked()
+            summary_part, summary_cost, pending = self._prefix_locked()
+            parts = [summary_part] if summary_part else []
+            used += summary_cost
+
+            pending_lines = []
+            for line, cost in pending:
+                if used + cost > self.token_budget:
+                    break
+                pending_lines.append(line)
+                used += cost
+            pending_lines.reverse()
+
+            parts.extend(pending_lines)
+            if recent_text:
+                parts.append(recent_text)
+
+            self._cached_text = "\n".join(parts)
+            return self._cached_text
+
+    def _recent_locked(self) -> tuple[str, int]:
+        if self._cached_recent is None:
+            text = context_to_text(self._recent)
+            self._cached_recent = (text, estimate_tokens(text))
+        return self._cached_recent
+
+    def _prefix_locked(self) -> tuple[str, int, list[tuple[str, int]]]:
+        if self._cached_prefix is None:
+            summary_part = summary_xml(self.summary) if self.summary else ''
+            pending = []
+            for turn in reversed(self._pending):
+                line = _turn_text(turn)
+                pending.append((line, estimate_tokens(line)))
+            self._cached_prefix = (summary_part, estimate_tokens(summary_part), pending)
+        return self._cached_prefix
+
+    def _recent_changed(self):
+        self._cached_recent = None
+        self._cached_text = None
+
+    def _prefix_changed(self):
+        self._cached_prefix = None
+        self._cached_text = None
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.to_text())
+
+    def shrink(self, token_budget: int, keep_turns: int):
+        """
+        收紧预算与保留轮数（只会变小）；多出来的轮次移进 pending 等待摘要
+        """
+        with self._lock:
+            token_budget = min(self.token_budget, token_budget)
+            keep_turns = max(1, min(self.keep_turns, keep_turns))
+            if token_budget == self.token_budget and keep_turns == self.keep_turns:
+                return
+            self.token_budget = token_budget
+            self.keep_turns = keep_turns
+            self._cached_text = None
+            self._fold_locked()
+
+    # =========================
+    # 内部：折叠与后台摘要
+    # =========================
+
+    def _fold_locked(self):
+        """
+        超出轮数或预算时，把最旧的 recent 轮次移到 pending，并触发后台摘要
+        （调用方已持有 self._lock）
+        """
+        while len(self._recent) > 1 and (
+            len(self._recent) > self.keep_turns
+            or self._recent_locked()[1] > self.token_budget
+        ):
+            self._pending.append(self._recent.pop(0))
+            self._recent_changed()
+            self._prefix_changed()
+
+        if len(self._pending) > PENDING_MAX_TURNS:
+            del self._pending[:len(self._pending) - PENDING_MAX_TURNS]
+            self._prefix_changed()
+
+        if self._pending and not self._summarizing and self.llm is not None:
+            self._summarizing = True
+            threading.Thread(target=self._summarize, daemon=True).start()
+
+    def _summarize(self):
+        """
+        后台线程：把 pending 并入 summary；期间新折叠进来的轮次下一轮再处理
+        """
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                previous = self.summary
+                if not batch:
+                    self._summarizing = False
+                    return
+
+            try:
+                new_summary = self.llm.generate(
+                    prompt_context_summary
+                    + summary_xml(previous)
+                    + context_to_text(batch),
+                    cache=True,
+                    timeout=SUMMARY_TIMEOUT_SECONDS,
+                    retries=SUMMARY_RETRIES,
+                    site="summary",
+                    session=self.session
+                ).strip()
+            except Exception:
+                with self._lock:
+                    self._summarizing = False
+                return
+
+            with self._lock:
+                self.summary = new_summary
+                # 摘要期间 pending 可能因超过上限被截掉过头部，按对象身份删掉已并入的轮次
+                merged = {id(turn) for turn in batch}
+                self._pending = [turn for turn in self._pending if id(turn) not in merged]
+                self._prefix_changed()
@@ -0,0 +1,189 @@
+# orchestrator/maintenance.py
+"""
+后台维护队列 MaintenanceQueue
+
+职责：
+- 保存日志后，索引 / 派生文件的重建不再阻塞本轮回复
+- 短时间内的多次保存合并成一次重建（coalescing）
+- 提供状态查询：读方可以知道派生视图是否已经追上最新保存
+
+注意：
+- 进程内单例 maintenance，工作线程在第一次 enqueue 时才启动
+- 任务函数签名为 fn(paths: set[str] | None)，paths 是这一批涉及的相对路径，
+  None 表示需要全量重建
+- 任务抛异常时它这一批的 paths 不会丢：留到下一批（或 FAILED_RETRY_SECONDS 后）重试，
+  在重试成功之前这一批的序号不算完成，caught_up 为 False
+"""
+import threading
+import time
+import traceback
+
+
+# 合并窗口（秒）：收到第一个任务后再等一会儿，把同一波保存攒到一起
+COALESCE_WINDOW_SECONDS = 0.2
+
+# 失败的任务没有新保存带动时，隔多久自动重试一次
+FAILED_RETRY_SECONDS = 30.0
+
+
+def _merge_paths(a: set[str] | None, b: set[str] | None) -> set[str] | None:
+    # None 表示全量；任一方是全量就按全量处理
+    if a is None or b is None:
+        return None
+    return a | b
+
+
+class MaintenanceQueue:
+    """
+    一个工作线程 + 一组“脏标记”：
+    - enqueue 只做标记（同名任务重复入队只会合并 paths）
+    - 工作线程每次把当前所有脏任务一次性取走执行
+    - requested / completed 两个序号用来判断是否已追上
+    """
+
+    def __init__(self,
+                 coalesce_window: float = COALESCE_WINDOW_SECONDS,
+                 retry_delay: float = FAILED_RETRY_SECONDS):
+        self.coalesce_window = coalesce_window
+        self.retry_delay = retry_delay
+
+        self._jobs = {}             # name -> fn(paths)
+        self._order = []            # 注册顺序即执行顺序
+        self._dirty = {}            # name -> set[str] | None（None = 全量）
+        self._failed = {}           # name -> 上次失败时的 paths，等待重试
+
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self._requested = 0         # 已入队的批次序号
+        self._completed = 0         # 已处理完的批次序号
+        self._running = False
+        self._last_error = None
+        self._last_finished_at = None
+
+    def register(self, name: str, fn):
+        with self._cond:
+            if name not in self._jobs:
+                self._order.append(name)
+            self._jobs[name] = fn
+
+    # =========================
+    # 写方：入队
+    # =========================
+
+    def enqueue(self, *names: str, path: str | None = None, paths=()) -> int:
+        """
+        标记若干任务需要执行，返回本次请求的序号（可用于 wait）
+        - path / paths：本次涉及的相对路径；都不给表示全量
+        """
+        changed = set(paths)
+        if path:
+            changed.add(path)
+
+        with self._cond:
+            # 先全部校验，再改状态：不会出现前几个已标脏、却没有发序号的情况
+            for name in names:
+                if name not in self._jobs:
+                    raise KeyError(f"unknown maintenance job: {name}")
+            for name in names:
+                if not changed:
+                    # None 表示全量；一旦有全量请求，这一批就按全量处理
+                    self._dirty[name] = None
+                elif name not in self._dirty:
+                    self._dirty[name] = set(changed)
+                elif self._dirty[name] is not None:
+                    self._dirty[name] |= changed
+
+            self._requested += 1
+            ticket = self._requested
+
+            self._ensure_worker()
+            self._cond.notify_all()
+            return ticket
+
+    # =========================
+    # 读方：状态 / 等待
+    # =========================
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "requested": self._requested,
+                "completed": self._completed,
+                "caught_up": self._completed >= self._requested and not self._failed,
+                "pending": [n for n in self._order if n in self._dirty or n in self._failed],
+                "failed": [n for n in self._order if n in self._failed],
+                "running": self._running,
+                "last_error": self._last_error,
+                "last_finished_at": self._last_finished_at,
+            }
+
+    def wait(self, ticket: int | None = None, timeout: float | None = None) -> bool:
+        """
+        阻塞到序号 ticket（默认：当前为止的全部请求）处理完，超时返回 False
+        """
+        with self._cond:
+            if ticket is None:
+                ticket = self._requested
+            return self._cond.wait_for(lambda: self._completed >= ticket, timeout)
+
+    # =========================
+    # 内部：工作线程
+    # =========================
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run,
+                name="maintenance",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # 只有失败待重试的任务时，等到新任务入队或重试时间到
+                self._cond.wait_for(
+                    lambda: bool(self._dirty),
+                    self.retry_delay if self._failed else None
+                )
+                if not self._dirty and not self._failed:
+                    continue
+
+            # 合并窗口：让紧随其后的保存并进同一批
+            if self.coalesce_window:
+                time.sleep(self.coalesce_window)
+
+            with self._cond:
+                batch, self._dirty = self._dirty, {}
+                for name, paths in self._failed.items():
+                    batch[name] = _merge_paths(batch[name], paths) if name in batch else paths
+                self._failed = {}
+                ticket = self._requested
+                self._running = True
+
+            error = None
+            failed = {}
+            for name in self._order:
+                if name not in batch:
+                    continue
+                try:
+                    self._jobs[name](batch[name])
+                except Exception:
+                    error = f"{name}: {traceback.format_exc(limit=3)}"
+                    failed[name] = batch[name]
+
+            with self._cond:
+                self._running = False
+                if failed:
+                    # 不推进序号：等待这一批的读方 / caught_up 要等重试成功
+                    self._failed = failed
+                else:
+                    self._completed = max(self._completed, ticket)
+                self._last_error = error
+                self._last_finished_at = time.time()
+                self._cond.notify_all()
+
+
+maintenance = MaintenanceQueue()
@@ -18,47 +18,152 @@
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
 
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import asyncio
 import threading
 from pathlib import Path
 
 
-from agent.llm import LLMClient
+from agent.llm import get_llm, get_async_llm, LLMError
 from agent.prompt import prompt1, prompt2
+from agent.prompt_builder import PromptBuilder
+from agent.usage import usage_stats
 
 from schema.response import (
     parse_llm_json,
     user_xml,
     log_xml,
-    context_to_text,
-    log_data_xml
+    log_data_xml,
+    previous_xml,
+    StreamingEnvelopeParser
 )
 
 from state.build_user_profile import build_user_profile
-from state.select_logs import select_relevant_logs
-from state.build_file_index import build_file_index
+from state.select_logs import select_relevant_logs, aselect_relevant_logs
+from state.build_file_index import build_file_index, update_file_index
+from state.similarity import find_duplicates, get_vector_store
+from state.local_retriever import update_retriever
+from log_store import use_log_store, get_log_store, write_text_durable, check_log_path
 
-from derived.build_derived_logs import build_derived_logs
+from derived.build_derived_logs import build_derived_logs, update_derived_logs
+
+from orchestrator.context import ConversationContext
+from orchestrator.maintenance import maintenance
+from orchestrator.confirm import is_confirmation, finalize_draft
+
+from metrics import span
+
+# 保存后的维护任务：先同步存储引擎（启用时），再索引、派生视图、本地检索器，最后相似度向量
+maintenance.register(
+    "log_store",
+    lambda paths: get_log_store().sync(paths)
+)
+maintenance.register(
+    "file_index",
+    lambda paths: update_file_index(paths) if paths else build_file_index()
+)
+maintenance.register(
+    "derived",
+    lambda paths: update_derived_logs(paths) if paths else build_derived_logs()
+)
+maintenance.register(
+    "retriever",
+    update_retriever
+)
+maintenance.register(
+    "vectors",
+    lambda paths: get_vector_store().update(paths) if paths else get_vector_store().sync()
+)
+
+# 一次保存 / 一次外部修改需要触发的全部维护任务
+MAINTENANCE_JOBS = (("log_store",) if use_log_store() else ()) + ("file_index", "derived", "retriever", "vectors")
+
+# =========================
+# 历史日志路由的并行执行配置
+# =========================
+
+# serial：先路由、再主调用（原行为）
+# parallel：路由与“不带历史”的主调用同时发出；路由没选出日志就直接用这次结果
+#           只在异步路径（astep）生效：那里推测调用能真正取消；同步线程停不下来，
+#           丢弃的推测调用照样花 token、计入软预算，所以同步 step 一律按 serial 执行
+HISTORY_MODE = "parallel"
+
+# 路由最多等多久（秒）；超时就不带历史继续本轮
+ROUTER_DEADLINE_SECONDS = 4.0
+
+# 主调用（用户在等的那一次）的截止时间 / 重试次数 / 是否对冲
+TURN_TIMEOUT_SECONDS = 30.0
+TURN_RETRIES = 1
+TURN_HEDGING = True
+
+# LLM 调用最终失败时给用户的回复（本轮输入不计入上下文，状态不变）
+LLM_UNAVAILABLE_REPLY = "抱歉，模型服务暂时不可用，请稍后再试。"
+
+# S2 里模型给出的保存路径不合法时的回复（草稿保留，可以再确认一次）
+INVALID_LOG_PATH_REPLY = "抱歉，这条日志的保存路径不合法，没有保存。请再确认一次或修改草稿。"
+
+# 会话累计输入 token 超过软预算（见 agent/usage.py）后，上下文收紧到这个规模
+TRIMMED_CONTEXT_TOKEN_BUDGET = 1000
+TRIMMED_CONTEXT_KEEP_TURNS = 4
+
+# S2 里单纯的“确认 / 好的 / 可以”直接保存现有草稿，不调用 LLM（见 orchestrator/confirm.py）
+S2_FAST_CONFIRM = True
+
+# 同步 step 用的线程池（路由带截止时间）
+_history_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="history")
 
 # =========================
 # 内部工具函数
 # =========================
 
+# 画像更新每个进程只触发一次（多会话时每个 Orchestrator 都会调用）；同一时刻只允许一个在跑
+_profile_lock = threading.Lock()
+_profile_triggered = False
+_profile_triggered_lock = threading.Lock()
+
+
+def _build_user_profile_once():
+    if not _profile_lock.acquire(blocking=False):
+        return
+    try:
+        build_user_profile()
+    finally:
+        _profile_lock.release()
+
+
 def trigger_user_profile_async():
     """
-    后台异步触发用户画像更新
+    后台异步触发用户画像更新（进程内只有第一次调用生效）
     """
+    global _profile_triggered
+    with _profile_triggered_lock:
+        if _profile_triggered:
+            return
+        _profile_triggered = True
     t = threading.Thread(
-        target=build_user_profile,
+        target=_build_user_profile_once,
         daemon=True
     )
     t.start()
 
 
-def get_log(user_input: str) -> str:
+def get_log(user_input: str, session: str | None = None) -> str:
     """
     根据用户输入选择相关历史日志
     """
-    log_text = select_relevant_logs(user_input)
+    with span("router"):
+        log_text = select_relevant_logs(user_input, session=session)
+    if not log_text:
+        return ''
+    return log_data_xml(log_text)
+
+
+async def aget_log(user_input: str, session: str | None = None) -> str:
+    """
+    get_log 的异步版本
+    """
+    with span("router"):
+        log_text = await aselect_relevant_logs(user_input, session=session)
     if not log_text:
         return ''
     return log_data_xml(log_text)
@@ -74,27 +179,38 @@ class Orchestrator:
     - 每个“会话”对应一个实例
     """
 
-    def __init__(self):
-        # LLM
-        self.llm = LLMClient()
+    def __init__(self,
+                 history_mode: str = HISTORY_MODE,
+                 router_deadline: float = ROUTER_DEADLINE_SECONDS,
+                 session_id: str | None = None):
+        # LLM（进程内共享一个连接池）
+        self.llm = get_llm()
+
+        # 会话标识：用量统计 / 软预算按它归类
+        self.session_id = session_id
 
-        # 启动时异步更新用户画像（一次即可）
+        # 历史日志路由：serial / parallel + 路由截止时间
+        self.history_mode = history_mode
+        self.router_deadline = router_deadline
+
+        # 进程启动后第一个会话触发一次用户画像更新（之后的会话不再触发）
         trigger_user_profile_async()
 
         # 状态机
         self.current_state = 'S1'   # S1: 自由聊天 / 判断日志
                                       # S2: 日志确认阶段
 
-        # 对话上下文
-        self.context = []           # [{'role': 'user'/'assistant', 'content': str}]
+        # 对话上下文（滚动：最近 N 轮原样 + 更早轮次的后台摘要）
+        self.context = ConversationContext(self.llm, session=session_id)   # [{'role': 'user'/'assistant', 'content': str}]
         self.draft_log = None       # 日志草稿（S2 使用）
 
-        # 当前日期
+        # 当前日期（事件 / 目标的文件名用它）
         today = date.today()
+        self.today = today
         self.cur_date = f'<current_date>{today}</current_date>'
 
     # =========================
-    # 对外唯一入口
+    # 对外入口：同步 step / 异步 astep
     # =========================
 
     def step(self, user_input: str) -> dict:
@@ -110,44 +226,384 @@ class Orchestrator:
         }
         """
 
+        state = self.current_state
+        with span("turn", state=state) as turn:
+            user_input = self._begin_turn(user_input)
+            if user_input is None:
+                turn.set(type="empty")
+                return {
+                    "reply": "",
+                    "state": self.current_state
+                }
+
+            confirmed = self._fast_confirm(user_input)
+            if confirmed is not None:
+                turn.set(type="2-1")
+                with span("apply", state=state, type="2-1"):
+                    return self._apply_result(confirmed)
+
+            generate = span("generate", state=state).start()
+            try:
+                raw_output = self._generate(user_input)
+            except LLMError:
+                generate.stop(type="llm_error")
+                turn.set(type="llm_error")
+                return self._llm_failed()
+
+            result, result_type = self._parse(raw_output, state)
+            generate.stop(type=result_type)
+            turn.set(type=result_type)
+
+            with span("apply", state=state, type=result_type):
+                return self._apply_result(result)
+
+    async def astep(self, user_input: str) -> dict:
+        """
+        step 的异步版本：状态机完全相同，LLM 调用走共享的异步客户端，
+        保存日志后的文件重建放到线程里，不阻塞事件循环
+
+        注意：同一实例的 astep 必须串行调用（由会话锁保证）
+        """
+
+        state = self.current_state
+        with span("turn", state=state) as turn:
+            user_input = self._begin_turn(user_input)
+            if user_input is None:
+                turn.set(type="empty")
+                return {
+                    "reply": "",
+                    "state": self.current_state
+                }
+
+            confirmed = self._fast_confirm(user_input)
+            if confirmed is not None:
+                turn.set(type="2-1")
+                with span("apply", state=state, type="2-1"):
+                    return await self._aapply_result(confirmed)
+
+            generate = span("generate", state=state).start()
+            try:
+                raw_output = await self._agenerate(user_input)
+            except LLMError:
+                generate.stop(type="llm_error")
+                turn.set(type="llm_error")
+                return self._llm_failed()
+
+            result, result_type = self._parse(raw_output, state)
+            generate.stop(type=result_type)
+            turn.set(type=result_type)
+
+            with span("apply", state=state, type=result_type):
+                return await self._aapply_result(result)
+
+    async def astream(self, user_input: str):
+        """
+        流式版本：边生成边吐事件，供 SSE 使用
+
+        依次 yield：
+        - {"event": "type",  "data": "1-2"}          # type 一确定就发
+        - {"event": "delta", "data": "内容片段"}      # content 增量（2-1 不发）
+        - {"event": "done",  "data": {...}}          # 与 astep 返回结构相同
+
+        注意：流式输出一旦发给用户就收不回，所以这里不做推测主调用，
+        只对路由施加截止时间
+        """
+
+        state = self.current_state
+        turn = span("turn", state=state).start()
+
+        user_input = self._begin_turn(user_input)
+        if user_input is None:
+            turn.stop(type="empty")
+            yield {"event": "done", "data": {"reply": "", "state": self.current_state}}
+            return
+
+        confirmed = self._fast_confirm(user_input)
+        if confirmed is not None:
+            yield {"event": "type", "data": "2-1"}
+            with span("apply", state=state, type="2-1"):
+                done = await self._aapply_result(confirmed)
+            turn.stop(type="2-1")
+            yield {"event": "done", "data": done}
+            return
+
+        generate = span("generate", state=state).start()
+        log_previous = await self._arouter(user_input)
+        raw_prompt = self._build_prompt(user_input, log_previous)
+
+        parser = StreamingEnvelopeParser()
+        chunks = []
+
+        # 首个事件的延迟（从本轮开始算，含路由）
+        first_event = span("stream_first_event", state=state).start()
+        try:
+            async for chunk in get_async_llm().stream(
+                raw_prompt, timeout=TURN_TIMEOUT_SECONDS, retries=TURN_RETRIES,
+                site=state, session=self.session_id
+            ):
+                chunks.append(chunk)
+                for kind, value in parser.feed(chunk):
+                    # 2-1 的 content 是 [路径, 全文]，不展示给用户
+                    if kind == "delta" and parser.type == "2-1":
+                        continue
+                    first_event.stop(type=parser.type or "")
+                    yield {"event": kind, "data": value}
+        except LLMError:
+            generate.stop(type="llm_error")
+            turn.stop(type="llm_error")
+            yield {"event": "done", "data": self._llm_failed()}
+            return
+
+        # 以完整文本的解析结果为准推进状态机
+        try:
+            result, result_type = self._parse("".join(chunks), state)
+        except ValueError:
+            result, result_type = {}, "invalid"
+        generate.stop(type=result_type)
+
+        with span("apply", state=state, type=result_type):
+            done = await self._aapply_result(result)
+        turn.stop(type=result_type)
+
+        yield {"event": "done", "data": done}
+
+    # =========================
+    # 内部：一轮的开头 & 历史日志 + 主调用
+    # =========================
+
+    def _begin_turn(self, user_input: str) -> str | None:
+        """
+        记录用户输入；空输入返回 None
+        """
         user_input = user_input.strip()
         if not user_input:
-            return {
-                "reply": "",
-                "state": self.current_state
-            }
+            return None
 
         # ========== 记录用户输入 ==========
         self.context.append({
             "role": "user",
             "content": user_input
         })
+        return user_input
+
+    def _fast_confirm(self, user_input: str) -> dict | None:
+        """
+        S2 快速通道：输入是单纯的确认、且能从草稿本地生成路径时，
+        直接构造一个 2-1 结果；否则返回 None，照常调用 LLM
+        """
+        if not S2_FAST_CONFIRM or self.current_state != "S2":
+            return None
+        if not is_confirmation(user_input):
+            return None
+        with span("fast_confirm", state="S2"):
+            finalized = finalize_draft(self.draft_log, self.today)
+        if finalized is None:
+            return None
+        relative_path, text = finalized
+        return {"type": "2-1", "content": [relative_path, text]}
+
+    def _generate(self, user_input: str) -> str:
+        """
+        同步：按需取历史日志并调用主 LLM，返回原始输出
+
+        先路由（最多等 router_deadline，超时就不带历史），再主调用；
+        不做推测调用：线程里的请求取消不了，被丢弃的那次也会花 token、计入软预算
+        （推测并行见 _agenerate）
+        """
 
         # ========== 是否启用日志 ==========
-        if user_input.startswith('-'):
-            log_previous = get_log(user_input)
-        else:
+        if not user_input.startswith('-'):
+            return self._call(self._build_prompt(user_input, ''))
+
+        router = _history_pool.submit(get_log, user_input, self.session_id)
+        try:
+            log_previous = router.result(timeout=self.router_deadline)
+        except (FutureTimeout, ValueError, LLMError):
             log_previous = ''
 
+        return self._call(self._build_prompt(user_input, log_previous))
+
+    async def _agenerate(self, user_input: str) -> str:
+        """
+        _generate 的异步版本；推测的主调用在路由选出日志时会被真正取消
+        """
+        if not user_input.startswith('-'):
+            return await self._acall(self._build_prompt(user_input, ''))
+
+        speculative = None
+        if self.history_mode == "parallel":
+            speculative = asyncio.create_task(
+                self._acall(self._build_prompt(user_input, ''))
+            )
+
+        try:
+            log_previous = await self._arouter(user_input)
+        except BaseException:
+            if speculative is not None:
+                speculative.cancel()
+            raise
+
+        if speculative is not None:
+            if not log_previous:
+                return await speculative
+            speculative.cancel()
+
+        return await self._acall(self._build_prompt(user_input, log_previous))
+
+    def _call(self, prompt: str) -> str:
+        state = self.current_state
+        with span("llm_call", state=state):
+            return self.llm.generate(
+                prompt, timeout=TURN_TIMEOUT_SECONDS, retries=TURN_RETRIES, hedge=TURN_HEDGING,
+                site=state, session=self.session_id
+            )
+
+    async def _acall(self, prompt: str) -> str:
+        state = self.current_state
+        with span("llm_call", state=state):
+            return await get_async_llm().generate(
+                prompt, timeout=TURN_TIMEOUT_SECONDS, retries=TURN_RETRIES, hedge=TURN_HEDGING,
+                site=state, session=self.session_id
+            )
+
+    def _parse(self, raw_output: str, state: str) -> tuple[dict, str]:
+        """
+        解析主调用输出，返回 (结果, 结果类型)；结果类型用作耗时统计的标签
+        """
+        with span("parse", state=state):
+            result = parse_llm_json(raw_output)
+        result_type = result.get("type") if isinstance(result, dict) else None
+        return result, str(result_type or "invalid")
+
+    def _llm_failed(self) -> dict:
+        """
+        主调用超时 / 重试用完：撤回本轮输入，状态不变，给用户一个可重试的提示
+        """
+        self.context.pop()
+        return {
+            "reply": LLM_UNAVAILABLE_REPLY,
+            "state": self.current_state
+        }
+
+    async def _arouter(self, user_input: str) -> str:
+        """
+        异步路由 + 截止时间：超时或路由输出无法解析时，本轮不带历史
+        """
+        if not user_input.startswith('-'):
+            return ''
+        try:
+            return await asyncio.wait_for(aget_log(user_input, self.session_id), self.router_deadline)
+        except (asyncio.TimeoutError, ValueError, LLMError):
+            return ''
+
+    async def _aapply_result(self, result: dict) -> dict:
+        # 2-1 会写文件并 fsync（阻塞 IO），放到线程里
+        if result.get("type") == "2-1" and self.current_state == "S2":
+            return await asyncio.to_thread(self._apply_result, result)
+        return self._apply_result(result)
+
+    # =========================
+    # 内部：保存日志
+    # =========================
+
+    def _save_log(self, relative_path: str, text: str) -> dict:
+        """
+        写入日志文件（落盘后才返回），复位状态机，并把索引等维护任务交给后台队列
+        路径来自 LLM 输出：不合法（../x.txt 等）时不写文件，留在 S2 让用户重新确认
+        """
+        try:
+            path = check_log_path(relative_path)
+        except ValueError:
+            self.context.pop()
+            return {
+                "reply": INVALID_LOG_PATH_REPLY,
+                "state": self.current_state,
+                "draft_log": self.draft_log
+            }
+
+        # 保存前查重：同类日志里有高度相似的就在回复里提示（不阻止保存）
+        with span("dedup", state="S2", type="2-1"):
+            try:
+                duplicates = find_duplicates(relative_path, text)
+            except Exception:
+                duplicates = []
+
+        with span("file_write", state="S2", type="2-1"):
+            if use_log_store():
+                get_log_store().put(relative_path, text)    # 导出 txt（落盘）并入库
+            else:
+                write_text_durable(path, text)   # 落盘后再回复
+
+        # 状态复位
+        self.context.pop()      # S2 输入不计入上下文
+        self.current_state = "S1"
+        self.draft_log = None
+
+        # 更新索引、派生文件与相似度向量（后台队列，连续保存会合并成一次重建）
+        maintenance.enqueue(*MAINTENANCE_JOBS, path=relative_path)
+
+        reply = "好的，该日志已保存！"
+        if duplicates:
+            names = "、".join(p for p, _ in duplicates)
+            reply += f"\n（提示：与已有日志 {names} 内容高度相似，请确认是否重复记录。）"
+
+        return {
+            "reply": reply,
+            "state": self.current_state,
+            "saved": True,
+            "duplicates": [{"path": p, "score": round(score, 3)} for p, score in duplicates]
+        }
+
+    # =========================
+    # 内部：prompt 拼装 & 结果处理（step / astep 共用）
+    # =========================
+
+    def _build_prompt(self, user_input: str, log_previous: str) -> str:
+        """
+        根据当前状态拼装本轮 prompt
+        顺序固定为：系统提示词 → 慢变部分 → 本轮数据，让相邻请求共享尽量长的前缀
+        """
+
         # =====================================================
         # 状态 S1：自由聊天 / 日志意图判断
         # =====================================================
         if self.current_state == 'S1':
 
-            if len(self.context) == 1:
-                previous_context = str(self.context[0])
-            else:
-                previous_context = context_to_text(self.context)
-
-            raw_prompt = (
-                log_previous
-                + previous_context
-                + prompt1
-                + self.cur_date
-                + user_xml(user_input)
+            # 会话用量超过软预算：发送前先收紧上下文（更早的轮次折进摘要）
+            if usage_stats.over_budget(self.session_id):
+                self.context.shrink(TRIMMED_CONTEXT_TOKEN_BUDGET, TRIMMED_CONTEXT_KEEP_TURNS)
+
+            # 上下文只在末尾追加，连续几轮的前缀基本不变
+            previous_context = self.context.to_text()
+
+            return (
+                PromptBuilder()
+                .static(prompt1)
+                .stable(self.cur_date, previous_xml(previous_context) if previous_context else '')
+                .turn(log_previous, user_xml(user_input))
+                .build()
             )
 
-            result = parse_llm_json(self.llm.generate(raw_prompt))
+        # =====================================================
+        # 状态 S2：日志确认阶段
+        # =====================================================
+        return (
+            PromptBuilder()
+            .static(prompt2)
+            .stable(self.cur_date)
+            .turn(log_previous, log_xml(self.draft_log), user_xml(user_input))
+            .build()
+        )
+
+    def _apply_result(self, result: dict) -> dict:
+        """
+        根据 LLM 返回的 type 推进状态机，返回结构化结果
+        """
+
+        # =====================================================
+        # 状态 S1：自由聊天 / 日志意图判断
+        # =====================================================
+        if self.current_state == 'S1':
 
             # ---------- 1-1：识别为日志 ----------
             if result.get("type") == "1-1":
@@ -186,38 +642,12 @@ class Orchestrator:
         # 状态 S2：日志确认阶段
         # =====================================================
         else:
-            raw_prompt = (
-                log_previous
-                + log_xml(self.draft_log)
-                + prompt2
-                + user_xml(user_input)
-            )
-
-            result = parse_llm_json(self.llm.generate(raw_prompt))
 
             # ---------- 2-1：确认并保存 ----------
             if result.get("type") == "2-1":
                 text = result["content"][1]
                 relative_path = result["content"][0]          # e.g. "events/去医院就诊2026-01-05.txt"
-                path = STORAGE_DIR / relative_path
-                path.parent.mkdir(parents=True, exist_ok=True)
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write(text)
-
-                # 状态复位
-                self.context.pop()      # S2 输入不计入上下文
-                self.current_state = "S1"
-                self.draft_log = None
-
-                # 更新索引与派生文件
-                build_file_index()
-                build_derived_logs()
-
-                return {
-                    "reply": "好的，该日志已保存！",
-                    "state": self.current_state,
-                    "saved": True
-                }
+                return self._save_log(relative_path, text)
 
             # ---------- 2-2：修改草稿 ----------
             elif result.get("type") == "2-2":
@@ -29,8 +29,177 @@ def file_list_xml(string):
     return '<file list>'+str(string)+'</file list>'
 def user_profile_xml(string):
     return '<user profile>'+str(string)+'</user profile>'
+def summary_xml(string):
+    return '<conversation summary>'+str(string)+'</conversation summary>'
+def import_entries_xml(entries):##entries: [(编号, 日期或空, 原文)]
+    return '<import entries>'+''.join(
+        f'<entry id="{i}" date="{d or ""}">{text}</entry>' for i, d, text in entries
+    )+'</import entries>'
 def context_to_text(context: list[dict]) -> str:
     return "\n".join(
         f"{item['role']}: {item['content']}"
         for item in context
     )
+
+
+# =========================
+# 流式 JSON 信封解析
+# =========================
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StreamingEnvelopeParser:
+    """
+    边收边解析 {"type": ..., "content": ...} 信封：
+    - type 的字符串一收完就记下
+    - content 若是字符串，逐字解码转义后作为增量吐出
+    - type 未知前收到的 content 先缓存，type 一确定再一起吐出
+    - content 不是字符串（如 2-1 的数组）时不吐增量
+
+    最终结果仍以 parse_llm_json(全文) 为准，这里只负责“尽早显示”。
+    """
+
+    def __init__(self):
+        self.type = None
+        self._pending = []          # type 未知前缓存的 content 片段
+
+        self._started = False       # 是否已看到最外层 {
+        self._depth = 0
+        self._expect = 'key'        # key / colon / value / comma
+        self._key = None
+
+        self._in_string = False
+        self._string_role = None    # key / type / content / skip
+        self._buf = []
+        self._escape = False
+        self._unicode = None        # \uXXXX 收集中
+        self._surrogate = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """
+        喂入一段文本，返回新产生的事件：
+        - ("type", "1-2")
+        - ("delta", "内容片段")
+        """
+        events = []
+        deltas = []
+        for ch in chunk:
+            self._consume(ch, events, deltas)
+
+        if deltas:
+            text = ''.join(deltas)
+            if self.type is None:
+                self._pending.append(text)
+            else:
+                events.append(("delta", text))
+        return events
+
+    # ---------- 内部 ----------
+
+    def _consume(self, ch, events, deltas):
+        if not self._started:
+            if ch == '{':
+                self._started = True
+                self._depth = 1
+            return
+
+        if self._in_string:
+            self._consume_string(ch, events, deltas)
+            return
+
+        if self._depth == 0:
+            return  # 顶层对象已结束，其余内容忽略
+
+        if ch == '"':
+            self._in_string = True
+            self._buf = []
+            if self._depth == 1 and self._expect == 'key':
+                self._string_role = 'key'
+            elif self._depth == 1 and self._expect == 'value' and self._key in ('type', 'content'):
+                self._string_role = self._key
+            else:
+                self._string_role = 'skip'
+            return
+
+        if ch in '{[':
+            self._depth += 1
+        elif ch in '}]':
+            self._depth -= 1
+            if self._depth == 1:
+                self._expect = 'comma'
+        elif self._depth == 1:
+            if ch == ':':
+                self._expect = 'value'
+            elif ch == ',':
+                self._expect = 'key'
+                self._key = None
+
+    def _consume_string(self, ch, events, deltas):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                try:
+                    code = int(self._unicode, 16)
+                except ValueError:
+                    code = 0xFFFD
+                self._unicode = None
+                self._emit_char(self._decode_codepoint(code), events, deltas)
+            return
+
+        if self._escape:
+            self._escape = False
+            if ch == 'u':
+                self._unicode = ''
+            else:
+                self._emit_char(_JSON_ESCAPES.get(ch, ch), events, deltas)
+            return
+
+        if ch == '\\':
+            self._escape = True
+            return
+
+        if ch == '"':
+            self._end_string(events, deltas)
+            return
+
+        self._emit_char(ch, events, deltas)
+
+    def _decode_codepoint(self, code: int) -> str:
+        if 0xD800 <= code <= 0xDBFF:
+            self._surrogate = code
+            return ''
+        if 0xDC00 <= code <= 0xDFFF and self._surrogate is not None:
+            high, self._surrogate = self._surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return chr(code)
+
+    def _emit_char(self, text, events, deltas):
+        if not text:
+            return
+        if self._string_role == 'content':
+            deltas.append(text)
+        elif self._string_role in ('key', 'type'):
+            self._buf.append(text)
+
+    def _end_string(self, events, deltas):
+        self._in_string = False
+        role, self._string_role = self._string_role, None
+        if self._depth != 1:
+            return
+
+        if role == 'key':
+            self._key = ''.join(self._buf)
+            self._expect = 'colon'
+        else:
+            self._expect = 'comma'
+            if role == 'type':
+                self.type = ''.join(self._buf)
+                events.append(("type", self.type))
+                # 先前缓存的 content 一并吐出
+                if deltas:
+                    self._pending.append(''.join(deltas))
+                    deltas.clear()
+                if self._pending:
+                    events.append(("delta", ''.join(self._pending)))
+                    self._pending = []
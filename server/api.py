@@ -1,12 +1,35 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse
 from pydantic import BaseModel
 from pathlib import Path
+import json
+import time
 
-# ⭐ 引入你的 Orchestrator
-from orchestrator.run import Orchestrator
+# ⭐ 每个会话一个 Orchestrator（由注册表管理）
+from server.sessions import SessionRegistry
+from agent.llm import get_llm, get_async_llm
+from agent.llm_cache import get_llm_cache
+from agent.usage import usage_stats
+from orchestrator.maintenance import maintenance
+from orchestrator.run import MAINTENANCE_JOBS
+from state.similarity import get_vector_store
+from state.local_retriever import get_retriever, make_snippet
+from log_store import use_log_store, get_log_store, SEARCH_DEFAULT_LIMIT
+from state.build_file_index import StorageWatcher
+from derived.read_derived import read_derived_page, DEFAULT_PAGE_LIMIT
+from derived.build_derived_logs import LOG_TYPES, ensure_gzip_copy
+from server.http_cache import (
+    file_etag,
+    http_date,
+    is_not_modified,
+    not_modified_response,
+    accepts_gzip,
+    json_response,
+)
 
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
+import metrics
 
 # ---------- FastAPI 初始化 ----------
 
@@ -18,11 +41,42 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
-# ---------- 全局 Orchestrator（一个会话） ----------
 
-orchestrator = Orchestrator()
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    """
+    按路由模板记录处理耗时（流式响应只算到开始返回为止）
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
+# ---------- 会话注册表（多会话，按 session_id 隔离） ----------
+
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "session_id"
+
+sessions = SessionRegistry()
+
+
+def get_session_id(request: Request) -> str | None:
+    """
+    session_id 优先取请求头（file:// 页面带不了 cookie），其次取 cookie
+    """
+    return (
+        request.headers.get(SESSION_HEADER)
+        or request.cookies.get(SESSION_COOKIE)
+    )
 
 # ---------- 数据模型 ----------
 
@@ -32,19 +86,252 @@ class ChatRequest(BaseModel):
 # ---------- API：聊天 ----------
 
 @app.post("/api/chat")
-def chat(req: ChatRequest):
-    result = orchestrator.step(req.text)
+async def chat(req: ChatRequest, request: Request, response: Response):
+    session = sessions.get(get_session_id(request))
+
+    # 同一会话串行；不同会话在同一个事件循环上并发（await LLM 时不占线程）
+    async with session.lock:
+        result = await session.orchestrator.astep(req.text)
+
+    response.headers[SESSION_HEADER] = session.session_id
+    response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite="lax")
     return {
         "reply": result["reply"],
         "state": result.get("state"),
-        "saved": result.get("saved", False)
+        "saved": result.get("saved", False),
+        "duplicates": result.get("duplicates", []),
+        "session_id": session.session_id
     }
 
+# ---------- API：聊天（SSE 流式） ----------
+
+def sse_event(event: str, data) -> str:
+    # data 一律 JSON 编码，避免内容里的换行破坏 SSE 帧
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    session = sessions.get(get_session_id(request))
+
+    async def events():
+        async with session.lock:
+            async for item in session.orchestrator.astream(req.text):
+                if item["event"] == "done":
+                    result = item["data"]
+                    yield sse_event("done", {
+                        "reply": result["reply"],
+                        "state": result.get("state"),
+                        "saved": result.get("saved", False),
+                        "duplicates": result.get("duplicates", []),
+                        "session_id": session.session_id
+                    })
+                else:
+                    yield sse_event(item["event"], item["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            SESSION_HEADER: session.session_id,
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+# ---------- 生命周期：监听 storage 外部修改 / 关闭共享 LLM 连接池 ----------
+
+# storage/ 里被手工编辑的文件也会进入维护队列（索引 + 派生视图）
+storage_watcher = StorageWatcher(
+    lambda paths: maintenance.enqueue(*MAINTENANCE_JOBS, paths=paths)
+)
+
+
+@app.on_event("startup")
+def start_storage_watcher():
+    # 可选的 SQLite 存储引擎：启动时先把 txt 树同步进库，之后的外部修改走维护队列
+    if use_log_store():
+        get_log_store()
+    # 服务停机期间的修改：后台对齐一次相似度向量（查询本身不再做 sync）
+    maintenance.enqueue("vectors")
+    storage_watcher.start()
+
+
+@app.on_event("shutdown")
+def stop_storage_watcher():
+    storage_watcher.stop()
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await get_async_llm().aclose()
+    get_llm().close()
+    usage_stats.flush()
+
 # ---------- API：查看派生日志 ----------
 
 @app.get("/api/derived/{log_type}")
-def get_derived(log_type: str):
+def get_derived(log_type: str,
+                request: Request,
+                offset: int = 0,
+                limit: int = DEFAULT_PAGE_LIMIT,
+                date_from: str | None = None,
+                date_to: str | None = None):
+    """
+    分页返回派生视图：按条目偏移索引 seek + 有界读取，不整文件加载
+    - offset / limit：条目分页
+    - date_from / date_to：YYYY-MM-DD 日期范围（闭区间）
+    - 视图文件没变时回 304；大响应 gzip
+    """
+    # pending=True 表示还有保存没反映到派生视图里
+    pending = not maintenance.status()["caught_up"]
+
+    file = DERIVED_DIR / f"{log_type}.txt"
+    st = file.stat() if log_type in LOG_TYPES and file.exists() else None
+
+    headers = {"Cache-Control": "no-cache"}
+    if st is not None:
+        etag = file_etag(st, offset, limit, date_from, date_to, pending)
+        if is_not_modified(request, etag, st.st_mtime):
+            return not_modified_response(etag, st.st_mtime)
+        headers["ETag"] = etag
+        headers["Last-Modified"] = http_date(st.st_mtime)
+
+    page = read_derived_page(log_type, offset, limit, date_from, date_to)
+    page["pending"] = pending
+    return json_response(request, page, headers)
+
+
+@app.get("/api/derived/{log_type}/raw")
+def get_derived_raw(log_type: str, request: Request):
+    """
+    原文视图：整文件直接发送（FileResponse 走 sendfile，不经 Python 字符串）
+    - 客户端支持 gzip：发预压缩的 .txt.gz（视图重写后第一次请求时才压缩）
+    - 视图文件没变时回 304
+    """
     file = DERIVED_DIR / f"{log_type}.txt"
-    if not file.exists():
-        return {"content": ""}
-    return {"content": file.read_text(encoding="utf-8")}
+    if log_type not in LOG_TYPES or not file.exists():
+        return Response(status_code=404)
+
+    st = file.stat()
+    use_gz = accepts_gzip(request)
+
+    etag = file_etag(st, "gzip" if use_gz else "identity")
+    if is_not_modified(request, etag, st.st_mtime):
+        return not_modified_response(etag, st.st_mtime)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    gz_file = ensure_gzip_copy(log_type) if use_gz else None
+    if gz_file is not None:
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(gz_file, media_type="text/plain; charset=utf-8", headers=headers)
+    return FileResponse(file, media_type="text/plain; charset=utf-8", headers=headers)
+
+# ---------- API：相似日志 ----------
+
+@app.get("/api/logs/similar")
+def similar_logs(text: str, top_k: int = 5, log_type: str | None = None):
+    """
+    与给定文本最相似的已有日志（哈希 n-gram 向量，余弦相似度）
+    """
+    hits = get_vector_store().similar(text, top_k=min(max(top_k, 1), 50), log_type=log_type)
+    return {"results": [{"path": p, "score": round(score, 3)} for p, score in hits]}
+
+# ---------- API：全文检索 ----------
+
+@app.get("/api/logs/search")
+def search_logs(q: str, log_type: str | None = None, limit: int = SEARCH_DEFAULT_LIMIT):
+    """
+    按内容检索日志：启用 SQLite 存储引擎时走 FTS5 索引，否则走本地 BM25 检索器
+    """
+    limit = min(max(limit, 1), 100)
+    if use_log_store():
+        return {"backend": "sqlite", "results": get_log_store().search(q, log_type=log_type, limit=limit)}
+
+    results = []
+    for rel_path, score in get_retriever().search(q, top_k=limit):
+        if log_type and not rel_path.startswith(f"{log_type}/"):
+            continue
+        try:
+            text = (STORAGE_DIR / rel_path).read_text(encoding="utf-8")
+        except OSError:
+            continue
+        results.append({"path": rel_path, "score": round(score, 3), "snippet": make_snippet(text)})
+    return {"backend": "files", "results": results}
+
+# ---------- API：LLM 响应缓存 / token 用量 ----------
+
+@app.get("/api/llm/cache")
+def llm_cache_stats():
+    """
+    LLM 响应缓存的命中 / 未命中统计
+    """
+    return get_llm_cache().stats()
+
+
+@app.get("/api/usage")
+def token_usage(session_id: str | None = None):
+    """
+    token 用量：不带 session_id 返回总量 + 各调用点 + 各会话；带了只看该会话
+    """
+    return usage_stats.report(session_id)
+
+
+class BudgetRequest(BaseModel):
+    tokens: int | None = None
+
+
+@app.put("/api/usage/sessions/{session_id}/budget")
+def set_session_budget(session_id: str, req: BudgetRequest):
+    """
+    设置会话软预算（累计输入 token）；tokens 为空表示取消
+    超出后该会话的上下文会在发送前收紧
+    """
+    usage_stats.set_budget(session_id, req.tokens if req.tokens and req.tokens > 0 else None)
+    return usage_stats.report(session_id)
+
+# ---------- API：Prometheus 指标 ----------
+
+@app.get("/api/metrics")
+def prometheus_metrics():
+    """
+    Prometheus 文本格式：各阶段耗时直方图 + HTTP 耗时 + 缓存 / 用量 / 会话 / 维护队列
+    """
+    cache = get_llm_cache().stats()
+    usage = usage_stats.snapshot()
+    status = maintenance.status()
+    extra = (
+        metrics.gauge_lines("ailog_sessions", "Live chat sessions.", len(sessions))
+        + metrics.gauge_lines("ailog_maintenance_pending_jobs", "Maintenance jobs waiting to run.",
+                              len(status["pending"]))
+        + metrics.gauge_lines("ailog_llm_cache_hits_total", "LLM response cache hits.",
+                              cache["hits"], "counter")
+        + metrics.gauge_lines("ailog_llm_cache_misses_total", "LLM response cache misses.",
+                              cache["misses"], "counter")
+        + metrics.gauge_lines("ailog_llm_prompt_tokens_total", "Prompt tokens reported by the API.",
+                              usage["prompt_tokens"], "counter")
+        + metrics.gauge_lines("ailog_llm_cached_prompt_tokens_total", "Prompt tokens served from the provider prompt cache.",
+                              usage["cached_prompt_tokens"], "counter")
+        + metrics.gauge_lines("ailog_llm_completion_tokens_total", "Completion tokens reported by the API.",
+                              usage["completion_tokens"], "counter")
+    )
+    return Response(
+        content=metrics.render(extra),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+# ---------- API：后台维护状态 ----------
+
+@app.get("/api/maintenance/status")
+def maintenance_status(wait: float = 0):
+    """
+    wait > 0 时最多阻塞 wait 秒，等派生视图追上最新保存（在线程池里等，不占事件循环）
+    """
+    if wait > 0:
+        maintenance.wait(timeout=min(wait, 30))
+    return maintenance.status()
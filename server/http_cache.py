@@ -0,0 +1,80 @@
+# server/http_cache.py
+"""
+HTTP 缓存 / 压缩小工具（只给 server/api.py 用）
+
+- ETag / Last-Modified 校验：内容没变直接回 304，不读文件、不序列化
+- 大的 JSON 响应按 Accept-Encoding 做 gzip
+"""
+from email.utils import formatdate, parsedate_to_datetime
+import gzip
+import hashlib
+import json
+import os
+
+from fastapi import Request, Response
+
+
+# 小于这个字节数的响应不压缩（压缩收益抵不过开销）
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+
+
+def file_etag(st: os.stat_result, *parts) -> str:
+    """
+    由文件 size + mtime（以及查询参数等附加部分）生成弱 ETag
+    """
+    key = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    if parts:
+        digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:12]
+        key += f"-{digest}"
+    return f'W/"{key}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, mtime: float | None = None) -> bool:
+    """
+    If-None-Match 优先；没有时再看 If-Modified-Since
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= int(since)
+
+    return False
+
+
+def not_modified_response(etag: str, mtime: float | None = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if mtime is not None:
+        headers["Last-Modified"] = http_date(mtime)
+    return Response(status_code=304, headers=headers)
+
+
+def accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def json_response(request: Request, payload, headers: dict | None = None) -> Response:
+    """
+    序列化 JSON；体积够大且客户端支持时 gzip
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+
+    if len(body) >= GZIP_MIN_SIZE and accepts_gzip(request):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,120 @@
+# server/sessions.py
+"""
+会话注册表 SessionRegistry
+
+职责：
+- 按 session_id 维护各自独立的 Orchestrator（context / current_state / draft_log 互不干扰）
+- 每个会话一把锁：同一会话的多轮按顺序执行，不同会话之间并行
+- LRU + 空闲 TTL 淘汰：会话数量再多，内存也有上限
+
+注意：
+- 不负责 HTTP（session_id 从哪里来由 server/api.py 决定）
+- 正在处理中的会话（锁被占用）不会被淘汰
+"""
+from collections import OrderedDict
+import asyncio
+import threading
+import time
+import uuid
+
+from orchestrator.run import Orchestrator
+
+
+# 默认上限：最多同时保留多少个会话 / 空闲多久回收（秒）
+MAX_SESSIONS = 1000
+SESSION_TTL_SECONDS = 30 * 60
+
+
+class Session:
+    """
+    单个会话：一个 Orchestrator + 一把串行锁
+    - 锁是 asyncio.Lock：等锁的请求只挂起协程，不占线程
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.orchestrator = Orchestrator(session_id=session_id)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry:
+    """
+    session_id -> Session 的有界注册表
+    - OrderedDict 维护 LRU 顺序（最近使用的在末尾）
+    - 注册表自身一把小锁，只保护字典结构，不包住 LLM 调用
+    """
+
+    def __init__(self,
+                 max_sessions: int = MAX_SESSIONS,
+                 ttl_seconds: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str | None) -> Session:
+        """
+        取出（或新建）一个会话，并刷新其 LRU 位置
+        """
+        if not session_id:
+            session_id = self.new_session_id()
+
+        with self._lock:
+            self._evict_expired()
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+                self._evict_overflow()
+            else:
+                self._sessions.move_to_end(session_id)
+
+            session.touch()
+            return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # =========================
+    # 内部：淘汰策略
+    # =========================
+
+    def _evict_expired(self):
+        """
+        淘汰空闲超过 TTL 的会话（从最久未使用的一端开始扫）
+        """
+        now = time.monotonic()
+        for sid in list(self._sessions):
+            session = self._sessions[sid]
+            if now - session.last_used < self.ttl_seconds:
+                break   # 后面的都更新，直接停
+            if session.lock.locked():
+                continue
+            del self._sessions[sid]
+
+    def _evict_overflow(self):
+        """
+        超出容量时按 LRU 淘汰
+        """
+        if len(self._sessions) <= self.max_sessions:
+            return
+        # 最后一个是刚放进来的会话，不参与淘汰
+        for sid in list(self._sessions)[:-1]:
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if self._sessions[sid].lock.locked():
+                continue
+            del self._sessions[sid]
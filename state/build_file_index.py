@@ -1,8 +1,25 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Iterable
 from datetime import datetime
+import hashlib
 import json
+import os
+import threading
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
+from metrics import timed
+
+LOG_FOLDERS = ["tasks", "feedback", "events", "goals"]
+
+# file_index.json 保持原来的“文件名列表”格式（路由 prompt 直接用它）；
+# 每个文件的 mtime / size / 内容哈希另存一份，用来做增量与变更检测
+INDEX_FILE = STATE_DIR / "file_index.json"
+META_FILE = STATE_DIR / "file_index_meta.json"
+
+# 没有 watchdog 时，定期 stat 扫描的间隔（秒）
+SWEEP_INTERVAL_SECONDS = 5.0
+
+_index_lock = threading.RLock()
+_meta_cache = None      # "tasks/2026-01-01.txt" -> {"mtime", "size", "sha1"}
 
 def collect_log_filenames(base_dir: str) -> Dict[str, List[str]]:
     """
@@ -16,7 +33,7 @@ def collect_log_filenames(base_dir: str) -> Dict[str, List[str]]:
     }
     """
     base = Path(base_dir)
-    folders = ["tasks", "feedback", "events", "goals"]
+    folders = LOG_FOLDERS
 
     result = {}
 
@@ -37,12 +54,13 @@ def collect_log_filenames(base_dir: str) -> Dict[str, List[str]]:
 
     return result
 
+@timed("build_file_index")
 def build_file_index():
     """
-    编排层直接调用的函数：
+    全量重建（修复模式；日常保存走 update_file_index 增量更新）：
     - 扫描 ../storage 下的日志文件
     - 生成文件索引
-    - 覆写写入 state/file_index.json
+    - 覆写写入 state/file_index.json 与 state/file_index_meta.json
     """
 
     # 1️⃣ 固定路径（你要求的）
@@ -66,9 +84,237 @@ def build_file_index():
     #     "log_base_dir": str(LOG_BASE_DIR)
     # }
 
-    # 5️⃣ 覆写写入 JSON
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
+    global _meta_cache
+    with _index_lock:
+        # 5️⃣ 覆写写入 JSON
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+
+        # 5️⃣+ 全量重建每个文件的 mtime / size / 哈希（修复模式）
+        _meta_cache = {}
+        for folder, names in index.items():
+            for name in names:
+                rel_path = f"{folder}/{name}"
+                entry = _file_entry(rel_path)
+                if entry is not None:
+                    _meta_cache[rel_path] = entry
+        _write_meta(_meta_cache)
 
     # 6️⃣ （可选）返回 index，方便调试
-    return index
\ No newline at end of file
+    return index
+
+
+# =========================
+# 增量索引
+# =========================
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _file_entry(rel_path: str, st: os.stat_result | None = None) -> dict | None:
+    path = STORAGE_DIR / rel_path
+    try:
+        if st is None:
+            st = path.stat()
+        return {"mtime": st.st_mtime, "size": st.st_size, "sha1": _file_hash(path)}
+    except OSError:
+        return None
+
+
+def _is_log_path(rel_path: str) -> bool:
+    parts = rel_path.split("/")
+    return len(parts) == 2 and parts[0] in LOG_FOLDERS and parts[1].endswith(".txt")
+
+
+def _load_meta() -> dict:
+    """
+    读取（并缓存）每个文件的元信息；元信息缺失时用一次全量构建补齐
+    """
+    global _meta_cache
+    if _meta_cache is None:
+        try:
+            _meta_cache = json.loads(META_FILE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            build_file_index()
+    return _meta_cache
+
+
+def _write_meta(meta: dict):
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = META_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, META_FILE)
+
+
+def _write_index_from_meta(meta: dict):
+    index = {folder: [] for folder in LOG_FOLDERS}
+    for rel_path in meta:
+        folder, name = rel_path.split("/", 1)
+        index[folder].append(name)
+    for names in index.values():
+        names.sort()
+
+    tmp = INDEX_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, INDEX_FILE)
+
+
+@timed("update_file_index")
+def update_file_index(rel_paths: Iterable[str]) -> list[str]:
+    """
+    只对给定的几个文件做增量更新（新增 / 修改 / 删除）
+    - rel_paths：相对 storage 的路径，如 "tasks/2026-01-20.txt"
+    - 返回内容真正发生变化的路径；没有变化时不写任何文件
+    """
+    changed = []
+    with _index_lock:
+        meta = _load_meta()
+        names_changed = False
+
+        for rel_path in rel_paths:
+            rel_path = Path(rel_path).as_posix()
+            if not _is_log_path(rel_path):
+                continue
+
+            old = meta.get(rel_path)
+            new = _file_entry(rel_path)
+
+            if new is None:
+                if old is not None:
+                    del meta[rel_path]
+                    changed.append(rel_path)
+                    names_changed = True
+                continue
+
+            if old is None:
+                names_changed = True
+            if old is None or old["sha1"] != new["sha1"]:
+                changed.append(rel_path)
+            meta[rel_path] = new
+
+        _write_meta(meta)
+        if names_changed:
+            _write_index_from_meta(meta)
+
+    return changed
+
+
+def scan_changes() -> list[str]:
+    """
+    stat 扫描：找出与索引不一致的文件（外部手工编辑 / 新增 / 删除）
+    - 只对 mtime 或 size 变了的文件计算哈希
+    - 只是 touch（哈希没变）的文件会就地更新 mtime，不算变化
+    - 不写索引文件，返回的路径交给 update_file_index 处理
+    """
+    changed = []
+    with _index_lock:
+        meta = _load_meta()
+        seen = set()
+
+        for folder in LOG_FOLDERS:
+            folder_path = STORAGE_DIR / folder
+            if not folder_path.is_dir():
+                continue
+            with os.scandir(folder_path) as it:
+                for entry in it:
+                    if not entry.is_file() or not entry.name.endswith(".txt"):
+                        continue
+                    rel_path = f"{folder}/{entry.name}"
+                    seen.add(rel_path)
+
+                    st = entry.stat()
+                    old = meta.get(rel_path)
+                    if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                        continue
+
+                    new = _file_entry(rel_path, st)
+                    if new is None:
+                        continue
+                    if old and old["sha1"] == new["sha1"]:
+                        meta[rel_path] = new
+                        continue
+                    changed.append(rel_path)
+
+        changed.extend(p for p in meta if p not in seen)
+
+    return changed
+
+
+# =========================
+# 外部修改检测
+# =========================
+
+class StorageWatcher:
+    """
+    监听 storage/ 下的外部修改，回调 on_change(rel_paths)
+    - 装了 watchdog：用 inotify / FSEvents 等系统通知
+    - 没装：后台线程每 SWEEP_INTERVAL_SECONDS 做一次 scan_changes()
+    """
+
+    def __init__(self, on_change, interval: float = SWEEP_INTERVAL_SECONDS):
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self):
+        try:
+            self._start_watchdog()
+        except ImportError:
+            self._thread = threading.Thread(
+                target=self._sweep_loop,
+                name="storage-sweep",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                changed = scan_changes()
+            except Exception:
+                continue
+            if changed:
+                self.on_change(changed)
+
+    def _start_watchdog(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                paths = [event.src_path, getattr(event, "dest_path", "")]
+                rel_paths = []
+                for p in paths:
+                    if not p:
+                        continue
+                    try:
+                        rel = Path(p).resolve().relative_to(STORAGE_DIR.resolve()).as_posix()
+                    except ValueError:
+                        continue
+                    if _is_log_path(rel):
+                        rel_paths.append(rel)
+                if rel_paths:
+                    watcher.on_change(rel_paths)
+
+        STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), str(STORAGE_DIR), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
\ No newline at end of file
@@ -1,23 +1,74 @@
 from pathlib import Path
 import sys
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
+from metrics import timed
+from log_store import use_log_store, get_log_store
 sys.path.append(str(APP_ROOT))
 
-from agent.llm import LLMClient
-from agent.prompt import prompt_userprofile
-from schema.response import log_data_xml
+from agent.llm import get_llm
+from agent.prompt import prompt_userprofile, prompt_userprofile_merge, prompt_userprofile_reduce
+from schema.response import log_data_xml, user_profile_xml
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import hashlib
 import json
+import re
 from datetime import date
 
-llm = LLMClient()
 
-def read_all_logs(log_base_dir: Path) -> str:
+# 单次 LLM 调用最多带多少字符的日志（超过就分块 map 再 reduce）
+PROFILE_CHUNK_CHARS = 8000
+# 冷启动时并行 map 的线程数
+PROFILE_MAP_WORKERS = 4
+# 后台任务，不急：截止时间放宽，多重试几次
+PROFILE_TIMEOUT_SECONDS = 180.0
+PROFILE_RETRIES = 3
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATE_LINE = re.compile(r"日期[：:]\s*(\d{4}-\d{2}-\d{2})")
+
+
+def _generate(prompt: str) -> str:
+    return get_llm().generate(
+        prompt, cache=True, timeout=PROFILE_TIMEOUT_SECONDS, retries=PROFILE_RETRIES,
+        site="profile"
+    )
+
+def _parse_date(s: str) -> date | None:
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        return None
+
+
+def _log_date(rel_path: str, text: str) -> date:
     """
-    读取 storage 下所有 .txt 日志内容，拼成一个大文本
+    日志的时间先后：文件名里的日期（任务 / 反馈是日志日期，事件 / 目标是写下的日期），
+    没有就用“日期：”字段；都没有的排在最前，让有日期的内容在 reduce 时“较晚为准”
     """
-    texts = []
+    m = _DATE.search(Path(rel_path).name)
+    d = _parse_date(m.group()) if m else None
+    if d is None:
+        m = _DATE_LINE.search(text)
+        d = _parse_date(m.group(1)) if m else None
+    return d or date.min
+
+
+def _chronological(paths, logs: dict[str, tuple[str, str]]) -> list[str]:
+    return sorted(paths, key=lambda p: (_log_date(p, logs[p][0]), p))
 
+
+def read_logs_with_hashes(log_base_dir: Path) -> dict[str, tuple[str, str]]:
+    """
+    读取全部日志：rel_path -> (内容, 内容哈希)
+    """
+    if use_log_store() and log_base_dir == STORAGE_DIR:
+        return {
+            rel_path: (c.strip(), hashlib.sha1(c.strip().encode("utf-8")).hexdigest())
+            for rel_path, c in get_log_store().all_logs() if c.strip()
+        }
+
+    logs = {}
     for folder in ["tasks", "feedback", "events", "goals"]:
         folder_path = log_base_dir / folder
         if not folder_path.exists():
@@ -26,18 +77,79 @@ def read_all_logs(log_base_dir: Path) -> str:
         for p in sorted(folder_path.glob("*.txt")):
             try:
                 content = p.read_text(encoding="utf-8").strip()
-                if content:
-                    texts.append(f"{content}")
             except Exception:
                 continue
+            if content:
+                digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+                logs[f"{folder}/{p.name}"] = (content, digest)
+    return logs
+
+
+def corpus_hash(logs: dict[str, tuple[str, str]]) -> str:
+    h = hashlib.sha1()
+    for rel_path in sorted(logs):
+        h.update(f"{rel_path}:{logs[rel_path][1]}\n".encode("utf-8"))
+    return h.hexdigest()
+
 
-    return "\n\n".join(texts)
-def build_user_profile():
+def chunk_texts(texts: list[str], limit: int = PROFILE_CHUNK_CHARS) -> list[str]:
     """
-    一天一次调用：
-    - 读取全部日志 txt
-    - 生成用户画像
-    - 覆写 state/user_profile.txt
+    按字符数把日志拼成若干块（单条超长的日志独占一块）
+    """
+    chunks, cur, size = [], [], 0
+    for text in texts:
+        if cur and size + len(text) > limit:
+            chunks.append("\n\n".join(cur))
+            cur, size = [], 0
+        cur.append(text)
+        size += len(text) + 2
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+
+def _map_reduce_profile(texts: list[str]) -> str:
+    """
+    冷启动：分块并行生成局部画像（map），再合并成一份（reduce）
+    """
+    chunks = chunk_texts(texts)
+    if len(chunks) == 1:
+        return _generate(prompt_userprofile + log_data_xml(chunks[0]))
+
+    with ThreadPoolExecutor(max_workers=PROFILE_MAP_WORKERS) as pool:
+        partials = list(pool.map(
+            lambda chunk: _generate(prompt_userprofile + log_data_xml(chunk)),
+            chunks
+        ))
+
+    # 局部画像本身也可能很多，按块继续归并直到只剩一份
+    while len(partials) > 1:
+        groups = chunk_texts([user_profile_xml(p) for p in partials])
+        if len(groups) == len(partials):
+            groups = ["".join(user_profile_xml(p) for p in partials)]
+        partials = [_generate(prompt_userprofile_reduce + g) for g in groups]
+    return partials[0]
+
+
+def _merge_profile(profile: str, texts: list[str]) -> str:
+    """
+    增量：只把新增 / 修改的日志并入已有画像
+    """
+    for chunk in chunk_texts(texts):
+        profile = _generate(
+            prompt_userprofile_merge + user_profile_xml(profile) + log_data_xml(chunk)
+        )
+    return profile
+
+
+@timed("build_user_profile")
+def build_user_profile(force: bool = False):
+    """
+    一天最多一次（force=True 时不受这个限制，如批量导入之后），且只在日志有变化时调用 LLM：
+    - 语料哈希与上次相同：直接跳过
+    - 已有画像 + 水位线：只把新增 / 修改的日志并入画像
+    - 冷启动（或有日志被删除）：分块并行 map，再 reduce
+    - 覆写 state/user_profile.txt，并记录水位线
     """
 
     # ✅ 确保 state 目录存在（更稳）
@@ -46,20 +158,41 @@ def build_user_profile():
     OUTPUT_FILE = STATE_DIR / "user_profile.txt"
     META_FILE = STATE_DIR / "user_profile_meta.json"
 
-    if not should_update_today(META_FILE):
+    if not force and not should_update_today(META_FILE):
         return
 
+    meta = read_meta(META_FILE)
+
     # ✅ 直接读 exe 同级的 storage
-    all_logs_text = read_all_logs(STORAGE_DIR)
+    logs = read_logs_with_hashes(STORAGE_DIR)
+    current_hash = corpus_hash(logs)
 
-    if not all_logs_text:
+    if not logs:
         OUTPUT_FILE.write_text("当前暂无足够日志数据生成用户画像。", encoding="utf-8")
-        write_today_meta(META_FILE)
+        write_today_meta(META_FILE, current_hash, {})
         return
 
-    profile_text = llm.generate(prompt_userprofile + log_data_xml(all_logs_text))
+    if meta.get("corpus_hash") == current_hash and OUTPUT_FILE.exists():
+        write_today_meta(META_FILE, current_hash, meta.get("profiled", {}))
+        return
+
+    profiled = meta.get("profiled") or {}
+    changed = [p for p in logs if profiled.get(p) != logs[p][1]]
+    removed = [p for p in profiled if p not in logs]
+
+    previous = OUTPUT_FILE.read_text(encoding="utf-8").strip() if OUTPUT_FILE.exists() else ""
+
+    # 按日志日期排序（事件 / 目标的文件名是“名称+日期”，不能按文件名排），
+    # 让分块按时间先后，reduce 时“较晚为准”才成立
+    if profiled and previous and not removed:
+        changed = _chronological(changed, logs)
+        profile_text = _merge_profile(previous, [logs[p][0] for p in changed])
+    else:
+        ordered = _chronological(logs, logs)
+        profile_text = _map_reduce_profile([logs[p][0] for p in ordered])
+
     OUTPUT_FILE.write_text(profile_text, encoding="utf-8")
-    write_today_meta(META_FILE)
+    write_today_meta(META_FILE, current_hash, {p: logs[p][1] for p in logs})
 
 def should_update_today(meta_file: Path) -> bool:
     if not meta_file.exists():
@@ -71,10 +204,23 @@ def should_update_today(meta_file: Path) -> bool:
     except Exception:
         return True
 
-def write_today_meta(meta_file: Path):
+def read_meta(meta_file: Path) -> dict:
+    try:
+        return json.loads(meta_file.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def write_today_meta(meta_file: Path, corpus: str | None = None, profiled: dict | None = None):
+    """
+    记录更新日期，以及水位线：语料哈希 + 已并入画像的每个日志的内容哈希
+    """
     meta_file.write_text(
         json.dumps(
-            {"last_updated": date.today().isoformat()},
+            {
+                "last_updated": date.today().isoformat(),
+                "corpus_hash": corpus,
+                "profiled": profiled or {},
+            },
             ensure_ascii=False,
             indent=2
         ),
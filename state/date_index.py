@@ -0,0 +1,334 @@
+"""
+时间索引：按日期直接定位日志，替代“时间类”问题的 LLM 路由
+
+- 每类日志一份按日期排序的数组 [(date, rel_path), ...]
+- 日期来自文件里的“日期：”行，以及文件名里的 YYYY-MM-DD（两者不同时都收录）
+- resolve_date_query 把“昨天 / 上周的反馈 / 这个月的任务 / 最近三天 / 三天前”等
+  中文相对时间解析成 (日志类型, 起始日期, 结束日期)，再用 bisect 做区间查询
+"""
+
+from pathlib import Path
+from datetime import date, datetime, timedelta
+import bisect
+import calendar
+import re
+import threading
+
+from app_paths import STORAGE_DIR
+
+from state.local_retriever import LOG_FOLDERS, scan_storage
+from log_store import use_log_store, get_log_store
+
+# 单次时间查询最多返回多少个文件（取最新的）
+MAX_TEMPORAL_FILES = 40
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DATE_LINE = re.compile(r"日期[：:]\s*(\d{4}-\d{2}-\d{2})")
+
+
+def _parse_date(s: str) -> date | None:
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _dates_of(rel_path: str, text: str) -> set[date]:
+    found = set()
+    for m in _DATE_LINE.finditer(text):
+        d = _parse_date(m.group(1))
+        if d:
+            found.add(d)
+    m = _DATE.search(rel_path)
+    if m:
+        d = _parse_date(m.group())
+        if d:
+            found.add(d)
+    return found
+
+
+# =========================
+# 时间索引
+# =========================
+
+class DateIndex:
+    """
+    log_type -> 按日期升序的 [(date, rel_path)]；stat 比对增量维护
+    """
+
+    def __init__(self, storage_dir: Path = STORAGE_DIR):
+        self.storage_dir = storage_dir
+        self._lock = threading.Lock()
+        self._stats = {}                                    # rel_path -> (mtime_ns, size)
+        self._dates = {}                                    # rel_path -> set[date]
+        self._sorted = {t: [] for t in LOG_FOLDERS}         # log_type -> [(date, rel_path)]
+
+    def refresh(self):
+        with self._lock:
+            seen = scan_storage(self.storage_dir)
+            for rel_path, (mtime_ns, size, path) in seen.items():
+                sig = (mtime_ns, size)
+                if self._stats.get(rel_path) == sig:
+                    continue
+                try:
+                    text = Path(path).read_text(encoding="utf-8")
+                except Exception:
+                    continue
+                self._remove(rel_path)
+                self._add(rel_path, _dates_of(rel_path, text))
+                self._stats[rel_path] = sig
+
+            for rel_path in [p for p in self._stats if p not in seen]:
+                self._remove(rel_path)
+                del self._stats[rel_path]
+
+    def _add(self, rel_path: str, dates: set[date]):
+        self._dates[rel_path] = dates
+        arr = self._sorted[rel_path.split("/", 1)[0]]
+        for d in dates:
+            bisect.insort(arr, (d, rel_path))
+
+    def _remove(self, rel_path: str):
+        dates = self._dates.pop(rel_path, None)
+        if not dates:
+            return
+        arr = self._sorted[rel_path.split("/", 1)[0]]
+        for d in dates:
+            i = bisect.bisect_left(arr, (d, rel_path))
+            if i < len(arr) and arr[i] == (d, rel_path):
+                del arr[i]
+
+    def query(self, log_types, start: date, end: date, limit: int = MAX_TEMPORAL_FILES) -> list[str]:
+        """
+        区间查询 [start, end]（闭区间），返回相对路径，新的在前，去重
+        """
+        self.refresh()
+        hits = []
+        with self._lock:
+            for log_type in log_types:
+                arr = self._sorted.get(log_type, [])
+                lo = bisect.bisect_left(arr, (start, ""))
+                hi = bisect.bisect_right(arr, (end, "\uffff"))
+                hits.extend(arr[lo:hi])
+
+        hits.sort(reverse=True)
+        paths = []
+        for _, rel_path in hits:
+            if rel_path not in paths:
+                paths.append(rel_path)
+            if len(paths) >= limit:
+                break
+        return paths
+
+
+_date_index = None
+_date_index_lock = threading.Lock()
+
+
+def get_date_index() -> DateIndex:
+    global _date_index
+    with _date_index_lock:
+        if _date_index is None:
+            _date_index = DateIndex()
+        return _date_index
+
+
+# =========================
+# 中文相对时间解析
+# =========================
+
+_TYPE_WORDS = [
+    ("tasks", ("任务", "待办", "计划")),
+    ("feedback", ("反馈", "总结", "完成情况", "复盘")),
+    ("events", ("事件", "安排", "日程", "行程")),
+    ("goals", ("目标",)),
+]
+
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+
+_NUM = r"(\d+|[零〇一二两三四五六七八九十]+)"
+
+# 以“周 / 星期”后那个字开头的常见词：这时它不是星期几（上周一起… / 这周天气…）
+_NOT_WEEKDAY = ("一起", "一下", "一直", "一样", "一点", "一些", "一次", "一个", "一共", "一定", "一般",
+                "一切", "一边", "三次", "两次", "天气", "天天", "天空", "日子", "日常", "日程", "日记")
+_WEEKDAY_RE = re.compile(r"(上上|上|下|这|本)?(?:个)?(?:周|星期|礼拜)([一二三四五六日天])")
+
+
+def _cn_number(s: str) -> int | None:
+    """
+    阿拉伯数字或 99 以内的中文数字
+    """
+    if s.isdigit():
+        return int(s)
+    if "十" in s:
+        tens, _, ones = s.partition("十")
+        t = _CN_DIGITS.get(tens, 0) if tens else 1
+        o = _CN_DIGITS.get(ones, 0) if ones else 0
+        return t * 10 + o
+    if len(s) == 1 and s in _CN_DIGITS:
+        return _CN_DIGITS[s]
+    return None
+
+
+def _month_range(year: int, month: int) -> tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_month(d: date, months: int) -> tuple[int, int]:
+    m = d.month - 1 + months
+    return d.year + m // 12, m % 12 + 1
+
+
+def resolve_date_range(text: str, today: date | None = None) -> tuple[date, date] | None:
+    """
+    把文本里的时间表达解析成闭区间 (start, end)；识别不出返回 None
+    """
+    today = today or date.today()
+    monday = today - timedelta(days=today.weekday())
+
+    # ---------- 明确日期 ----------
+    m = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", text) or re.search(r"(\d{4})年(\d{1,2})月(\d{1,2})[日号]", text)
+    if m:
+        try:
+            d = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            return d, d
+        except ValueError:
+            pass
+
+    m = re.search(r"(\d{1,2}|[一二三四五六七八九十]+)月(\d{1,2}|[一二三四五六七八九十]+)[日号]", text)
+    if m:
+        month, day = _cn_number(m.group(1)), _cn_number(m.group(2))
+        try:
+            d = date(today.year, month, day)
+            return d, d
+        except (TypeError, ValueError):
+            pass
+
+    # ---------- N 天 / 周 / 个月前 ----------
+    m = re.search(_NUM + r"(天|日|周|个星期|个月)前", text)
+    if m:
+        n = _cn_number(m.group(1))
+        if n:
+            unit = m.group(2)
+            if unit in ("天", "日"):
+                d = today - timedelta(days=n)
+                return d, d
+            if unit == "个月":
+                return _month_range(*_shift_month(today, -n))
+            start = monday - timedelta(days=7 * n)
+            return start, start + timedelta(days=6)
+
+    # ---------- 最近 N 天 / 周 / 个月 ----------
+    m = re.search(r"(?:最近|近|过去|前)" + _NUM + r"(天|日|周|个星期|星期|个月)", text)
+    if m:
+        n = _cn_number(m.group(1))
+        if n:
+            unit = m.group(2)
+            days = n if unit in ("天", "日") else n * 7 if "周" in unit or "星期" in unit else n * 30
+            return today - timedelta(days=days - 1), today
+    m = re.search(r"最近(?:一|这)?(周|个?星期|个?月)", text)
+    if m:
+        days = 30 if "月" in m.group(1) else 7
+        return today - timedelta(days=days - 1), today
+    if re.search(r"最近(?:这)?几天", text):
+        return today - timedelta(days=6), today
+
+    # ---------- 上周X / 下周X / 周X ----------
+    # “周”后的字如果是某个词的开头（一起 / 天气…），按整周处理（见下方“周”）
+    for m in _WEEKDAY_RE.finditer(text):
+        if text[m.end() - 1:m.end() + 1] in _NOT_WEEKDAY:
+            continue
+        offset = {"上上": -14, "上": -7, "下": 7}.get(m.group(1) or "", 0)
+        d = monday + timedelta(days=offset + _WEEKDAYS[m.group(2)])
+        return d, d
+
+    # ---------- 单日 ----------
+    for word, delta in (("大前天", -3), ("前天", -2), ("昨天", -1), ("昨日", -1),
+                        ("今天", 0), ("今日", 0), ("大后天", 3), ("后天", 2), ("明天", 1)):
+        if word in text:
+            d = today + timedelta(days=delta)
+            return d, d
+
+    # ---------- 周 ----------
+    for words, offset in ((("上上周", "上上个星期"), -14),
+                          (("上周", "上个星期", "上星期", "上礼拜"), -7),
+                          (("下周", "下个星期", "下星期", "下礼拜"), 7),
+                          (("本周", "这周", "这个星期", "这星期", "这礼拜"), 0)):
+        if any(w in text for w in words):
+            start = monday + timedelta(days=offset)
+            return start, start + timedelta(days=6)
+
+    # ---------- 月 ----------
+    for words, offset in ((("上上个月",), -2),
+                          (("上个月", "上月"), -1),
+                          (("下个月", "下月"), 1),
+                          (("本月", "这个月", "这月"), 0)):
+        if any(w in text for w in words):
+            return _month_range(*_shift_month(today, offset))
+
+    m = re.search(r"(\d{1,2}|[一二三四五六七八九十]+)月(?:份)?", text)
+    if m:
+        month = _cn_number(m.group(1))
+        if month and 1 <= month <= 12:
+            return _month_range(today.year, month)
+
+    # ---------- 年 ----------
+    if "去年" in text:
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    if "今年" in text:
+        return date(today.year, 1, 1), date(today.year, 12, 31)
+
+    return None
+
+
+def resolve_log_types(text: str) -> list[str]:
+    """
+    文本里提到的日志类型；一个都没提到时返回全部
+    """
+    types = [t for t, words in _TYPE_WORDS if any(w in text for w in words)]
+    return types or list(LOG_FOLDERS)
+
+
+_EXPLICIT_DATE = re.compile(
+    r"\d{4}-\d{1,2}-\d{1,2}|\d{4}年\d{1,2}月\d{1,2}[日号]"
+    r"|(?:\d{1,2}|[一二三四五六七八九十]+)月(?:\d{1,2}|[一二三四五六七八九十]+)[日号]"
+)
+
+
+def is_date_question(text: str, start: date, end: date) -> bool:
+    """
+    是否主要在问“某段时间的日志”：提到了日志类型，或时间是区间 / 明确日期
+    只有“明天 / 周三 / 三天前”这类单日相对词时不算——
+    “明天面试要准备什么”问的是面试，交给正常路由
+    """
+    if any(w in text for _, words in _TYPE_WORDS for w in words):
+        return True
+    return start != end or bool(_EXPLICIT_DATE.search(text))
+
+
+def resolve_date_query(text: str, today: date | None = None) -> tuple[list[str], date, date] | None:
+    """
+    “上周的反馈” -> (["feedback"], 上周一, 上周日)；不是时间类问题返回 None
+    """
+    rng = resolve_date_range(text, today)
+    if rng is None:
+        return None
+    return resolve_log_types(text), rng[0], rng[1]
+
+
+def select_logs_by_date(user_input: str, today: date | None = None) -> list[str] | None:
+    """
+    时间类问题直接查时间索引；返回相对路径列表，
+    不是时间类问题（或只是顺带提到单日相对时间）返回 None
+    """
+    parsed = resolve_date_query(user_input, today)
+    if parsed is None:
+        return None
+    log_types, start, end = parsed
+    if not is_date_question(user_input, start, end):
+        return None
+    if use_log_store():
+        return get_log_store().by_date(log_types, start, end, MAX_TEMPORAL_FILES)
+    return get_date_index().query(log_types, start, end)
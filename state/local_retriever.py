@@ -0,0 +1,309 @@
+"""
+本地检索器：BM25 + 时间衰减，替代 LLM 文件路由
+
+- 倒排索引建立在 storage 下每个日志文件的内容上
+- 中文按字切 2-gram / 3-gram，英文 / 数字按词切
+- 进程内常驻；第一次查询时全量建立，之后由维护队列的 retriever 任务
+  按保存 / 外部修改涉及的路径增量更新，查询本身不做 stat 扫描
+- 查询只在本地完成，毫秒级，不发网络请求
+"""
+
+from pathlib import Path
+from collections import Counter
+from datetime import date, datetime
+import math
+import os
+import re
+import threading
+
+from app_paths import STORAGE_DIR
+
+LOG_FOLDERS = ["tasks", "feedback", "events", "goals"]
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 时间衰减：越新的日志加分越多，半衰期（天）与权重
+RECENCY_HALF_LIFE_DAYS = 14
+RECENCY_WEIGHT = 0.5
+
+# 返回数量 / 相对阈值（低于最高分这个比例的结果丢弃）
+DEFAULT_TOP_K = 5
+MIN_RELATIVE_SCORE = 0.3
+
+# 混合路由的候选初筛：词面匹配 + 与当前日期的接近程度 + 文件夹先验
+SHORTLIST_TOP_K = 20
+SHORTLIST_LEXICAL_WEIGHT = 1.0
+SHORTLIST_DATE_WEIGHT = 0.4
+SHORTLIST_DATE_SCALE_DAYS = 7
+FOLDER_PRIORS = {"tasks": 0.05, "feedback": 0.05, "events": 0.1, "goals": 0.15}
+
+# 候选片段长度（字符）
+SNIPPET_CHARS = 60
+
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+_WORD = re.compile(r"[a-z0-9]+")
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    中文连续片段 -> 2-gram + 3-gram（单字片段保留单字）；英文 / 数字 -> 小写词
+    """
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        for n in (2, 3):
+            tokens.extend(run[i:i + n] for i in range(len(run) - n + 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+def make_snippet(text: str, limit: int = SNIPPET_CHARS) -> str:
+    """
+    取“内容：”那一行（没有就取全文）压成一行，截断到 limit 字
+    """
+    body = text.strip()
+    for line in body.splitlines():
+        if line.startswith("内容："):
+            body = line[len("内容："):]
+            break
+    body = " ".join(body.split())
+    return body if len(body) <= limit else body[:limit] + "…"
+
+
+def _date_of(rel_path: str) -> date | None:
+    m = _DATE.search(rel_path)
+    if not m:
+        return None
+    try:
+        return datetime.strptime(m.group(), "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def scan_storage(storage_dir: Path = STORAGE_DIR) -> dict[str, tuple[int, int, str]]:
+    """
+    stat 扫描四个日志目录：rel_path -> (mtime_ns, size, 绝对路径)
+    """
+    found = {}
+    for folder in LOG_FOLDERS:
+        folder_path = storage_dir / folder
+        if not folder_path.is_dir():
+            continue
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.endswith(".txt"):
+                    continue
+                st = entry.stat()
+                found[f"{folder}/{entry.name}"] = (st.st_mtime_ns, st.st_size, entry.path)
+    return found
+
+
+class LocalRetriever:
+    """
+    倒排索引：term -> {rel_path: tf}
+    """
+
+    def __init__(self, storage_dir: Path = STORAGE_DIR):
+        self.storage_dir = storage_dir
+        self._lock = threading.Lock()
+        self._stats = {}        # rel_path -> (mtime_ns, size)
+        self._doc_terms = {}    # rel_path -> Counter
+        self._doc_len = {}      # rel_path -> int
+        self._postings = {}     # term -> {rel_path: tf}
+        self._snippets = {}     # rel_path -> 短片段
+        self._total_len = 0
+        self._loaded = False
+
+    # =========================
+    # 索引维护
+    # =========================
+
+    def refresh(self):
+        """
+        stat 比对：新增 / 修改的文件重新切分，删除的文件移出索引
+        """
+        with self._lock:
+            seen = scan_storage(self.storage_dir)
+            for rel_path, (mtime_ns, size, path) in seen.items():
+                sig = (mtime_ns, size)
+                if self._stats.get(rel_path) == sig:
+                    continue
+                try:
+                    text = Path(path).read_text(encoding="utf-8")
+                except Exception:
+                    continue
+                self._remove(rel_path)
+                self._add(rel_path, text)
+                self._stats[rel_path] = sig
+
+            for rel_path in [p for p in self._stats if p not in seen]:
+                self._remove(rel_path)
+                del self._stats[rel_path]
+            self._loaded = True
+
+    def update(self, rel_paths) -> int:
+        """
+        只重新切分给定的文件（不存在的移出索引）；返回改动的文件数
+        """
+        with self._lock:
+            changed = 0
+            for rel_path in rel_paths:
+                rel_path = Path(rel_path).as_posix()
+                if rel_path.split("/", 1)[0] not in LOG_FOLDERS or not rel_path.endswith(".txt"):
+                    continue
+                path = self.storage_dir / rel_path
+                try:
+                    st = path.stat()
+                    text = path.read_text(encoding="utf-8")
+                except OSError:
+                    if self._stats.pop(rel_path, None) is not None:
+                        self._remove(rel_path)
+                        changed += 1
+                    continue
+                self._remove(rel_path)
+                self._add(rel_path, text)
+                self._stats[rel_path] = (st.st_mtime_ns, st.st_size)
+                changed += 1
+            return changed
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.refresh()
+
+    def _add(self, rel_path: str, text: str):
+        terms = Counter(tokenize(text))
+        self._doc_terms[rel_path] = terms
+        self._snippets[rel_path] = make_snippet(text)
+        length = sum(terms.values())
+        self._doc_len[rel_path] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[rel_path] = tf
+
+    def _remove(self, rel_path: str):
+        terms = self._doc_terms.pop(rel_path, None)
+        if terms is None:
+            return
+        self._snippets.pop(rel_path, None)
+        self._total_len -= self._doc_len.pop(rel_path, 0)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(rel_path, None)
+            if not posting:
+                del self._postings[term]
+
+    # =========================
+    # 查询
+    # =========================
+
+    def _bm25(self, query: str) -> dict[str, float]:
+        """
+        纯 BM25 分数（调用方已持有 self._lock）
+        """
+        n_docs = len(self._doc_len)
+        if n_docs == 0:
+            return {}
+        avgdl = self._total_len / n_docs
+
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for rel_path, tf in posting.items():
+                norm = 1 - BM25_B + BM25_B * self._doc_len[rel_path] / avgdl
+                scores[rel_path] = scores.get(rel_path, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return scores
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K, today: date | None = None) -> list[tuple[str, float]]:
+        """
+        返回 [(rel_path, score), ...]，按分数从高到低
+        """
+        self._ensure_loaded()
+        today = today or date.today()
+
+        with self._lock:
+            scores = self._bm25(query)
+
+        for rel_path in scores:
+            d = _date_of(rel_path)
+            if d is not None:
+                age = abs((today - d).days)
+                scores[rel_path] *= 1 + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE_DAYS)
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        if not ranked:
+            return []
+        floor = ranked[0][1] * MIN_RELATIVE_SCORE
+        return [(p, s) for p, s in ranked[:top_k] if s >= floor]
+
+
+    def shortlist(self, query: str, top_k: int = SHORTLIST_TOP_K, today: date | None = None) -> list[dict]:
+        """
+        混合路由第一阶段：给所有文件打一个便宜的分，取前 top_k 个交给 LLM
+        - 词面：BM25 归一化到 [0, 1]
+        - 日期：离今天越近越高（按 SHORTLIST_DATE_SCALE_DAYS 衰减）
+        - 文件夹先验：目标 / 事件的时间跨度长，略微加分
+        返回 [{"path": ..., "snippet": ..., "score": ...}, ...]
+        """
+        self._ensure_loaded()
+        today = today or date.today()
+
+        with self._lock:
+            lexical = self._bm25(query)
+            top = max(lexical.values(), default=0.0) or 1.0
+
+            scored = []
+            for rel_path in self._doc_len:
+                score = SHORTLIST_LEXICAL_WEIGHT * lexical.get(rel_path, 0.0) / top
+                d = _date_of(rel_path)
+                if d is not None:
+                    age = abs((today - d).days)
+                    score += SHORTLIST_DATE_WEIGHT * SHORTLIST_DATE_SCALE_DAYS / (SHORTLIST_DATE_SCALE_DAYS + age)
+                score += FOLDER_PRIORS.get(rel_path.split("/", 1)[0], 0.0)
+                scored.append((score, rel_path))
+
+            scored.sort(reverse=True)
+            return [
+                {"path": rel_path, "snippet": self._snippets.get(rel_path, ""), "score": score}
+                for score, rel_path in scored[:top_k]
+            ]
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> LocalRetriever:
+    """
+    进程内共享一个检索器（索引常驻内存）
+    """
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = LocalRetriever()
+        return _retriever
+
+
+def update_retriever(paths=None) -> int:
+    """
+    维护队列任务：检索器还没建立（没人查过）就什么都不做；
+    paths 为空表示全量 stat 比对
+    """
+    with _retriever_lock:
+        retriever = _retriever
+    if retriever is None:
+        return 0
+    if not paths:
+        retriever.refresh()
+        return 0
+    return retriever.update(paths)
@@ -1,4 +1,5 @@
 from pathlib import Path
+import asyncio
 import json
 import sys
 from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
@@ -12,11 +13,31 @@ from app_paths import STORAGE_DIR, STATE_DIR, DERIVED_DIR, WEB_DIR, APP_ROOT
 # STORAGE_DIR = BASE_DIR / "storage"
 
 # ===== 你已有的组件 =====
-from agent.llm import LLMClient
-from agent.prompt import prompt_file_router  # 你的系统提示词
+from agent.llm import get_llm, get_async_llm
+from agent.prompt import prompt_file_router, prompt_file_router_hybrid  # 你的系统提示词
+from agent.prompt_builder import PromptBuilder
 from schema.response import parse_llm_json,file_list_xml,user_xml,user_profile_xml   # 你已有的 JSON parser
+from state.local_retriever import get_retriever
+from state.date_index import select_logs_by_date
+from log_store import use_log_store, get_log_store
 
-llm = LLMClient()
+
+# 路由后端：
+# - "llm"  ：LLM 根据文件名列表挑选（原行为，一次网络往返）
+# - "local"：本地 BM25 倒排索引按内容检索（毫秒级，无网络）
+# - "hybrid"：本地先初筛 top-K 候选（带内容片段），再交给 LLM 挑选；
+#             路由 prompt 大小不随日志天数增长
+ROUTER_BACKEND = "llm"
+
+# 路由结果只取决于 prompt（画像 + 文件列表 + 问题），相同 prompt 直接用缓存
+ROUTER_CACHE_TTL_SECONDS = 24 * 3600
+
+# 路由调用自己的截止时间 / 重试（编排层另有 ROUTER_DEADLINE_SECONDS，超时就不带历史）
+ROUTER_LLM_TIMEOUT_SECONDS = 10.0
+ROUTER_LLM_RETRIES = 1
+
+# 时间类问题（昨天 / 上周的反馈 / 这个月的任务…）先查本地时间索引，命中就不走路由
+TEMPORAL_ROUTING = True
 
 
 def _load_user_profile(state_dir: Path) -> str:
@@ -36,28 +57,43 @@ def _load_file_index(state_dir: Path) -> dict:
         return {}
 
 
-def select_relevant_logs(user_input: str) -> str:
+def _router_prompt(user_input: str) -> str:
     """
-    Planner 节点（同步）：
-    输入：
-      - user_input
-    读取：
-      - state/user_profile.txt
-      - state/file_index.json
-    输出：
-        日志文本字符串
+    拼装文件路由 prompt（同步 / 异步两条路径共用）
     """
+    user_profile = _load_user_profile(STATE_DIR)
+    if ROUTER_BACKEND == "hybrid":
+        # 候选列表随问题变化，放在 turn 段，不破坏画像那段可缓存的前缀
+        return (
+            PromptBuilder()
+            .static(prompt_file_router_hybrid)
+            .stable(user_profile_xml(user_profile))
+            .turn(file_list_xml(_shortlist_text(user_input)), user_xml(user_input))
+            .build()
+        )
+    # 系统提示词 → 画像 / 文件列表（慢变）→ 用户输入（每轮变）
+    return (
+        PromptBuilder()
+        .static(prompt_file_router)
+        .stable(user_profile_xml(user_profile), file_list_xml(_load_file_index(STATE_DIR)))
+        .turn(user_xml(user_input))
+        .build()
+    )
 
-    # ===== 路径锚定（稳健，和 app.py 在同一项目根目录）=====
-    # STATE_DIR = Path(__file__).resolve().parent
 
-    user_profile = _load_user_profile(STATE_DIR)
-    file_index = _load_file_index(STATE_DIR)
+def _shortlist_text(user_input: str) -> str:
+    """
+    混合路由：本地初筛出的候选文件，每行“路径：内容片段”
+    """
+    query = user_input.lstrip('-').strip()
+    candidates = get_retriever().shortlist(query)
+    return "\n".join(f"{c['path']}：{c['snippet']}" for c in candidates)
 
-    # ===== 调用 LLM =====
-    raw_output = llm.generate(
-        prompt_file_router+user_xml(user_input)+file_list_xml(file_index)+user_profile_xml(user_profile)
-    )
+
+def _load_selected_logs(raw_output: str) -> str:
+    """
+    解析路由输出，读取被选中的日志文件，拼成日志文本
+    """
 
     # ===== 解析 JSON（你已有工具）=====
     result = parse_llm_json(raw_output)
@@ -74,8 +110,24 @@ def select_relevant_logs(user_input: str) -> str:
     if not isinstance(paths, list):
         paths = []
 
+    return load_log_files(paths)
+
+
+def load_log_files(paths: list) -> str:
+    """
+    读取给定的日志文件（相对 storage 的路径），拼成日志文本
+    """
     log_chunks = []
 
+    if use_log_store():
+        # 一次索引查询取回全部；按路由给出的顺序拼接
+        found = get_log_store().get_many(paths)
+        for rel_path in paths:
+            content = found.get(rel_path, "").strip() if isinstance(rel_path, str) else ""
+            if content:
+                log_chunks.append(f"【{rel_path}】\n{content}")
+        return "\n\n".join(log_chunks)
+
     for rel_path in paths:
         if not isinstance(rel_path, str):
             continue
@@ -102,3 +154,76 @@ def select_relevant_logs(user_input: str) -> str:
 
     return log_text
 
+
+def select_temporal_logs(user_input: str) -> str | None:
+    """
+    时间索引路由：能解析出日期范围就直接按日期取文件
+    不是时间类问题、或这段时间没有日志时返回 None，交给正常路由
+    """
+    if not TEMPORAL_ROUTING:
+        return None
+    paths = select_logs_by_date(user_input.lstrip('-').strip())
+    if not paths:
+        return None
+    return load_log_files(paths) or None
+
+
+def select_local_logs(user_input: str) -> str:
+    """
+    本地路由：BM25 检索日志内容，不调用 LLM
+    """
+    query = user_input.lstrip('-').strip()
+    hits = get_retriever().search(query)
+    return load_log_files([rel_path for rel_path, _ in hits])
+
+
+def select_relevant_logs(user_input: str, session: str | None = None) -> str:
+    """
+    Planner 节点（同步）：
+    输入：
+      - user_input
+      - session（可选，用量统计按会话归类）
+    读取：
+      - state/user_profile.txt
+      - state/file_index.json
+    输出：
+        日志文本字符串
+    """
+
+    temporal = select_temporal_logs(user_input)
+    if temporal is not None:
+        return temporal
+
+    if ROUTER_BACKEND == "local":
+        return select_local_logs(user_input)
+
+    # ===== 调用 LLM =====
+    raw_output = get_llm().generate(
+        _router_prompt(user_input), cache=True, ttl=ROUTER_CACHE_TTL_SECONDS,
+        timeout=ROUTER_LLM_TIMEOUT_SECONDS, retries=ROUTER_LLM_RETRIES,
+        site="router", session=session
+    )
+
+    return _load_selected_logs(raw_output)
+
+
+async def aselect_relevant_logs(user_input: str, session: str | None = None) -> str:
+    """
+    Planner 节点（异步）：与 select_relevant_logs 相同，LLM 调用走异步客户端
+    """
+    # 本地索引是纯 CPU + 少量读文件，放线程里避免卡事件循环
+    temporal = await asyncio.to_thread(select_temporal_logs, user_input)
+    if temporal is not None:
+        return temporal
+
+    if ROUTER_BACKEND == "local":
+        return await asyncio.to_thread(select_local_logs, user_input)
+
+    # 拼 prompt 要读画像 / 文件索引，hybrid 还要本地初筛（首次会建索引），同样放线程里
+    prompt = await asyncio.to_thread(_router_prompt, user_input)
+    raw_output = await get_async_llm().generate(
+        prompt, cache=True, ttl=ROUTER_CACHE_TTL_SECONDS,
+        timeout=ROUTER_LLM_TIMEOUT_SECONDS, retries=ROUTER_LLM_RETRIES,
+        site="router", session=session
+    )
+    return await asyncio.to_thread(_load_selected_logs, raw_output)
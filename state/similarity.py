@@ -0,0 +1,273 @@
+"""
+相似日志检索 / 保存前查重：哈希 n-gram 向量矩阵
+
+- 每个日志一行向量：中文 2/3-gram + 英文词，哈希到固定维度（带符号），L2 归一化
+- 矩阵存成 state/log_vectors.npy，用 numpy memmap 打开，只读需要的行
+- 新增 / 修改只改一行（删除时用最后一行填洞），容量不够时翻倍扩容
+- 余弦相似度 = 一次矩阵向量乘法
+
+类型、日期这类每条日志都有的格式行不参与向量，避免同类日志彼此“相似”。
+numpy 在第一次用到向量时才导入，不拖慢服务启动；没装 numpy 时相似检索 / 查重直接跳过。
+查询只读现有矩阵，不做 stat 扫描；新鲜度由维护队列的 vectors 任务负责。
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import json
+import os
+import threading
+import zlib
+
+from app_paths import STORAGE_DIR, STATE_DIR
+from metrics import timed
+
+from state.local_retriever import tokenize, scan_storage
+
+VECTOR_DIM = 1024
+INITIAL_CAPACITY = 256
+
+# 保存时相似度达到这个值就提示“疑似重复”
+DUPLICATE_THRESHOLD = 0.9
+
+VECTORS_FILE = STATE_DIR / "log_vectors.npy"
+VECTORS_META_FILE = STATE_DIR / "log_vectors_meta.json"
+
+_SKIP_PREFIXES = ("类型：", "类型:", "日期：", "日期:")
+
+
+def numpy_available() -> bool:
+    """
+    numpy 是可选依赖：没装时 update / sync 不做事，similar 返回空
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _body(text: str) -> str:
+    return "\n".join(
+        line for line in text.splitlines()
+        if not line.strip().startswith(_SKIP_PREFIXES)
+    )
+
+
+def embed(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """
+    文本 -> 归一化的哈希 n-gram 向量（crc32 保证跨进程稳定，不用内置 hash）
+    """
+    import numpy as np
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(_body(text)):
+        h = zlib.crc32(token.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+class VectorStore:
+    """
+    memmap 矩阵 + 行号映射：
+      rows[i]   -> rel_path
+      sigs      -> rel_path: [mtime_ns, size]（判断文件是否变过）
+    """
+
+    def __init__(self,
+                 vectors_file: Path = VECTORS_FILE,
+                 meta_file: Path = VECTORS_META_FILE,
+                 dim: int = VECTOR_DIM):
+        self.vectors_file = vectors_file
+        self.meta_file = meta_file
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._rows: list[str] = []
+        self._row_of: dict[str, int] = {}
+        self._sigs: dict[str, list[int]] = {}
+
+    # =========================
+    # 打开 / 持久化
+    # =========================
+
+    def _open(self):
+        import numpy as np
+        if self._matrix is not None:
+            return
+        try:
+            meta = json.loads(self.meta_file.read_text(encoding="utf-8"))
+            matrix = np.load(self.vectors_file, mmap_mode="r+")
+            if meta.get("dim") != self.dim or matrix.shape[1] != self.dim:
+                raise ValueError("dim mismatch")
+            self._matrix = matrix
+            self._rows = list(meta["rows"])
+            self._row_of = {p: i for i, p in enumerate(self._rows)}
+            self._sigs = dict(meta.get("sigs", {}))
+        except (OSError, ValueError, KeyError):
+            self._create(INITIAL_CAPACITY)
+            self._rows, self._row_of, self._sigs = [], {}, {}
+            self.sync()
+
+    def _create(self, capacity: int, copy_from=None, n_rows: int = 0):
+        import numpy as np
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = self.vectors_file.with_suffix(".tmp.npy")
+        matrix = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        if copy_from is not None and n_rows:
+            matrix[:n_rows] = copy_from[:n_rows]
+        matrix.flush()
+        del matrix
+
+        # Windows 上被 memmap 占用的文件不能替换，先释放旧的
+        self._matrix = None
+        os.replace(tmp, self.vectors_file)
+        self._matrix = np.load(self.vectors_file, mmap_mode="r+")
+
+    def _write_meta(self):
+        tmp = self.meta_file.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"dim": self.dim, "rows": self._rows, "sigs": self._sigs}, ensure_ascii=False),
+            encoding="utf-8"
+        )
+        os.replace(tmp, self.meta_file)
+
+    # =========================
+    # 行级更新
+    # =========================
+
+    def _put(self, rel_path: str, vec: np.ndarray):
+        import numpy as np
+        i = self._row_of.get(rel_path)
+        if i is None:
+            i = len(self._rows)
+            if i >= self._matrix.shape[0]:
+                old = np.array(self._matrix[:i])
+                self._create(self._matrix.shape[0] * 2, old, i)
+            self._rows.append(rel_path)
+            self._row_of[rel_path] = i
+        self._matrix[i] = vec
+
+    def _delete(self, rel_path: str):
+        i = self._row_of.pop(rel_path, None)
+        if i is None:
+            return
+        last = len(self._rows) - 1
+        if i != last:
+            moved = self._rows[last]
+            self._matrix[i] = self._matrix[last]
+            self._rows[i] = moved
+            self._row_of[moved] = i
+        self._rows.pop()
+        self._sigs.pop(rel_path, None)
+
+    @timed("vectors_update")
+    def update(self, rel_paths) -> int:
+        """
+        只更新给定文件对应的行；返回改动的行数
+        """
+        if not numpy_available():
+            return 0
+        with self._lock:
+            self._open()
+            changed = 0
+            for rel_path in rel_paths:
+                rel_path = Path(rel_path).as_posix()
+                path = STORAGE_DIR / rel_path
+                try:
+                    st = path.stat()
+                    text = path.read_text(encoding="utf-8")
+                except OSError:
+                    if rel_path in self._row_of:
+                        self._delete(rel_path)
+                        changed += 1
+                    continue
+                self._put(rel_path, embed(text, self.dim))
+                self._sigs[rel_path] = [st.st_mtime_ns, st.st_size]
+                changed += 1
+            if changed:
+                self._matrix.flush()
+                self._write_meta()
+            return changed
+
+    @timed("vectors_sync")
+    def sync(self) -> int:
+        """
+        与 storage 对齐：只重算 mtime / size 变过的文件，移除已删除的
+        """
+        if not numpy_available():
+            return 0
+        with self._lock:
+            self._open()
+            seen = scan_storage()
+            stale = [
+                p for p, (mtime_ns, size, _) in seen.items()
+                if self._sigs.get(p) != [mtime_ns, size]
+            ]
+            stale.extend(p for p in list(self._row_of) if p not in seen)
+            if not stale:
+                return 0
+            return self.update(stale)
+
+    # =========================
+    # 查询
+    # =========================
+
+    def similar(self, text: str, top_k: int = 5, log_type: str | None = None,
+                exclude: str | None = None) -> list[tuple[str, float]]:
+        """
+        与 text 最相似的日志 [(rel_path, cosine), ...]
+        - log_type：只在某一类里找
+        - exclude：排除某个路径（覆盖保存时排除自己）
+        只查现有矩阵，不做 sync（保存 / 外部修改后由维护队列的 vectors 任务更新）
+        """
+        if not numpy_available():
+            return []
+        import numpy as np
+
+        query = embed(text, self.dim)
+        if not query.any():
+            return []
+
+        with self._lock:
+            self._open()
+            n = len(self._rows)
+            if n == 0:
+                return []
+            scores = np.asarray(self._matrix[:n] @ query)
+            rows = list(self._rows)
+
+        if log_type or exclude:
+            for i, p in enumerate(rows):
+                if (log_type and not p.startswith(log_type + "/")) or p == exclude:
+                    scores[i] = -1.0
+
+        k = min(top_k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(rows[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VectorStore()
+        return _store
+
+
+def find_duplicates(relative_path: str, text: str,
+                    threshold: float = DUPLICATE_THRESHOLD) -> list[tuple[str, float]]:
+    """
+    保存前查重：同一类日志里与待保存文本高度相似的已有日志
+    """
+    log_type = Path(relative_path).parts[0] if Path(relative_path).parts else None
+    hits = get_vector_store().similar(
+        text, top_k=3, log_type=log_type, exclude=Path(relative_path).as_posix()
+    )
+    return [(p, s) for p, s in hits if s >= threshold]
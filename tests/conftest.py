@@ -0,0 +1,10 @@
+# tests/conftest.py
+"""
+让测试能像 server / tools 一样从仓库根目录导入各模块
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
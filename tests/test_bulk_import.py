@@ -0,0 +1,74 @@
+# tests/test_bulk_import.py
+import json
+from datetime import date
+
+from orchestrator.bulk_import import _merge, find_date, make_batches, read_jsonl, split_markdown
+
+
+def test_find_date_formats():
+    assert find_date("2025/3/1 周六") == date(2025, 3, 1)
+    assert find_date("写于2025年03月01日") == date(2025, 3, 1)
+    assert find_date("2025-02-30 之后 2025.03.02") == date(2025, 3, 2)
+    assert find_date("没有日期") is None
+
+
+def test_split_markdown_by_dated_headings():
+    text = "前言\n# 2025-03-01\n看书\n## 小结\n还行\n# 2025/3/2 周日\n跑步"
+    entries = split_markdown(text, "journal.md", date(2025, 1, 1))
+    assert [(e["source"], e["date"]) for e in entries] == [
+        ("journal.md", date(2025, 1, 1)),
+        ("journal.md#2025-03-01", date(2025, 3, 1)),
+        ("journal.md#2025-03-02", date(2025, 3, 2)),
+    ]
+    # 不带日期的标题留在所属段落里
+    assert entries[1]["text"] == "# 2025-03-01\n看书\n## 小结\n还行"
+
+
+def test_split_markdown_without_dated_headings_is_one_entry():
+    entries = split_markdown("# 读书笔记\n内容", "notes.md", None)
+    assert entries == [{"source": "notes.md", "date": None, "text": "# 读书笔记\n内容"}]
+
+
+def test_read_jsonl(tmp_path):
+    path = tmp_path / "export.jsonl"
+    lines = [
+        json.dumps({"title": "周末", "content": "去爬山", "date": "2025-03-01"}, ensure_ascii=False),
+        "not json",
+        json.dumps("只有正文", ensure_ascii=False),
+        json.dumps({"text": "毫秒时间戳", "timestamp": 1740787200000}, ensure_ascii=False),
+        json.dumps({"text": "   "}),
+        json.dumps([1, 2]),
+    ]
+    path.write_text("\n".join(lines), encoding="utf-8")
+    entries = read_jsonl(path)
+    assert [e["text"] for e in entries] == ["周末\n去爬山", "只有正文", "毫秒时间戳"]
+    assert entries[0]["date"] == date(2025, 3, 1)
+    assert entries[1]["date"] is None
+    assert entries[2]["date"] is not None
+    assert entries[0]["source"] == f"{path}:1"
+
+
+def test_make_batches_limits_entries_and_chars():
+    entries = [{"text": "x" * n} for n in (10, 10, 10, 50, 10)]
+    batches = make_batches(entries, max_entries=2, max_chars=40)
+    assert [[i for i, _ in b] for b in batches] == [[0, 1], [2], [3], [4]]
+    # 单条超过字数上限也独占一批，不丢
+    assert make_batches([{"text": "x" * 100}], max_entries=8, max_chars=40) == [[(0, {"text": "x" * 100})]]
+
+
+def test_merge_new_file():
+    text = _merge(None, "tasks", date(2025, 3, 1), ["看书", "跑步", "看书"])
+    assert text == "类型：任务\n日期：2025-03-01\n内容：看书\n内容：跑步"
+
+
+def test_merge_compares_whole_content_lines():
+    existing = "类型：任务\n日期：2025-03-01\n内容：跑步五公里\n内容：看书"
+    # “跑步”是已有内容的子串，但不是同一条，要追加
+    assert _merge(existing, "tasks", date(2025, 3, 1), ["跑步", "看书"]) == existing + "\n内容：跑步"
+    assert _merge(existing, "tasks", date(2025, 3, 1), ["看书", "跑步五公里"]) is None
+
+
+def test_merge_multiline_existing_content():
+    existing = "类型：事件\n日期：2025-03-01\n内容：参加会议\n并做报告"
+    assert _merge(existing, "events", date(2025, 3, 1), ["参加会议\n并做报告"]) is None
+    assert _merge(existing, "events", date(2025, 3, 1), ["参加会议"]) == existing + "\n内容：参加会议"
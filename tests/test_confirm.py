@@ -0,0 +1,68 @@
+# tests/test_confirm.py
+from datetime import date
+
+import pytest
+
+from orchestrator.confirm import finalize_draft, is_confirmation, log_path, format_log
+
+
+TODAY = date(2026, 1, 20)
+
+
+@pytest.mark.parametrize("text", ["确认", "好的", "好的，确认保存", "可以的！", "OK", "嗯嗯"])
+def test_is_confirmation_accepts_plain_confirm(text):
+    assert is_confirmation(text)
+
+
+@pytest.mark.parametrize("text", ["", "不可以", "可以，但是把时间改到三点", "不是", "取消"])
+def test_is_confirmation_rejects_everything_else(text):
+    assert not is_confirmation(text)
+
+
+def test_finalize_task_draft():
+    draft = "类型：任务\n日期：2026-01-20\n内容：完成论文初稿\n\n是否确认？"
+    assert finalize_draft(draft, TODAY) == (
+        "tasks/2026-01-20.txt",
+        "类型：任务\n日期：2026-01-20\n内容：完成论文初稿",
+    )
+
+
+def test_finalize_keeps_multiline_content():
+    # 正文里出现“修改”不能被当成确认询问截断
+    draft = "好的，草稿如下：\n类型：任务\n日期：2026-01-20\n内容：今天要完成论文初稿\n并修改第三章的图表\n\n是否确认？"
+    path, text = finalize_draft(draft, TODAY)
+    assert path == "tasks/2026-01-20.txt"
+    assert text.endswith("内容：今天要完成论文初稿\n并修改第三章的图表")
+
+
+def test_finalize_event_uses_short_name_and_today():
+    draft = "类型：事件\n日期：2026-01-25\n内容：参加学术会议\n请问是否确认?"
+    path, _ = finalize_draft(draft, TODAY)
+    assert path == "events/参加学术会议2026-01-20.txt"
+
+
+def test_finalize_without_question_keeps_all_lines():
+    draft = "类型：反馈\n日期：2026-01-19\n内容：讲座内容很充实"
+    assert finalize_draft(draft, TODAY) == ("feedback/2026-01-19.txt", draft)
+
+
+@pytest.mark.parametrize("draft", [
+    # 最后一行像询问但不是问句
+    "类型：任务\n日期：2026-01-20\n内容：写周报\n请确认或提出修改。",
+    # 正文中间有空行，分不清哪些是日志
+    "类型：任务\n日期：2026-01-20\n内容：写周报\n\n另外提醒你明天开会\n是否确认？",
+    # 缺字段 / 类型未知 / 日期不合法
+    "类型：任务\n内容：写周报\n是否确认？",
+    "类型：日记\n日期：2026-01-20\n内容：写周报",
+    "类型：任务\n日期：2026-13-40\n内容：写周报",
+    "没有草稿",
+])
+def test_finalize_returns_none_when_unsure(draft):
+    assert finalize_draft(draft, TODAY) is None
+
+
+def test_log_path_and_format():
+    assert log_path("feedback", date(2026, 1, 3), TODAY) == "feedback/2026-01-03.txt"
+    assert log_path("goals", date(2026, 3, 1), TODAY, "考研") == "goals/考研2026-01-20.txt"
+    assert log_path("goals", date(2026, 3, 1), TODAY, "a/b" * 10) is None
+    assert format_log("tasks", TODAY, " 写周报 \n") == "类型：任务\n日期：2026-01-20\n内容：写周报"
@@ -0,0 +1,45 @@
+# tests/test_context.py
+from orchestrator.context import ConversationContext, PENDING_MAX_TURNS
+
+
+def _turn(i: int) -> dict:
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}轮"}
+
+
+def test_recent_turns_and_folding():
+    ctx = ConversationContext(keep_turns=2)
+    for i in range(5):
+        ctx.append(_turn(i))
+    assert [t["content"] for t in ctx] == ["第3轮", "第4轮"]
+    text = ctx.to_text()
+    assert "第0轮" in text and "第4轮" in text
+    assert text.index("第2轮") < text.index("第3轮")
+
+
+def test_prefix_cache_survives_append_without_fold():
+    ctx = ConversationContext(keep_turns=3)
+    for i in range(4):
+        ctx.append(_turn(i))
+    ctx.to_text()
+    prefix = ctx._cached_prefix
+    ctx.pop()
+    ctx.append(_turn(9))
+    assert "第9轮" in ctx.to_text()
+    assert ctx._cached_prefix is prefix
+
+
+def test_pending_is_capped_when_nothing_summarizes():
+    ctx = ConversationContext(keep_turns=1)
+    for i in range(PENDING_MAX_TURNS + 10):
+        ctx.append(_turn(i))
+    assert len(ctx._pending) == PENDING_MAX_TURNS
+    assert "第0轮" not in ctx.to_text()
+
+
+def test_to_text_respects_token_budget():
+    ctx = ConversationContext(keep_turns=1, token_budget=20)
+    for i in range(30):
+        ctx.append(_turn(i))
+    text = ctx.to_text()
+    assert "第29轮" in text
+    assert "第0轮" not in text
@@ -0,0 +1,68 @@
+# tests/test_date_index.py
+from datetime import date
+
+import pytest
+
+from state.date_index import is_date_question, resolve_date_query
+from state.local_retriever import LOG_FOLDERS
+
+
+TODAY = date(2026, 1, 20)   # 星期二；本周一 = 2026-01-19
+ALL = list(LOG_FOLDERS)
+
+
+def _d(s: str) -> date:
+    return date.fromisoformat(s)
+
+
+CASES = [
+    # (问题, 日志类型, 起始, 结束)
+    ("昨天的任务", ["tasks"], "2026-01-19", "2026-01-19"),
+    ("前天做了什么", ALL, "2026-01-18", "2026-01-18"),
+    ("明天有什么安排", ["events"], "2026-01-21", "2026-01-21"),
+    ("2026-01-03的反馈", ["feedback"], "2026-01-03", "2026-01-03"),
+    ("1月5号的任务", ["tasks"], "2026-01-05", "2026-01-05"),
+    ("上周的反馈", ["feedback"], "2026-01-12", "2026-01-18"),
+    ("上周一的任务", ["tasks"], "2026-01-12", "2026-01-12"),
+    ("下周三的安排", ["events"], "2026-01-28", "2026-01-28"),
+    ("星期天的任务", ["tasks"], "2026-01-25", "2026-01-25"),
+    ("上周一起吃饭的朋友是谁", ALL, "2026-01-12", "2026-01-18"),
+    ("这周天气怎么样", ALL, "2026-01-19", "2026-01-25"),
+    ("上周日程", ["events"], "2026-01-12", "2026-01-18"),
+    ("三天前的任务", ["tasks"], "2026-01-17", "2026-01-17"),
+    ("10天前", ALL, "2026-01-10", "2026-01-10"),
+    ("两周前的反馈", ["feedback"], "2026-01-05", "2026-01-11"),
+    ("一个月前的目标", ["goals"], "2025-12-01", "2025-12-31"),
+    ("最近三天", ALL, "2026-01-18", "2026-01-20"),
+    ("过去两周的任务", ["tasks"], "2026-01-07", "2026-01-20"),
+    ("最近一周的总结", ["feedback"], "2026-01-14", "2026-01-20"),
+    ("最近这几天", ALL, "2026-01-14", "2026-01-20"),
+    ("最近一个月", ALL, "2025-12-22", "2026-01-20"),
+    ("这个月的任务", ["tasks"], "2026-01-01", "2026-01-31"),
+    ("上个月", ALL, "2025-12-01", "2025-12-31"),
+    ("去年的目标", ["goals"], "2025-01-01", "2025-12-31"),
+]
+
+
+@pytest.mark.parametrize("text,types,start,end", CASES)
+def test_resolve_date_query(text, types, start, end):
+    assert resolve_date_query(text, TODAY) == (types, _d(start), _d(end))
+
+
+@pytest.mark.parametrize("text", ["最近的任务", "最近怎么样", "你好", "帮我看看我的目标"])
+def test_resolve_date_query_not_temporal(text):
+    assert resolve_date_query(text, TODAY) is None
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("明天面试要准备什么", False),       # 只是顺带提到单日相对时间
+    ("周三开会要带什么", False),
+    ("昨天的任务", True),               # 提到日志类型
+    ("明天有什么安排", True),
+    ("上周过得怎么样", True),           # 区间
+    ("最近三天", True),
+    ("1月5号我在干嘛", True),           # 明确日期
+])
+def test_is_date_question(text, expected):
+    _, start, end = resolve_date_query(text, TODAY)
+    assert is_date_question(text, start, end) is expected
@@ -0,0 +1,51 @@
+# tests/test_derived.py
+import os
+from datetime import datetime
+
+import pytest
+
+import derived.build_derived_logs as build
+import derived.read_derived as read
+from derived.build_derived_logs import format_logs_for_display, write_derived_file
+from derived.read_derived import load_offset_index, read_derived_page
+
+
+@pytest.fixture(autouse=True)
+def derived_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(build, "DERIVED_DIR", tmp_path)
+    monkeypatch.setattr(read, "DERIVED_DIR", tmp_path)
+    return tmp_path
+
+
+def _view(*days: str) -> str:
+    return format_logs_for_display([
+        {"filename": f"{d}.txt", "date": datetime.strptime(d, "%Y-%m-%d"), "content": f"内容：{d} 的任务"}
+        for d in days
+    ])
+
+
+def test_page_reads_entries_by_offset(derived_dir):
+    write_derived_file("tasks", _view("2026-01-20", "2026-01-19", "2026-01-18"))
+    page = read_derived_page("tasks", offset=1, limit=1)
+    assert page["total"] == 3 and page["has_more"]
+    assert [e["filename"] for e in page["entries"]] == ["2026-01-19.txt"]
+    assert page["content"] == "===== 2026-01-19 | 2026-01-19.txt =====\n内容：2026-01-19 的任务\n"
+    assert not list(derived_dir.glob("*.tmp"))
+
+
+def test_index_follows_the_open_file_when_view_is_replaced(derived_dir):
+    write_derived_file("tasks", _view("2026-01-20"))
+    with open(derived_dir / "tasks.txt", "rb") as f:
+        # 维护线程在读方打开视图之后替换了它（并写了新视图的索引）
+        write_derived_file("tasks", _view("2026-01-22", "2026-01-21", "2026-01-20"))
+        index = load_offset_index("tasks", f)
+        assert index["size"] == os.fstat(f.fileno()).st_size
+        assert [e["filename"] for e in index["entries"]] == ["2026-01-20.txt"]
+
+    # 之后的读方打开的是新视图，会按新文件重建索引
+    assert read_derived_page("tasks")["total"] == 3
+
+
+def test_missing_view_is_empty():
+    assert read_derived_page("goals")["entries"] == []
+    assert read_derived_page("nope")["entries"] == []
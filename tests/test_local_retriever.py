@@ -0,0 +1,35 @@
+# tests/test_local_retriever.py
+from datetime import date
+
+from state.local_retriever import LocalRetriever
+
+
+def _write(root, rel_path: str, content: str):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"类型：任务\n日期：2026-01-20\n内容：{content}", encoding="utf-8")
+
+
+def test_queries_do_not_rescan_until_update(tmp_path):
+    _write(tmp_path, "tasks/2026-01-19.txt", "完成论文初稿")
+    retriever = LocalRetriever(tmp_path)
+    today = date(2026, 1, 20)
+    assert [p for p, _ in retriever.search("论文", today=today)] == ["tasks/2026-01-19.txt"]
+
+    _write(tmp_path, "tasks/2026-01-20.txt", "修改论文图表")
+    assert [p for p, _ in retriever.search("图表", today=today)] == []
+
+    assert retriever.update(["tasks/2026-01-20.txt", "notes/ignored.md"]) == 1
+    assert [p for p, _ in retriever.search("图表", today=today)] == ["tasks/2026-01-20.txt"]
+
+    (tmp_path / "tasks/2026-01-19.txt").unlink()
+    assert retriever.update(["tasks/2026-01-19.txt"]) == 1
+    assert retriever.search("初稿", today=today) == []
+
+
+def test_shortlist_has_path_and_snippet(tmp_path):
+    _write(tmp_path, "goals/考研2026-01-01.txt", "今年考上研究生")
+    retriever = LocalRetriever(tmp_path)
+    [hit] = retriever.shortlist("考研", today=date(2026, 1, 20))
+    assert hit["path"] == "goals/考研2026-01-01.txt"
+    assert hit["snippet"] == "今年考上研究生"
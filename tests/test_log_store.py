@@ -0,0 +1,107 @@
+# tests/test_log_store.py
+import sqlite3
+from datetime import date
+
+import pytest
+
+from log_store import LogStore, STAGED_SUFFIX
+
+
+TASK = "类型：任务\n日期：2026-01-20\n内容：完成论文初稿"
+GOAL = "类型：目标\n日期：2026-03-01\n内容：三月前投出论文"
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = LogStore(tmp_path / "logs.sqlite3", tmp_path / "storage")
+    yield s
+    s.close()
+
+
+def test_put_exports_txt_and_indexes(store):
+    store.put("tasks/2026-01-20.txt", TASK)
+    assert (store.storage_dir / "tasks/2026-01-20.txt").read_text(encoding="utf-8") == TASK
+    assert store.get_many(["tasks/2026-01-20.txt"]) == {"tasks/2026-01-20.txt": TASK}
+    assert store.by_date(["tasks"], date(2026, 1, 20), date(2026, 1, 20), 10) == ["tasks/2026-01-20.txt"]
+
+
+def test_put_many_renames_after_commit(store):
+    n = store.put_many([
+        ("tasks/2026-01-20.txt", TASK),
+        ("goals/投论文2026-01-20.txt", GOAL),
+        ("notes/skip.txt", "不在日志目录里"),
+    ])
+    assert n == 2
+    assert not list(store.storage_dir.rglob("*" + STAGED_SUFFIX))
+    assert (store.storage_dir / "goals/投论文2026-01-20.txt").read_text(encoding="utf-8") == GOAL
+    # 导出后的 stat 已记下，sync 不需要重读
+    assert store.sync() == {"updated": 0, "removed": 0}
+    # 目标文件的“日期：”行也进了时间索引
+    assert store.by_date(["goals"], date(2026, 3, 1), date(2026, 3, 1), 10) == ["goals/投论文2026-01-20.txt"]
+
+
+def test_put_many_rollback_removes_staged_files(store, monkeypatch):
+    def boom(*args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_upsert_locked", boom)
+    with pytest.raises(sqlite3.OperationalError):
+        store.put_many([("tasks/2026-01-20.txt", TASK)])
+    assert not list(store.storage_dir.rglob("*" + STAGED_SUFFIX))
+    assert not (store.storage_dir / "tasks/2026-01-20.txt").exists()
+
+
+def test_sync_finishes_staged_files_left_by_a_crash(store):
+    store.put_many([("tasks/2026-01-20.txt", TASK)], export=False)
+    (store.storage_dir / "tasks").mkdir(parents=True)
+    (store.storage_dir / ("tasks/2026-01-20.txt" + STAGED_SUFFIX)).write_text(TASK, encoding="utf-8")
+    (store.storage_dir / ("tasks/2026-01-21.txt" + STAGED_SUFFIX)).write_text("未提交", encoding="utf-8")
+
+    assert store.sync()["removed"] == 0
+    assert (store.storage_dir / "tasks/2026-01-20.txt").read_text(encoding="utf-8") == TASK
+    assert not list(store.storage_dir.rglob("*" + STAGED_SUFFIX))
+    assert store.get_many(["tasks/2026-01-21.txt"]) == {}
+
+
+def test_sync_picks_up_external_edits_and_deletes(store):
+    store.put("tasks/2026-01-20.txt", TASK)
+    path = store.storage_dir / "tasks/2026-01-19.txt"
+    path.write_text("类型：任务\n日期：2026-01-19\n内容：看文献", encoding="utf-8")
+    assert store.sync() == {"updated": 1, "removed": 0}
+
+    path.unlink()
+    assert store.sync(["tasks/2026-01-19.txt"]) == {"updated": 0, "removed": 1}
+    assert [r["rel_path"] for r in store.list_logs("tasks")] == ["tasks/2026-01-20.txt"]
+
+
+def test_search_full_text(store):
+    store.put_many([("tasks/2026-01-20.txt", TASK), ("goals/投论文2026-01-20.txt", GOAL)])
+    paths = {hit["path"] for hit in store.search("论文")}
+    assert paths == {"tasks/2026-01-20.txt", "goals/投论文2026-01-20.txt"}
+    assert [hit["path"] for hit in store.search("论文", log_type="goals")] == ["goals/投论文2026-01-20.txt"]
+
+
+class _NoFts5:
+    """只拦 CREATE VIRTUAL TABLE，其余语句照常交给真连接"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if sql.startswith("CREATE VIRTUAL TABLE"):
+            raise sqlite3.OperationalError("no such module: fts5")
+        return self.conn.execute(sql, *args)
+
+
+def test_create_fts_raises_clear_error_without_fts5():
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(RuntimeError, match="FTS5"):
+        LogStore._create_fts(_NoFts5(conn))
+    conn.close()
+
+
+@pytest.mark.parametrize("rel_path", ["../x.txt", "foo/bar.txt", "tasks/../../x.txt", "tasks/a/b.txt", "tasks/x.md"])
+def test_put_rejects_paths_outside_log_folders(store, rel_path):
+    with pytest.raises(ValueError):
+        store.put(rel_path, TASK)
+    assert not [p for p in store.storage_dir.parent.rglob("*") if p.is_file() and p.suffix == ".txt"]
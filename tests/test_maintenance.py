@@ -0,0 +1,110 @@
+# tests/test_maintenance.py
+import threading
+
+import pytest
+
+from orchestrator.maintenance import MaintenanceQueue
+
+
+def _recording_queue(window: float = 0.05):
+    queue = MaintenanceQueue(coalesce_window=window)
+    calls = []
+    queue.register("index", lambda paths: calls.append(("index", paths)))
+    queue.register("derived", lambda paths: calls.append(("derived", paths)))
+    return queue, calls
+
+
+def test_burst_is_coalesced_into_one_run_in_registration_order():
+    queue, calls = _recording_queue()
+    queue.enqueue("derived", "index", path="tasks/a.txt")
+    queue.enqueue("index", paths=["tasks/b.txt"])
+    assert queue.wait(timeout=5)
+    assert calls == [("index", {"tasks/a.txt", "tasks/b.txt"}), ("derived", {"tasks/a.txt"})]
+    status = queue.status()
+    assert status["caught_up"] and status["pending"] == [] and status["last_error"] is None
+
+
+def test_full_rebuild_request_wins_over_paths():
+    queue, calls = _recording_queue()
+    queue.enqueue("index", path="tasks/a.txt")
+    queue.enqueue("index")
+    queue.enqueue("index", path="tasks/b.txt")
+    assert queue.wait(timeout=5)
+    assert calls == [("index", None)]
+
+
+def test_failing_job_is_reported_and_others_still_run():
+    queue, calls = _recording_queue(window=0)
+    queue.register("broken", lambda paths: 1 / 0)
+    ticket = queue.enqueue("broken", "index", path="tasks/a.txt")
+    assert not queue.wait(ticket, timeout=0.3)
+    assert calls == [("index", {"tasks/a.txt"})]
+    status = queue.status()
+    assert "ZeroDivisionError" in status["last_error"]
+    assert not status["caught_up"]
+    assert status["failed"] == ["broken"]
+    assert status["completed"] < ticket
+
+
+def test_failed_paths_are_retried_with_the_next_batch():
+    queue = MaintenanceQueue(coalesce_window=0, retry_delay=60)
+    seen = []
+    fail = threading.Event()
+    fail.set()
+
+    def flaky(paths):
+        seen.append(paths)
+        if fail.is_set():
+            raise RuntimeError("disk full")
+
+    queue.register("flaky", flaky)
+    first = queue.enqueue("flaky", path="tasks/a.txt")
+    assert not queue.wait(first, timeout=0.3)
+
+    fail.clear()
+    second = queue.enqueue("flaky", path="tasks/b.txt")
+    assert queue.wait(second, timeout=5)
+    assert queue.wait(first, timeout=0)
+    assert seen[-1] == {"tasks/a.txt", "tasks/b.txt"}
+    status = queue.status()
+    assert status["caught_up"] and status["failed"] == []
+
+
+def test_failed_job_is_retried_after_delay_without_new_saves():
+    queue = MaintenanceQueue(coalesce_window=0, retry_delay=0.05)
+    attempts = []
+
+    def flaky(paths):
+        attempts.append(paths)
+        if len(attempts) == 1:
+            raise RuntimeError("disk full")
+
+    queue.register("flaky", flaky)
+    ticket = queue.enqueue("flaky", path="tasks/a.txt")
+    assert queue.wait(ticket, timeout=5)
+    assert attempts == [{"tasks/a.txt"}, {"tasks/a.txt"}]
+
+
+def test_enqueue_unknown_job_raises():
+    queue, _ = _recording_queue()
+    with pytest.raises(KeyError):
+        queue.enqueue("nope")
+
+
+def test_enqueue_with_unknown_name_marks_nothing_dirty():
+    queue, _ = _recording_queue()
+    with pytest.raises(KeyError):
+        queue.enqueue("index", "nope", path="tasks/a.txt")
+    status = queue.status()
+    assert status["pending"] == []
+    assert status["requested"] == 0
+
+
+def test_wait_times_out_while_a_job_is_running():
+    queue = MaintenanceQueue(coalesce_window=0)
+    release = threading.Event()
+    queue.register("slow", lambda paths: release.wait(5))
+    ticket = queue.enqueue("slow")
+    assert not queue.wait(ticket, timeout=0.05)
+    release.set()
+    assert queue.wait(ticket, timeout=5)
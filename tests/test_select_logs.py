@@ -0,0 +1,18 @@
+# tests/test_select_logs.py
+import state.select_logs as select_logs
+
+
+def test_temporal_route_without_matches_falls_through(monkeypatch):
+    monkeypatch.setattr(select_logs, "select_logs_by_date", lambda text: [])
+    assert select_logs.select_temporal_logs("-上周的反馈") is None
+
+
+def test_temporal_route_skips_incidental_date_words():
+    # 单日相对词、没提日志类型：不走时间索引（不读 storage）
+    assert select_logs.select_temporal_logs("-明天面试要准备什么") is None
+
+
+def test_temporal_route_returns_loaded_logs(monkeypatch):
+    monkeypatch.setattr(select_logs, "select_logs_by_date", lambda text: ["tasks/2026-01-20.txt"])
+    monkeypatch.setattr(select_logs, "load_log_files", lambda paths: "【tasks/2026-01-20.txt】\n写周报")
+    assert select_logs.select_temporal_logs("-昨天的任务") == "【tasks/2026-01-20.txt】\n写周报"
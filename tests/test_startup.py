@@ -0,0 +1,17 @@
+# tests/test_startup.py
+import pytest
+
+pytest.importorskip("fastapi")
+
+from tools.startup_check import LAZY_MODULES, probe_once
+
+
+def test_server_import_is_lazy_and_offline():
+    # probe_once 在禁止联网的子进程里导入 server.api；联网或导入失败会抛 RuntimeError
+    result = probe_once()
+    assert result["loaded"] == [], f"loaded at startup: {result['loaded']}"
+
+
+def test_lazy_modules_cover_heavy_dependencies():
+    for name in ("openai", "httpx", "numpy", "watchdog"):
+        assert name in LAZY_MODULES
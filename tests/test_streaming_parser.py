@@ -0,0 +1,48 @@
+# tests/test_streaming_parser.py
+import json
+
+import pytest
+
+from schema.response import StreamingEnvelopeParser
+
+
+def _run(chunks) -> list[tuple[str, str]]:
+    parser = StreamingEnvelopeParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+def _merge(events):
+    """相邻的 delta 拼起来，方便比较"""
+    out = []
+    for kind, data in events:
+        if kind == "delta" and out and out[-1][0] == "delta":
+            out[-1] = ("delta", out[-1][1] + data)
+        else:
+            out.append((kind, data))
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_content_deltas_reassemble_for_any_chunking(size):
+    text = json.dumps({"type": "1-2", "content": "你好，\"世界\"\n第二行 \\ 😀"}, ensure_ascii=True)
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    assert _merge(_run(chunks)) == [("type", "1-2"), ("delta", "你好，\"世界\"\n第二行 \\ 😀")]
+
+
+def test_content_before_type_is_buffered_until_type_known():
+    text = '{"content": "先到的内容", "type": "1-1"}'
+    assert _merge(_run([text[:20], text[20:]])) == [("type", "1-1"), ("delta", "先到的内容")]
+
+
+def test_non_string_content_emits_no_deltas():
+    text = '{"type": "2-1", "content": ["tasks/2026-01-20.txt", "类型：任务"]}'
+    assert _run([text]) == [("type", "2-1")]
+
+
+def test_nested_strings_and_trailing_text_are_ignored():
+    text = '好的：{"meta": {"type": "x", "content": "嵌套"}, "type": "1-2", "content": "外层"} 多余的字'
+    assert _merge(_run([text])) == [("type", "1-2"), ("delta", "外层")]
+
@@ -0,0 +1,20 @@
+# tests/test_user_profile.py
+from state.build_user_profile import _chronological
+
+
+def test_profile_corpus_is_sorted_by_log_date_not_filename():
+    logs = {
+        "tasks/2026-01-10.txt": ("类型：任务\n日期：2026-01-10\n内容：写代码", "h1"),
+        # 文件名以名称开头：按文件名排会排到所有日期文件之后
+        "events/面试2026-01-02.txt": ("类型：事件\n日期：2026-01-20\n内容：面试", "h2"),
+        "goals/考研2026-01-15.txt": ("类型：目标\n日期：2026-12-20\n内容：考研", "h3"),
+        "feedback/2026-01-03.txt": ("类型：反馈\n日期：2026-01-03\n内容：还行", "h4"),
+        "goals/旧目标.txt": ("类型：目标\n日期：2025-06-01\n内容：早睡", "h5"),
+    }
+    assert _chronological(logs, logs) == [
+        "goals/旧目标.txt",
+        "events/面试2026-01-02.txt",
+        "feedback/2026-01-03.txt",
+        "tasks/2026-01-10.txt",
+        "goals/考研2026-01-15.txt",
+    ]
@@ -0,0 +1,258 @@
+# tools/fake_llm_server.py
+"""
+本地假 LLM 服务（OpenAI 兼容 /chat/completions）
+
+用来在没有真实 volces 接口时压测服务端：
+- 按 prompt 里的系统提示词判断调用点，回复符合 agent/prompt.py 协议的 JSON
+  （S1：1-1 / 1-2，S2：2-1 / 2-2 / 2-3，路由：3-1，批量导入：4-1；画像 / 摘要回纯文本）
+- 可配置延迟、抖动、流式分块间隔和错误率（返回 503，用来验证重试）
+- 流式请求按 SSE 返回 chat.completion.chunk，include_usage 时最后带 usage
+
+用法（项目根目录）：
+    python -m tools.fake_llm_server --port 9000 --latency 0.8 --jitter 0.4
+    AI_LOG_LLM_BASE_URL=http://127.0.0.1:9000/v1 python launcher.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeConfig:
+    latency = 0.5           # 平均延迟（秒，首字节前）
+    jitter = 0.2            # 延迟抖动（±秒，均匀分布）
+    tail_rate = 0.0         # 长尾请求比例
+    tail_latency = 5.0      # 长尾请求的额外延迟（秒）
+    chunk_chars = 4         # 流式每块字符数
+    chunk_delay = 0.02      # 流式块间隔（秒）
+    error_rate = 0.0        # 返回 503 的比例
+
+
+config = FakeConfig()
+
+app = FastAPI(title="fake llm")
+
+_USER_INPUT = re.compile(r"<user_input>(.*?)</user_input>", re.S)
+_DRAFT = re.compile(r"<log draft>(.*?)</log draft>", re.S)
+_LOG_PATH = re.compile(r"(?:tasks|feedback|events|goals)/[^\s\"',:：\]]+?\.txt")
+_DATE = re.compile(r"<current_date>(\d{4}-\d{2}-\d{2})</current_date>")
+_IMPORT_ENTRY = re.compile(r'<entry id="(\d+)" date="([^"]*)">(.*?)</entry>', re.S)
+
+_TYPE_DIRS = {"任务": "tasks", "反馈": "feedback", "事件": "events", "目标": "goals"}
+
+
+# =========================
+# 按协议生成回复
+# =========================
+
+def _user_input(prompt: str) -> str:
+    found = _USER_INPUT.findall(prompt)
+    return found[-1].strip() if found else ""
+
+
+def _today(prompt: str) -> str:
+    m = _DATE.search(prompt)
+    return m.group(1) if m else time.strftime("%Y-%m-%d")
+
+
+def _envelope(type_: str, content) -> str:
+    return json.dumps({"type": type_, "content": content}, ensure_ascii=False)
+
+
+def _s1(prompt: str) -> str:
+    text = _user_input(prompt).lstrip("-").strip()
+    today = _today(prompt)
+    if any(w in text for w in ("目标", "这个月", "学期")):
+        kind = "目标"
+    elif any(w in text for w in ("下周", "号", "考试", "面试", "开会")):
+        kind = "事件"
+    elif any(w in text for w in ("完成了", "没完成", "总结", "效率")):
+        kind = "反馈"
+    elif any(w in text for w in ("今天要", "明天要", "计划", "待办")):
+        kind = "任务"
+    else:
+        return _envelope("1-2", f"收到：{text[:40]}。这是一条普通聊天回复。")
+    draft = f"类型：{kind}\n日期：{today}\n内容：{text}"
+    return _envelope("1-1", f"我判断这是一条【{kind}】记录\n{draft}\n是否确认？")
+
+
+def _s2(prompt: str) -> str:
+    text = _user_input(prompt)
+    m = _DRAFT.search(prompt)
+    draft = m.group(1).strip() if m else ""
+
+    if any(w in text for w in ("算了", "不要", "取消", "不用")):
+        return _envelope("2-3", "好的，已放弃这条日志。")
+
+    # 否定先于确认判断：“不是 / 不对 / 不可以”里也含确认词，应当走修改
+    negated = any(w in text for w in ("不是", "不对", "不行", "不可以", "不确认", "不好"))
+    if not negated and any(w in text for w in ("确认", "可以", "好的", "是")):
+        kind = re.search(r"类型[：:](\S+)", draft)
+        date = re.search(r"日期[：:](\d{4}-\d{2}-\d{2})", draft)
+        folder = _TYPE_DIRS.get(kind.group(1) if kind else "", "tasks")
+        day = date.group(1) if date else _today(prompt)
+        if folder in ("tasks", "feedback"):
+            path = f"{folder}/{day}.txt"
+        else:
+            path = f"{folder}/压测{uuid.uuid4().hex[:6]}{day}.txt"
+        return _envelope("2-1", [path, draft])
+
+    return _envelope("2-2", f"{draft}\n补充：{text}\n\n这是修改后的版本，是否确认？")
+
+
+def _router(prompt: str) -> str:
+    paths = sorted(set(_LOG_PATH.findall(prompt)))
+    picked = random.sample(paths, min(2, len(paths))) if paths else []
+    return _envelope("3-1", picked)
+
+
+def _bulk_import(prompt: str) -> str:
+    items = []
+    for entry_id, day, text in _IMPORT_ENTRY.findall(prompt):
+        text = " ".join(text.split())
+        if any(w in text for w in ("目标", "这个月", "学期")):
+            kind, name = "目标", "压测目标"
+        elif any(w in text for w in ("会议", "面试", "考试", "医院")):
+            kind, name = "事件", "压测事件"
+        elif any(w in text for w in ("完成了", "没完成", "总结")):
+            kind, name = "反馈", ""
+        else:
+            kind, name = "任务", ""
+        items.append({"id": int(entry_id), "类型": kind, "日期": day, "名称": name, "内容": text[:80]})
+    return _envelope("4-1", items)
+
+
+def respond(prompt: str) -> str:
+    if "历史日志导入模块" in prompt:
+        return _bulk_import(prompt)
+    if "日志上下文选择器" in prompt:
+        return _router(prompt)
+    if "日志草案确认节点" in prompt:
+        return _s2(prompt)
+    if "对话式日志识别助手" in prompt:
+        return _s1(prompt)
+    if "对话摘要" in prompt:
+        return "用户在本次对话中聊了若干日常话题。"
+    if "用户画像" in prompt:
+        return "领域与兴趣：压测用户。\n任务执行模式：规律。"
+    return "ok"
+
+
+# =========================
+# OpenAI 兼容接口
+# =========================
+
+def _usage(prompt: str, completion: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 2)
+    completion_tokens = max(1, len(completion) // 2)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+def _delay() -> float:
+    d = config.latency + random.uniform(-config.jitter, config.jitter)
+    if config.tail_rate and random.random() < config.tail_rate:
+        d += config.tail_latency
+    return max(0.0, d)
+
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    prompt = "".join(str(m.get("content", "")) for m in messages)
+    model = body.get("model", "fake")
+
+    await asyncio.sleep(_delay())
+
+    if config.error_rate and random.random() < config.error_rate:
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"message": "injected failure", "type": "server_error"}},
+        )
+
+    text = respond(prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt, text),
+        }
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    def chunk(delta: dict, finish=None, usage=None, choices=True) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if choices else [],
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        step = max(1, config.chunk_chars)
+        for i in range(0, len(text), step):
+            if config.chunk_delay:
+                await asyncio.sleep(config.chunk_delay)
+            yield chunk({"content": text[i:i + step]})
+        yield chunk({}, finish="stop")
+        if include_usage:
+            yield chunk({}, usage=_usage(prompt, text), choices=False)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="local OpenAI-compatible fake LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=FakeConfig.latency)
+    parser.add_argument("--jitter", type=float, default=FakeConfig.jitter)
+    parser.add_argument("--tail-rate", type=float, default=FakeConfig.tail_rate)
+    parser.add_argument("--tail-latency", type=float, default=FakeConfig.tail_latency)
+    parser.add_argument("--chunk-chars", type=int, default=FakeConfig.chunk_chars)
+    parser.add_argument("--chunk-delay", type=float, default=FakeConfig.chunk_delay)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    args = parser.parse_args(argv)
+
+    config.latency = args.latency
+    config.jitter = args.jitter
+    config.tail_rate = args.tail_rate
+    config.tail_latency = args.tail_latency
+    config.chunk_chars = args.chunk_chars
+    config.chunk_delay = args.chunk_delay
+    config.error_rate = args.error_rate
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_config=None)
+
+
+if __name__ == "__main__":
+    main()
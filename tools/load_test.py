@@ -0,0 +1,208 @@
+# tools/load_test.py
+"""
+聊天 API 端到端压测
+
+- 模拟 N 个并发会话（每个会话一个 X-Session-Id），按脚本对话：
+  普通聊天 → 带历史的提问 → 记日志意图 → 放弃（--save 时确认保存）
+- 穿插读取派生视图 /api/derived/{log_type}（按 --derived-ratio）
+- 统计每个接口的请求数、错误数、吞吐量和延迟分位数（p50 / p90 / p95 / p99 / max）
+
+注意：--save 会真的往 storage/ 里写日志，请对着一份数据副本
+（AI_LOG_ROOT 指向拷贝出来的项目目录）启动服务再压。
+
+用法（先起假 LLM 和服务端）：
+    python -m tools.fake_llm_server --port 9000 --latency 0.8 --jitter 0.4
+    AI_LOG_LLM_BASE_URL=http://127.0.0.1:9000/v1 python launcher.py
+    python -m tools.load_test --sessions 200 --turns 8
+    python -m tools.load_test --sessions 200 --stream --json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+
+LOG_TYPES = ["tasks", "feedback", "events", "goals"]
+
+# LLM 调用失败时服务端仍返回 200，只是换成这些固定回复（见 orchestrator/run.py），按失败计
+FAILED_REPLIES = ("抱歉，模型服务暂时不可用，请稍后再试。", "LLM error")
+
+# 一个会话循环使用的对话脚本（-开头表示带历史提问）
+SCRIPT = [
+    "你好，今天心情不错",
+    "-我上周的反馈怎么样",
+    "明天要看完两篇论文",
+    "算了",
+    "-最近有什么安排",
+    "下周二面试",
+    "算了",
+    "谢谢",
+]
+
+SAVE_SCRIPT = [
+    "你好，今天心情不错",
+    "明天要看完两篇论文",
+    "确认",
+    "-我最近的任务有哪些",
+]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}     # endpoint -> [seconds]
+        self.errors = {}        # endpoint -> count
+        self.first_event = {}   # 流式：首个事件延迟
+
+    def ok(self, endpoint: str, seconds: float):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def error(self, endpoint: str):
+        self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def ttfe(self, seconds: float):
+        self.first_event.setdefault("chat/stream first event", []).append(seconds)
+
+    def report(self, elapsed: float) -> dict:
+        rows = {}
+        series = dict(self.latencies)
+        series.update(self.first_event)
+        for endpoint in sorted(set(series) | set(self.errors)):
+            values = sorted(series.get(endpoint, []))
+            rows[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p90_ms": percentile(values, 0.90) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": (values[-1] if values else 0.0) * 1000,
+            }
+        return {"elapsed_s": elapsed, "endpoints": rows}
+
+
+def failed_reply(result) -> bool:
+    """
+    /api/chat 的返回或流式 done 事件的数据：没有结果、或回复是 LLM 失败提示
+    """
+    return not isinstance(result, dict) or result.get("reply") in FAILED_REPLIES
+
+
+async def chat_turn(client, rec: Recorder, session_id: str, text: str, stream: bool):
+    headers = {"X-Session-Id": session_id}
+    endpoint = "chat/stream" if stream else "chat"
+    start = time.perf_counter()
+    try:
+        if not stream:
+            r = await client.post("/api/chat", json={"text": text}, headers=headers)
+            r.raise_for_status()
+            result = r.json()
+        else:
+            first = None
+            event, result = None, None
+            async with client.stream("POST", "/api/chat/stream", json={"text": text}, headers=headers) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                        if first is None:
+                            first = time.perf_counter() - start
+                    elif line.startswith("data:") and event == "done":
+                        result = json.loads(line[len("data:"):])
+            if first is not None:
+                rec.ttfe(first)
+    except Exception:
+        rec.error(endpoint)
+        return
+
+    if failed_reply(result):
+        rec.error(endpoint)
+    else:
+        rec.ok(endpoint, time.perf_counter() - start)
+
+
+async def derived_read(client, rec: Recorder):
+    log_type = random.choice(LOG_TYPES)
+    start = time.perf_counter()
+    try:
+        r = await client.get(f"/api/derived/{log_type}", params={"limit": 50})
+        r.raise_for_status()
+        rec.ok("derived", time.perf_counter() - start)
+    except Exception:
+        rec.error("derived")
+
+
+async def run_session(client, rec: Recorder, args, script: list[str]):
+    session_id = f"load-{uuid.uuid4().hex[:12]}"
+    for i in range(args.turns):
+        await chat_turn(client, rec, session_id, script[i % len(script)], args.stream)
+        if random.random() < args.derived_ratio:
+            await derived_read(client, rec)
+        if args.think_time:
+            await asyncio.sleep(random.uniform(0, args.think_time))
+
+
+async def run(args) -> dict:
+    import httpx
+
+    rec = Recorder()
+    script = SAVE_SCRIPT if args.save else SCRIPT
+    limits = httpx.Limits(max_connections=args.sessions, max_keepalive_connections=args.sessions)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+
+        async def staggered(i):
+            # 会话在 ramp-up 时间内均匀启动，避免所有请求同一瞬间打过去
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up * i / args.sessions)
+            await run_session(client, rec, args, script)
+
+        await asyncio.gather(*(staggered(i) for i in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+
+    return rec.report(elapsed)
+
+
+def print_report(report: dict):
+    print(f"elapsed: {report['elapsed_s']:.1f}s")
+    print(f"{'endpoint':<26}{'req':>7}{'err':>6}{'rps':>8}{'p50':>8}{'p90':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<26}{row['requests']:>7}{row['errors']:>6}{row['rps']:>8.1f}"
+            f"{row['p50_ms']:>8.0f}{row['p90_ms']:>8.0f}{row['p95_ms']:>8.0f}"
+            f"{row['p99_ms']:>8.0f}{row['max_ms']:>8.0f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="end-to-end load test for the chat API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=8, help="chat turns per session")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream (SSE)")
+    parser.add_argument("--save", action="store_true", help="confirm drafts (writes into storage/)")
+    parser.add_argument("--derived-ratio", type=float, default=0.3, help="derived reads per chat turn")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between turns (s)")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="spread session starts over N seconds")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# tools/startup_check.py
+"""
+启动回归检查：在干净的子进程里 import server.api，检查
+
+- 导入期间没有任何网络连接（socket.connect 被替换成直接报错）
+- 重量级 SDK（openai / httpx / google.genai / numpy / watchdog）没有被提前导入
+- 导入耗时不超过 STARTUP_BUDGET_SECONDS
+
+用法（项目根目录）：
+    python -m tools.startup_check            # 跑 5 次取中位数
+    python -m tools.startup_check --runs 10
+不通过时退出码为 1，可以直接放进 CI / 发布前检查。
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from app_paths import APP_ROOT
+
+
+# 导入 server.api 的耗时上限（秒，中位数）
+STARTUP_BUDGET_SECONDS = 1.5
+
+# 启动阶段不应出现的模块
+LAZY_MODULES = ("openai", "httpx", "google.genai", "numpy", "watchdog")
+
+# 子进程里执行的探测代码：禁止联网，计时导入，报告已加载的重量级模块
+_PROBE = """
+import json, socket, sys, time
+
+def _no_network(*args, **kwargs):
+    raise RuntimeError("network access during import")
+
+socket.socket.connect = _no_network
+socket.socket.connect_ex = _no_network
+socket.create_connection = _no_network
+
+t0 = time.perf_counter()
+import server.api
+elapsed = time.perf_counter() - t0
+
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def probe_once() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE % (LAZY_MODULES,)],
+        cwd=str(APP_ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or "import server.api failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="measure server import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args(argv)
+
+    try:
+        results = [probe_once() for _ in range(max(1, args.runs))]
+    except RuntimeError as e:
+        print(f"FAIL: {e}")
+        return 1
+
+    times = [r["seconds"] for r in results]
+    median = statistics.median(times)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+
+    print(f"import server.api: median {median * 1000:.0f} ms, "
+          f"min {min(times) * 1000:.0f} ms, max {max(times) * 1000:.0f} ms ({len(times)} runs)")
+
+    ok = True
+    if loaded:
+        print(f"FAIL: loaded at startup: {', '.join(loaded)}")
+        ok = False
+    if median > args.budget:
+        print(f"FAIL: median startup {median:.2f}s exceeds budget {args.budget:.2f}s")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,12 @@ let logsVisible = false;
 let activeLogs = [];
 let loadingNode = null;
 
+// 每个标签页一个会话（file:// 页面没有 cookie，用请求头传）
+const sessionId = sessionStorage.getItem("sessionId")
+  || (crypto.randomUUID ? crypto.randomUUID().replace(/-/g, "")
+                        : Date.now().toString(16) + Math.random().toString(16).slice(2));
+sessionStorage.setItem("sessionId", sessionId);
+
 const logNames = {
   tasks: "TASKS",
   feedback: "FEEDBACK",
@@ -21,6 +27,12 @@ function addMessage(role, text) {
   div.textContent = text;
   box.appendChild(div);
   box.scrollTop = box.scrollHeight;
+  return div;
+}
+
+function scrollChat() {
+  const box = document.getElementById("chatBox");
+  box.scrollTop = box.scrollHeight;
 }
 
 function showLoading() {
@@ -54,16 +66,40 @@ async function sendChat() {
 
   showLoading();
 
+  let aiNode = null;
+  let finished = false;
+
   try {
-    const res = await fetch(API + "/chat", {
+    const res = await fetch(API + "/chat/stream", {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        "X-Session-Id": sessionId
+      },
       body: JSON.stringify({ text })
     });
 
-    const data = await res.json();
-    hideLoading();
-    addMessage("ai", data.reply);
+    // 逐帧读取 SSE：delta 追加到同一个气泡，done 以最终回复为准
+    await readSSE(res, (event, data) => {
+      if (event === "delta") {
+        if (!aiNode) {
+          hideLoading();
+          aiNode = addMessage("ai", "");
+        }
+        aiNode.textContent += data;
+        scrollChat();
+      } else if (event === "done") {
+        finished = true;
+        hideLoading();
+        if (!aiNode) aiNode = addMessage("ai", "");
+        aiNode.textContent = data.reply;
+        scrollChat();
+        if (data.saved) refreshLogsAfterSave();
+      }
+    });
+
+    // 流中途断开、没收到 done：按出错处理
+    if (!finished) throw new Error("stream ended without done");
 
   } catch (e) {
     hideLoading();
@@ -71,8 +107,49 @@ async function sendChat() {
   }
 }
 
+async function readSSE(res, onEvent) {
+  // 非 2xx（422 / 500 等）返回的是 JSON 错误体，不是 SSE，不能按帧解析
+  if (!res.ok || !res.body) {
+    throw new Error(`HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      onEvent(event, data ? JSON.parse(data) : null);
+    }
+  }
+}
+
 /* ---------- 日志 ---------- */
 
+// 保存后派生视图在后台重建：等它追上再刷新已打开的面板
+async function refreshLogsAfterSave() {
+  if (activeLogs.length === 0) return;
+  try {
+    await fetch(API + "/maintenance/status?wait=5");
+  } finally {
+    await renderLogs();
+  }
+}
+
 function ensureLogsOpen() {
   logsVisible = true;
   document.getElementById("leftPane").classList.remove("hidden");
@@ -133,9 +210,33 @@ async function renderLogs() {
     block.append(header, content);
     pane.appendChild(block);
 
-    const res = await fetch(API + "/derived/" + type);
-    const data = await res.json();
-    content.textContent = data.content || "";
+    await loadLogPage(type, content, 0);
+  }
+}
+
+// 分页加载：先取第一页，滚到底部再取下一页
+const LOG_PAGE_SIZE = 30;
+
+async function loadLogPage(type, content, offset) {
+  const res = await fetch(
+    `${API}/derived/${type}?offset=${offset}&limit=${LOG_PAGE_SIZE}`
+  );
+  const data = await res.json();
+
+  if (offset === 0) content.textContent = "";
+  if (data.content) {
+    content.textContent += (offset > 0 ? "\n" : "") + data.content;
+  }
+
+  content.onscroll = null;
+  if (data.has_more) {
+    const next = offset + data.entries.length;
+    content.onscroll = () => {
+      if (content.scrollTop + content.clientHeight >= content.scrollHeight - 40) {
+        content.onscroll = null;
+        loadLogPage(type, content, next);
+      }
+    };
   }
 }
 